@@ -14,3 +14,21 @@ export async function analyzeText(text, text2 = "") {
   return response.json();
 }
 
+
+const HISTORY_FIELDS = "id,headline,verdict,credibility,created_at";
+
+// One page of /history/ ({ results, next }); pass the previous page's `next`
+// URL as `cursorUrl` to get the following page
+export async function fetchHistoryPage({ search = "", pageSize = 50, cursorUrl, signal } = {}) {
+  let url = cursorUrl;
+  if (!url) {
+    const params = new URLSearchParams({ page_size: pageSize, fields: HISTORY_FIELDS });
+    if (search.trim()) params.set("search", search.trim());
+    url = `${API_URL}/history/?${params}`;
+  }
+  const response = await fetch(url, { signal });
+  if (!response.ok) {
+    throw new Error(`Server error ${response.status}`);
+  }
+  return response.json();
+}
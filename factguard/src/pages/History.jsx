@@ -1,20 +1,53 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
+import { fetchHistoryPage } from "../api";
 
 export default function History() {
   const [history, setHistory] = useState([]);
+  const [next, setNext] = useState(null);
+  const [loading, setLoading] = useState(false);
   const [search, setSearch] = useState("");
+  // Bumped per search, so a page of an earlier search is not appended
+  const generation = useRef(0);
 
   useEffect(() => {
-    fetch("http://127.0.0.1:8000/history/")
-      .then((res) => res.json())
-      .then((data) => setHistory(data))
-      .catch((err) => console.error("Error fetching history:", err));
-  }, []);
+    const current = ++generation.current;
+    // Server-side search over the whole history, debounced while typing;
+    // a newer search aborts the request of the previous one
+    const controller = new AbortController();
+    const timer = setTimeout(() => {
+      setLoading(true);
+      fetchHistoryPage({ search, signal: controller.signal })
+        .then((data) => {
+          if (current !== generation.current) return;
+          setHistory(data.results);
+          setNext(data.next);
+          setLoading(false);
+        })
+        .catch((err) => {
+          if (err.name === "AbortError") return;
+          console.error("Error fetching history:", err);
+          setLoading(false);
+        });
+    }, search ? 300 : 0);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [search]);
 
-  // Filtered results (client-side search)
-  const filtered = history.filter((item) =>
-    item.headline?.toLowerCase().includes(search.toLowerCase())
-  );
+  // Next page of the current search (cursor pagination)
+  const loadMore = () => {
+    const current = generation.current;
+    setLoading(true);
+    fetchHistoryPage({ cursorUrl: next })
+      .then((data) => {
+        if (current !== generation.current) return;
+        setHistory((rows) => [...rows, ...data.results]);
+        setNext(data.next);
+      })
+      .catch((err) => console.error("Error fetching history:", err))
+      .finally(() => setLoading(false));
+  };
 
   return (
     <div className="p-6 bg-gray-900 min-h-screen text-white">
@@ -42,8 +75,8 @@ export default function History() {
             </tr>
           </thead>
           <tbody>
-            {filtered.length > 0 ? (
-              filtered.map((item, idx) => (
+            {history.length > 0 ? (
+              history.map((item, idx) => (
                 <tr
                   key={item.id}
                   className={`${
@@ -64,13 +97,24 @@ export default function History() {
                   colSpan="4"
                   className="text-center py-6 text-gray-400 italic"
                 >
-                  No results found.
+                  {loading ? "Loading..." : "No results found."}
                 </td>
               </tr>
             )}
           </tbody>
         </table>
       </div>
+
+      {next && (
+        <button
+          onClick={loadMore}
+          disabled={loading}
+          className="mt-6 px-6 py-2 rounded-lg bg-[#00F0B5] text-gray-900 font-semibold
+                     hover:opacity-90 disabled:opacity-50 transition"
+        >
+          {loading ? "Loading..." : "Load more"}
+        </button>
+      )}
     </div>
   );
 }
@@ -0,0 +1,65 @@
+# gunicorn.conf.py
+#
+#   gunicorn -c gunicorn.conf.py ner_project.wsgi
+#
+# The app (and with MODEL_WARMUP=1, every model) is loaded once in the master
+# process; forked workers share the weights through copy-on-write memory.
+import gc
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault("MODEL_WARMUP", "1")
+# Workers share their metrics through this directory, so /metrics/ reports
+# the whole server rather than the worker that answered the scrape
+os.environ.setdefault(
+    "METRICS_DIR", os.path.join(tempfile.gettempdir(), f"factguard-metrics-{os.getpid()}")
+)
+
+bind = os.getenv("GUNICORN_BIND", "127.0.0.1:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+# Read by the settings (preloaded in the master) to split cores between workers
+os.environ.setdefault("INFERENCE_PROCESSES", str(workers))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "330"))
+preload_app = True
+
+
+def on_starting(server):
+    from ner_app.metrics import metrics
+
+    metrics.reset_directory()
+
+
+def child_exit(server, worker):
+    # Keep the exited worker's counts in the totals, in one archive file
+    from ner_app.metrics import metrics
+
+    metrics.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
+
+
+def post_fork(server, worker):
+    # Each worker gets its own share of the cores for inference
+    from ner_app.resources import configure_process
+
+    configure_process()
+
+
+def post_request(worker, req, environ, resp):
+    # Recycle a worker whose private memory has grown past the cap; gunicorn
+    # replaces it with a fresh fork of the master
+    from ner_app.resources import over_memory_limit
+
+    if over_memory_limit():
+        worker.log.info("Worker %s over INFERENCE_MAX_PRIVATE_MB, restarting", worker.pid)
+        worker.alive = False
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the GC's tracked generations, so
+    # collections in the workers do not touch (and copy) the shared pages.
+    gc.freeze()
@@ -0,0 +1,270 @@
+# ner_app/analysis.py
+import functools
+import logging
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .embedding_index import embedding_index
+from .entity_index import index_claims
+from .history_writer import history_writer
+from .metrics import timed
+from .model_client import call_custom_model, custom_model_error
+from .models import QueryHistory
+from .ner_module import get_named_entities
+from .result_cache import result_cache
+from .semantic_module import analyze_semantics
+from .similarity_module import calculate_similarity, encode_texts
+from .single_flight import SingleFlight
+from .stages import iter_stages
+from .text_utils import cased_text_hash, text_hash
+
+logger = logging.getLogger(__name__)
+
+analysis_flight = SingleFlight("analyze")
+
+# Nearest claims considered for verdict reuse (the closest may be too old)
+VERDICT_REUSE_CANDIDATES = 5
+
+
+def find_prior_verdict(embedding):
+    """
+    Custom model result of a previously checked claim whose embedding is at
+    least VERDICT_REUSE_THRESHOLD similar, or None. Only claims checked in
+    the last VERDICT_REUSE_MAX_AGE seconds, not invalidated since (see
+    /cache/invalidate/) and not themselves answered by reuse qualify.
+    """
+    matches = [
+        (claim_id, score)
+        for claim_id, score in embedding_index.search(embedding, k=VERDICT_REUSE_CANDIDATES)
+        if score >= settings.VERDICT_REUSE_THRESHOLD
+    ]
+    if not matches:
+        return None
+
+    cutoff = timezone.now() - timedelta(seconds=settings.VERDICT_REUSE_MAX_AGE)
+    priors = QueryHistory.objects.filter(
+        id__in=[claim_id for claim_id, _ in matches], created_at__gte=cutoff
+    ).in_bulk()
+    for claim_id, score in matches:
+        prior = priors.get(claim_id)
+        if prior is None or not prior.gemini_result or "reused_from" in prior.gemini_result:
+            continue
+        if prior.created_at.timestamp() <= result_cache.invalidated_at(prior.text_hash):
+            continue
+        result = prior.custom_model_result()
+        if not result.get("success"):
+            continue
+        result["reused_from"] = {
+            "id": prior.id,
+            "headline": prior.headline,
+            "similarity": score,
+        }
+        return result
+    return None
+
+
+def build_history_record(text, custom_model_result):
+    """
+    Unsaved QueryHistory row for an analyzed claim
+    """
+    # Determine verdict from custom model
+    if custom_model_result.get("success"):
+        verdict = custom_model_result.get("verdict", "Unknown")
+        credibility = custom_model_result.get("credibility", "Unknown")
+    else:
+        verdict = "Error analyzing claim"
+        credibility = "Unknown"
+
+    # Sources and the raw response get their own columns instead of being
+    # repeated inside gemini_result
+    result = {
+        key: value
+        for key, value in custom_model_result.items()
+        if key not in ("sources", "raw_response")
+    }
+    try:
+        confidence = float(custom_model_result.get("confidence"))
+    except (TypeError, ValueError):
+        confidence = None
+
+    return QueryHistory(
+        headline=text[:200],
+        text_hash=text_hash(text),
+        serpapi_result=custom_model_result.get("sources", []),
+        gemini_result=result,
+        factcheck_result=custom_model_result.get("raw_response"),
+        verdict=verdict,
+        credibility=credibility,
+        confidence=confidence,
+        is_fake=custom_model_result.get("is_fake"),
+    )
+
+
+def iter_analysis(text, text2="", skip=(), embedding=None, heartbeat=None):
+    """
+    Yields (stage, result) for every /analyze/ stage as soon as it is
+    available: cached results first, then computed stages as they finish,
+    with customModel always last. Stages in `skip` are not run.
+
+    embedding: optional dict that receives the claim vector under "vector"
+    if the verdict-reuse lookup computed it.
+    heartbeat: passed to iter_stages; (None, None) marks an idle interval.
+    """
+    if embedding is None:
+        embedding = {}
+
+    # Stage name -> result cache kind
+    cache_kinds = {
+        "entities": "entities",
+        "sentiment": "sentiment",
+        "customModel": "verdict",
+    }
+    cached = {}
+    for stage, kind in cache_kinds.items():
+        value = result_cache.get(kind, text)
+        if value is not None:
+            cached[stage] = value
+
+    def custom_model_stage():
+        # Reuse the verdict of a near-duplicate claim instead of calling
+        # the remote model
+        if settings.EMBEDDING_INDEX_ENABLED and settings.VERDICT_REUSE_THRESHOLD > 0:
+            embedding["vector"] = encode_texts([text])[0]
+            prior = find_prior_verdict(embedding["vector"])
+            if prior is not None:
+                return prior
+        return call_custom_model(text)
+
+    # NER, sentiment, similarity (if text2 provided) and the custom model
+    # fact check run concurrently; each stage has its own timeout so a
+    # slow remote model does not hold up the local results.
+    stages = {
+        "entities": lambda: _timed_call("ner", get_named_entities, text),
+        "sentiment": lambda: _timed_call("sentiment", analyze_semantics, text),
+        "customModel": custom_model_stage,
+    }
+    stages = {
+        name: func for name, func in stages.items() if name not in cached and name not in skip
+    }
+    if text2 and "similarity" not in skip:
+        stages["similarity"] = lambda: _timed_call("similarity", calculate_similarity, text, text2)
+
+    custom_model_result = cached.pop("customModel", None)
+    yield from cached.items()
+
+    for stage, value in iter_stages(
+        stages,
+        timeouts=settings.ANALYZE_STAGE_TIMEOUTS,
+        fallbacks={
+            "customModel": lambda: custom_model_error(
+                "Stage timeout - custom model did not respond in time"
+            ),
+        },
+        heartbeat=heartbeat,
+        pools={"customModel": "remote"},
+    ):
+        # Cache fresh results; timed-out stages (None) and failed fact
+        # checks are not cached
+        if stage in cache_kinds and value is not None:
+            if stage != "customModel" or value.get("success"):
+                result_cache.set(cache_kinds[stage], text, value)
+        if stage == "customModel":
+            custom_model_result = value
+            continue
+        yield stage, value
+
+    if "customModel" not in skip:
+        yield "customModel", custom_model_result
+
+
+def analyze_claim(text, text2="", skip=()):
+    """
+    Runs every /analyze/ stage for a claim (skipping cached ones and those in
+    `skip`) and returns (response, embedding); embedding is None unless the
+    verdict-reuse lookup already computed it.
+    """
+    embedding = {}
+    results = dict(iter_analysis(text, text2, skip, embedding))
+
+    response = {
+        "entities": results.get("entities") or [],  # NER results
+        "sentiment": results.get("sentiment") or [],  # Sentiment analysis
+        "similarity": results.get("similarity"),  # Similarity score
+        "customModel": results.get("customModel"),  # Your custom model results
+    }
+    return response, embedding.get("vector")
+
+
+def _timed_call(stage, func, *args):
+    with timed(stage):
+        return func(*args)
+
+
+def analyze_claim_shared(text, text2="", skip=()):
+    """
+    analyze_claim, coalesced: concurrent requests for the same normalized
+    claim (and comparison text) share a single computation.
+    """
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        return analyze_claim(text, text2, skip)
+    # Case is kept: the coalesced response includes the cased NER output
+    key = cased_text_hash(text) + (cased_text_hash(text2) if text2 else "")
+    return analysis_flight.do(key, lambda: analyze_claim(text, text2, skip))
+
+
+def index_saved_claim(saved, entities=None, embedding=None, text=None, index_embedding=True):
+    """
+    Indexes the named entities and the embedding of a saved QueryHistory
+    row; without an embedding, `text` (default: the headline) is encoded.
+    Arguments are JSON-serializable so that the history writer can run
+    it again for rows replayed from its spill file.
+    """
+    if entities:
+        try:
+            index_claims([(saved, entities)])
+        except Exception as e:
+            logger.error("Entity index error: %s", e)
+    if not settings.EMBEDDING_INDEX_ENABLED or not index_embedding:
+        return
+    try:
+        vector = embedding if embedding is not None else encode_texts([text or saved.headline])[0]
+        embedding_index.add(saved.id, vector)
+    except Exception as e:
+        logger.error("Embedding index error: %s", e)
+
+
+def save_analysis(text, custom_model_result, embedding=None, entities=None):
+    """
+    Persists the QueryHistory row and indexes the claim embedding and its
+    named entities once the row has an id. With HISTORY_WRITE_BEHIND the row is queued for the
+    background flusher and None is returned; otherwise it is saved here and
+    returned (None if the database write failed).
+    """
+    record = build_history_record(text, custom_model_result)
+    index_claim = functools.partial(
+        index_saved_claim,
+        entities=[{"text": e.get("text"), "label": e.get("label")} for e in entities or ()],
+        embedding=None if embedding is None else np.asarray(embedding, dtype=float).tolist(),
+        text=text if embedding is None else None,
+        # A reused verdict is not indexed for near-duplicate lookup: the
+        # claim it came from already is
+        index_embedding="reused_from" not in custom_model_result,
+    )
+
+    if settings.HISTORY_WRITE_BEHIND:
+        history_writer.submit(record, on_saved=index_claim)
+        return None
+
+    # Save query to database
+    try:
+        with timed("db_write"):
+            record.save()
+    except Exception as e:
+        logger.error("DB save error: %s", e)
+        return None
+
+    index_claim(record)
+    return record
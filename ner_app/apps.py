@@ -1,6 +1,26 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class NerAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ner_app'
+
+    def ready(self):
+        # Importing the modules registers their model loaders
+        from . import ner_module, prefilter, semantic_module, similarity_module  # noqa: F401
+        from .model_registry import registry
+        from .resources import configure_process
+
+        # Thread budget before any model is loaded or run
+        configure_process()
+
+        # Serving processes load every model up front so the first request
+        # does not pay for it; management commands and tests load lazily.
+        if settings.MODEL_WARMUP:
+            from .inference_server import SERVED_MODELS, TOKENIZERS
+
+            # With the inference sidecar the models live there and only the
+            # tokenizers (for long-document windows) are needed here
+            skip = SERVED_MODELS if settings.INFERENCE_SERVER_SOCKET else TOKENIZERS
+            registry.warm_up([name for name in registry.names() if name not in skip])
@@ -0,0 +1,145 @@
+# ner_app/batching.py
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from django.conf import settings
+
+# All batchers created in this process, by name (for the stats endpoint)
+_batchers = {}
+
+
+def _bucket(value):
+    """Power-of-two histogram bucket: 0, 1, 2, 4, 8, ..."""
+    if value <= 0:
+        return 0
+    return 1 << (value - 1).bit_length()
+
+
+class MicroBatcher:
+    """
+    Collects single-item calls from concurrent requests into one batch and
+    dispatches the batch through `process_batch` once.
+
+    process_batch(list_of_items) must return a list of results in the same
+    order. Callers block in submit() until their own result is routed back.
+    A batch is dispatched when it reaches max_batch_size or when the oldest
+    item has waited max_wait_ms, whichever comes first.
+    """
+
+    def __init__(self, name, process_batch, max_batch_size=None, max_wait_ms=None):
+        self.name = name
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size or settings.MODEL_BATCH_MAX_SIZE
+        self.max_wait = (
+            max_wait_ms if max_wait_ms is not None else settings.MODEL_BATCH_MAX_WAIT_MS
+        ) / 1000.0
+
+        self._lock = threading.Lock()
+        self._queue = None
+        self._pid = None
+        self._batches = 0
+        self._items = 0
+        self._batch_sizes = Counter()
+        self._queue_depths = Counter()
+        self._max_queue_depth = 0
+
+        _batchers[name] = self
+
+    # Public API
+
+    def submit(self, item):
+        return self.submit_many([item])[0]
+
+    def submit_many(self, items, batching=None):
+        """Results for items, in order; batching=None follows MODEL_BATCHING"""
+        if not (settings.MODEL_BATCHING if batching is None else batching):
+            return self.process_batch(list(items))
+
+        work_queue = self._ensure_worker()
+        futures = []
+        for item in items:
+            future = Future()
+            work_queue.put((item, future))
+            futures.append(future)
+        return [f.result() for f in futures]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "queue_depth": self._queue.qsize() if self._queue else 0,
+                "max_queue_depth": self._max_queue_depth,
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": self._items / self._batches if self._batches else 0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "queue_depth_histogram": dict(sorted(self._queue_depths.items())),
+            }
+
+    # Worker
+
+    def _ensure_worker(self):
+        # The worker thread is started lazily, and restarted in a forked child
+        # (threads do not survive fork).
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._queue = queue.Queue()
+                    threading.Thread(
+                        target=self._run,
+                        args=(self._queue,),
+                        name=f"batcher-{self.name}",
+                        daemon=True,
+                    ).start()
+                    self._pid = pid
+        return self._queue
+
+    def _run(self, work_queue):
+        while True:
+            batch = [work_queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(work_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._record(len(batch), work_queue.qsize())
+
+            items = [item for item, _ in batch]
+            try:
+                results = self.process_batch(items)
+                if len(results) != len(items):
+                    # zip() would leave the surplus callers waiting forever
+                    raise RuntimeError(
+                        f"{self.name}: batch of {len(items)} returned {len(results)} results"
+                    )
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _record(self, batch_size, queue_depth):
+        with self._lock:
+            self._batches += 1
+            self._items += batch_size
+            self._batch_sizes[batch_size] += 1
+            self._queue_depths[_bucket(queue_depth)] += 1
+            self._max_queue_depth = max(self._max_queue_depth, queue_depth)
+
+
+def batching_stats():
+    """Queue depth and batch-size histograms for every batcher in this process"""
+    return {name: b.stats() for name, b in _batchers.items()}
@@ -0,0 +1,130 @@
+# ner_app/embedding_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+
+from .text_utils import clean_text
+
+
+class EmbeddingCache:
+    """
+    Persistent sentence-embedding cache in a local SQLite file, keyed on a
+    hash of the cleaned text and the encoder (model + backend), so a text is
+    encoded once across requests, processes and restarts.
+
+    Vectors are stored as raw float32 bytes. WAL mode lets every worker
+    process read while one writes; connections are per thread and per pid.
+    Past max_entries the oldest rows are pruned.
+    """
+
+    def __init__(self, path, max_entries):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        self._inserts_since_prune = 0
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_created_at ON embeddings (created_at)"
+            )
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    @staticmethod
+    def key(text, encoder):
+        return hashlib.sha256(f"{encoder}\0{clean_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts, encoder):
+        """{text: float32 vector} for the texts that are cached"""
+        if not settings.EMBEDDING_CACHE_ENABLED or not texts:
+            return {}
+        keys = {self.key(text, encoder): text for text in texts}
+        found = {}
+        connection = self._connection()
+        key_list = list(keys)
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(key_list), 500):
+            chunk = key_list[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = connection.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+            )
+            for key, blob in rows:
+                found[keys[key]] = np.frombuffer(blob, dtype=np.float32)
+        with self._lock:
+            self._counters["hits"] += len(found)
+            self._counters["misses"] += len(keys) - len(found)
+        return found
+
+    def set_many(self, vectors, encoder):
+        """Store {text: vector}"""
+        if not settings.EMBEDDING_CACHE_ENABLED or not vectors:
+            return
+        now = time.time()
+        rows = [
+            (self.key(text, encoder), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in vectors.items()
+        ]
+        connection = self._connection()
+        connection.executemany(
+            "INSERT OR IGNORE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)", rows
+        )
+        with self._lock:
+            self._counters["inserts"] += len(rows)
+            self._inserts_since_prune += len(rows)
+            prune = self._inserts_since_prune >= max(1000, self.max_entries // 100)
+            if prune:
+                self._inserts_since_prune = 0
+        if prune:
+            self._prune(connection)
+
+    def _prune(self, connection):
+        count = connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            connection.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                " SELECT key FROM embeddings ORDER BY created_at LIMIT ?)",
+                (excess,),
+            )
+            with self._lock:
+                self._counters["pruned"] += excess
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        entries = None
+        if settings.EMBEDDING_CACHE_ENABLED and os.path.exists(self.path):
+            entries = self._connection().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {
+            "enabled": settings.EMBEDDING_CACHE_ENABLED,
+            "path": self.path,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "counters": counters,
+        }
+
+
+embedding_cache = EmbeddingCache(
+    settings.EMBEDDING_CACHE_PATH,
+    settings.EMBEDDING_CACHE_MAX_ENTRIES,
+)
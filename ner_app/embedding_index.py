@@ -0,0 +1,243 @@
+# ner_app/embedding_index.py
+import fcntl
+import json
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from .similarity_module import encoder_id
+
+
+class EmbeddingIndex:
+    """
+    Persistent index of claim embeddings linked to QueryHistory ids.
+
+    Vectors are L2-normalized float32 rows appended to a raw file that is
+    memory-mapped for search, so cosine similarity is a dot product. Small
+    corpora are searched by brute force; beyond ann_threshold rows an IVF
+    index (k-means coarse quantizer) restricts the scan to the nprobe
+    closest clusters. Rows added since the last IVF build are always
+    scanned exactly.
+
+    Files in `directory`:
+        vectors.f32  float32 matrix, one row per claim
+        ids.i64      int64 QueryHistory id per row
+        meta.json    vector dimension and encoder that produced the vectors
+
+    Vectors of different encoders are not comparable: an index built by
+    another encoder (model or inference backend) is searched as empty and
+    discarded by the next write, which starts a new one.
+    """
+
+    def __init__(self, directory, ann_threshold=50000, nprobe=8, encoder=None):
+        self.directory = str(directory)
+        self.ann_threshold = ann_threshold
+        self.nprobe = nprobe
+        # None: the encoder currently configured (similarity_module.encoder_id)
+        self.encoder = encoder
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._ids_path = os.path.join(self.directory, "ids.i64")
+        self._meta_path = os.path.join(self.directory, "meta.json")
+        self._lock_path = os.path.join(self.directory, ".lock")
+
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._ids = None
+        self._mapped_rows = 0
+        self._mapped_file = None
+        self._ivf = None
+
+    # Writing
+
+    def add(self, claim_id, vector):
+        self.add_many([claim_id], np.asarray(vector)[None, :])
+
+    def add_many(self, claim_ids, vectors):
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        ids = np.asarray(claim_ids, dtype=np.int64)
+        os.makedirs(self.directory, exist_ok=True)
+
+        # flock serializes appends from every worker process
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                meta = self._read_meta()
+                if meta is not None and meta.get("model") != self._encoder():
+                    self._discard()
+                    meta = None
+                if meta is None:
+                    self._write_meta({"dim": vectors.shape[1], "model": self._encoder()})
+                elif meta["dim"] != vectors.shape[1]:
+                    raise ValueError(f"expected {meta['dim']}-dimensional vectors, got {vectors.shape[1]}")
+
+                # A write that died between the two appends leaves the files
+                # with different row counts; cut both back to the rows they
+                # have in common so new ids stay aligned with their vectors
+                rows = self._complete_rows(vectors.shape[1])
+                self._truncate(self._vectors_path, rows * vectors.shape[1] * 4)
+                self._truncate(self._ids_path, rows * 8)
+                with open(self._vectors_path, "ab") as f:
+                    f.write(vectors.tobytes())
+                with open(self._ids_path, "ab") as f:
+                    f.write(ids.tobytes())
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # Searching
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return self._mapped_rows
+
+    def search(self, vector, k=5):
+        """Top-k (claim_id, cosine score) pairs, best first"""
+        query = _normalize(np.asarray(vector, dtype=np.float32)[None, :])[0]
+
+        with self._lock:
+            self._refresh()
+            n = self._mapped_rows
+            if n == 0:
+                return []
+            vectors, ids = self._vectors, self._ids
+            if n > self.ann_threshold:
+                self._maybe_build_ivf(n)
+                candidates = self._ivf_candidates(query, n)
+            else:
+                candidates = None
+
+        if candidates is None:
+            scores = vectors @ query
+            rows = _top_k(scores, k)
+            return [(int(ids[r]), float(scores[r])) for r in rows]
+
+        scores = vectors[candidates] @ query
+        rows = _top_k(scores, k)
+        return [(int(ids[candidates[r]]), float(scores[r])) for r in rows]
+
+    # Internals (called with self._lock held)
+
+    def _refresh(self):
+        """Re-map the files if other processes have appended rows or started a new index"""
+        try:
+            stat = os.stat(self._vectors_path)
+            ids_size = os.path.getsize(self._ids_path)
+        except FileNotFoundError:
+            self._unmap()
+            return
+        if (stat.st_ino, stat.st_size, ids_size) == self._mapped_file:
+            return
+
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH)
+            try:
+                meta = self._read_meta()
+                if meta is None or meta.get("model") != self._encoder():
+                    self._unmap()
+                    return
+                stat = os.stat(self._vectors_path)
+                if self._mapped_file is None or stat.st_ino != self._mapped_file[0]:
+                    # A new index: the IVF of the previous one does not apply
+                    self._unmap()
+                dim = meta["dim"]
+                rows = self._complete_rows(dim)
+                if rows != self._mapped_rows:
+                    self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, dim))
+                    self._ids = np.memmap(self._ids_path, dtype=np.int64, mode="r", shape=(rows,))
+                    self._mapped_rows = rows
+                self._mapped_file = (stat.st_ino, stat.st_size, os.path.getsize(self._ids_path))
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _unmap(self):
+        self._vectors = None
+        self._ids = None
+        self._mapped_rows = 0
+        self._mapped_file = None
+        self._ivf = None
+
+    def _maybe_build_ivf(self, n):
+        # Rebuild once the corpus has grown 20% past the last build
+        if self._ivf is not None and n < self._ivf["rows"] * 1.2:
+            return
+        from sklearn.cluster import MiniBatchKMeans
+
+        vectors = np.asarray(self._vectors[:n])
+        nlist = max(1, int(np.sqrt(n)))
+        kmeans = MiniBatchKMeans(n_clusters=nlist, n_init=1, batch_size=4096, random_state=0)
+        assignments = kmeans.fit_predict(vectors)
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(nlist + 1))
+        self._ivf = {
+            "rows": n,
+            "centroids": _normalize(kmeans.cluster_centers_.astype(np.float32)),
+            "order": order,
+            "bounds": bounds,
+        }
+
+    def _ivf_candidates(self, query, n):
+        ivf = self._ivf
+        nprobe = min(self.nprobe, len(ivf["centroids"]))
+        probes = _top_k(ivf["centroids"] @ query, nprobe)
+        rows = [ivf["order"][ivf["bounds"][c]:ivf["bounds"][c + 1]] for c in probes]
+        # Rows appended after the last build are not clustered yet
+        rows.append(np.arange(ivf["rows"], n))
+        return np.concatenate(rows)
+
+    # File helpers (called with the flock held)
+
+    def _encoder(self):
+        return self.encoder or encoder_id()
+
+    def _read_meta(self):
+        try:
+            with open(self._meta_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, meta):
+        tmp_path = f"{self._meta_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def _discard(self):
+        # Unlinked, not truncated: readers keep their mapping of the old files
+        for path in (self._vectors_path, self._ids_path, self._meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _complete_rows(self, dim):
+        """Rows that are complete in both files"""
+        if not os.path.exists(self._vectors_path) or not os.path.exists(self._ids_path):
+            return 0
+        return min(os.path.getsize(self._vectors_path) // (dim * 4), os.path.getsize(self._ids_path) // 8)
+
+    @staticmethod
+    def _truncate(path, size):
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            os.truncate(path, size)
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return []
+    rows = np.argpartition(-scores, k - 1)[:k]
+    return rows[np.argsort(-scores[rows])]
+
+
+embedding_index = EmbeddingIndex(
+    settings.EMBEDDING_INDEX_DIR,
+    ann_threshold=settings.EMBEDDING_INDEX_ANN_THRESHOLD,
+    nprobe=settings.EMBEDDING_INDEX_NPROBE,
+)
@@ -0,0 +1,229 @@
+# ner_app/entity_index.py
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import ClaimEntity, Entity, EntityRollup, QueryHistory
+from .text_utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+NAME_MAX_LENGTH = Entity._meta.get_field("name").max_length
+LABEL_MAX_LENGTH = Entity._meta.get_field("label").max_length
+
+
+def entity_key(entity):
+    """(normalized, label) for an NER result item, or None if it is empty"""
+    normalized = normalize_text(entity.get("text") or "")[:NAME_MAX_LENGTH]
+    if not normalized:
+        return None
+    return normalized, (entity.get("label") or "")[:LABEL_MAX_LENGTH]
+
+
+def rollup_bucket(created_at):
+    return created_at.replace(minute=0, second=0, microsecond=0)
+
+
+# Rollups count claims per verdict class (from QueryHistory.is_fake) rather
+# than per raw model verdict, whose wording varies ("False", "Likely fake", ...)
+VERDICT_CLASSES = ("FAKE", "REAL", "UNKNOWN")
+
+
+def verdict_class(is_fake):
+    if is_fake is None:
+        return "UNKNOWN"
+    return "FAKE" if is_fake else "REAL"
+
+
+def index_claims(claims):
+    """
+    Store the entities of saved QueryHistory rows: claims is a list of
+    (claim, entities) with entities as returned by get_named_entities.
+    Adds the missing Entity rows, the ClaimEntity links and increments the
+    hourly rollups. A claim that is already indexed is skipped.
+    """
+    if not settings.ENTITY_INDEX_ENABLED:
+        return
+    claim_keys = {}
+    names = {}
+    for claim, entities in claims:
+        keys = set()
+        for entity in entities or ():
+            key = entity_key(entity)
+            if key is not None:
+                keys.add(key)
+                names.setdefault(key, entity["text"].strip()[:NAME_MAX_LENGTH])
+        if keys:
+            claim_keys[claim] = keys
+    if not claim_keys:
+        return
+
+    entity_ids = _entity_ids(names)
+    with transaction.atomic():
+        indexed = set(
+            ClaimEntity.objects.filter(claim__in=[claim.id for claim in claim_keys])
+            .values_list("claim_id", flat=True)
+            .distinct()
+        )
+        links = []
+        increments = Counter()
+        for claim, keys in claim_keys.items():
+            if claim.id in indexed:
+                continue
+            bucket = rollup_bucket(claim.created_at)
+            verdict = verdict_class(claim.is_fake)
+            for key in keys:
+                links.append(ClaimEntity(
+                    entity_id=entity_ids[key], claim=claim, created_at=claim.created_at
+                ))
+                increments[(entity_ids[key], verdict, bucket)] += 1
+        ClaimEntity.objects.bulk_create(links, ignore_conflicts=True)
+        _increment_rollups(increments)
+
+
+def _entity_ids(names):
+    """{(normalized, label): Entity id}, creating the entities not seen before"""
+    Entity.objects.bulk_create(
+        [Entity(name=name, normalized=key[0], label=key[1]) for key, name in names.items()],
+        ignore_conflicts=True,
+    )
+    ids = {}
+    normalized = {key[0] for key in names}
+    for entity_id, norm, label in Entity.objects.filter(normalized__in=normalized).values_list(
+        "id", "normalized", "label"
+    ):
+        if (norm, label) in names:
+            ids[(norm, label)] = entity_id
+    return ids
+
+
+def _increment_rollups(increments):
+    for (entity_id, verdict, bucket), n in increments.items():
+        rollup = EntityRollup.objects.filter(entity_id=entity_id, verdict=verdict, bucket=bucket)
+        if rollup.update(count=F("count") + n):
+            continue
+        try:
+            with transaction.atomic():
+                EntityRollup.objects.create(
+                    entity_id=entity_id, verdict=verdict, bucket=bucket, count=n
+                )
+        except IntegrityError:
+            # Created concurrently by another worker
+            rollup.update(count=F("count") + n)
+
+
+def unindex_claims(claims):
+    """
+    Remove the entity links of saved claims and take them out of the
+    rollups (counted under each claim's current is_fake), e.g. before the
+    claims are re-indexed with a new NER model
+    """
+    by_id = {claim.id: claim for claim in claims}
+    links = ClaimEntity.objects.filter(claim_id__in=by_id)
+    decrements = Counter()
+    for entity_id, claim_id in links.values_list("entity_id", "claim_id"):
+        claim = by_id[claim_id]
+        bucket = rollup_bucket(claim.created_at)
+        decrements[(entity_id, verdict_class(claim.is_fake), bucket)] += 1
+    links.delete()
+    _decrement_rollups(decrements)
+
+
+def move_verdicts(changes):
+    """
+    Move the rollup counts of re-scored claims to their new verdict class:
+    changes is a list of (claim with the new is_fake, previous is_fake)
+    """
+    changes = {
+        claim.id: (claim, verdict_class(old))
+        for claim, old in changes
+        if verdict_class(claim.is_fake) != verdict_class(old)
+    }
+    if not changes:
+        return
+    decrements = Counter()
+    increments = Counter()
+    links = ClaimEntity.objects.filter(claim_id__in=changes)
+    for entity_id, claim_id in links.values_list("entity_id", "claim_id"):
+        claim, old = changes[claim_id]
+        bucket = rollup_bucket(claim.created_at)
+        decrements[(entity_id, old, bucket)] += 1
+        increments[(entity_id, verdict_class(claim.is_fake), bucket)] += 1
+    _decrement_rollups(decrements)
+    _increment_rollups(increments)
+
+
+def _decrement_rollups(decrements):
+    for (entity_id, verdict, bucket), n in decrements.items():
+        EntityRollup.objects.filter(entity_id=entity_id, verdict=verdict, bucket=bucket).update(
+            count=Greatest(F("count") - n, 0)
+        )
+
+
+def claims_mentioning(name, label=None, limit=50, before=None):
+    """
+    Claims mentioning an entity, newest first. before (a claim id) pages
+    past the last claim of the previous page.
+    """
+    entities = Entity.objects.filter(normalized=normalize_text(name)[:NAME_MAX_LENGTH])
+    if label:
+        entities = entities.filter(label=label)
+    links = ClaimEntity.objects.filter(entity__in=entities)
+    if before is not None:
+        anchor = QueryHistory.objects.filter(id=before).values_list("created_at", flat=True).first()
+        if anchor is not None:
+            links = links.filter(created_at__lte=anchor).exclude(
+                created_at=anchor, claim_id__gte=before
+            )
+    claim_ids = list(
+        links.order_by("-created_at", "-claim_id").values_list("claim_id", flat=True)[:limit * 2]
+    )
+    # An entity with several labels links the same claim more than once
+    claim_ids = list(dict.fromkeys(claim_ids))[:limit]
+    claims = QueryHistory.objects.in_bulk(claim_ids)
+    return [
+        {
+            "id": claim.id,
+            "headline": claim.headline,
+            "verdict": claim.verdict,
+            "credibility": claim.credibility,
+            "confidence": claim.confidence,
+            "is_fake": claim.is_fake,
+            "created_at": claim.created_at,
+        }
+        for claim in (claims[claim_id] for claim_id in claim_ids if claim_id in claims)
+    ]
+
+
+def top_entities(verdict=None, hours=24, label=None, limit=20):
+    """
+    Entities mentioned by the most claims in the last `hours` hours
+    (hour granularity), optionally only claims of one verdict class
+    (FAKE, REAL or UNKNOWN, see verdict_class)
+    """
+    since = rollup_bucket(timezone.now() - timedelta(hours=hours))
+    # Decrements (re-scoring) leave rows at 0
+    rollups = EntityRollup.objects.filter(bucket__gte=since, count__gt=0)
+    if verdict:
+        rollups = rollups.filter(verdict=verdict.upper())
+    if label:
+        rollups = rollups.filter(entity__label=label)
+    rows = (
+        rollups.values("entity_id", "entity__name", "entity__label")
+        .annotate(claims=Sum("count"))
+        .order_by("-claims", "entity_id")[:limit]
+    )
+    return [
+        {
+            "entity": row["entity__name"],
+            "label": row["entity__label"],
+            "claims": row["claims"],
+        }
+        for row in rows
+    ]
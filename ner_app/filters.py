@@ -0,0 +1,62 @@
+# ner_app/filters.py
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db.models import Q
+from rest_framework import filters
+
+# 'simple' does no stemming or stop-word removal, so it treats headlines in
+# every language the same way. It must match the expression of the GIN index
+# on QueryHistory for Postgres to use it.
+SEARCH_CONFIG = "simple"
+
+# Scripts written without spaces between words (Han, kana, Thai, Lao,
+# Khmer, Myanmar) or with particles attached to words (Hangul). The 'simple'
+# parser takes a whole run of them as one word, so 疫苗 would not match
+# 新冠疫苗安全吗; these queries use substring matching instead, backed by the
+# pg_trgm index on the headline.
+UNSEGMENTED_RE = re.compile(
+    "[\u0e00-\u0eff\u1000-\u109f\u1780-\u17ff\u3040-\u30ff\u3400-\u4dbf"
+    "\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\U00020000-\U0002fa1f]"
+)
+
+
+def headline_search_vector():
+    return SearchVector("headline", config=SEARCH_CONFIG)
+
+
+def substring_search(search):
+    """
+    Every space-separated term must appear in the headline; quotes are
+    ignored and a leading - excludes the term
+    """
+    condition = Q()
+    for term in search.replace('"', " ").split():
+        if term.startswith("-") and len(term) > 1:
+            condition &= ~Q(headline__icontains=term[1:])
+        elif term.upper() != "OR":
+            condition &= Q(headline__icontains=term)
+    return condition
+
+
+class HeadlineSearchFilter(filters.BaseFilterBackend):
+    """
+    ?search=   full-text search over the headline (websearch syntax:
+               quoted phrases, OR, -exclusions); substring search for
+               queries in unsegmented scripts (Chinese, Japanese, Thai, ...)
+    ?verdict=  exact verdict match
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search = request.query_params.get("search", "").strip()
+        if search and UNSEGMENTED_RE.search(search):
+            queryset = queryset.filter(substring_search(search))
+        elif search:
+            queryset = queryset.annotate(search=headline_search_vector()).filter(
+                search=SearchQuery(search, config=SEARCH_CONFIG, search_type="websearch")
+            )
+
+        verdict = request.query_params.get("verdict", "").strip()
+        if verdict:
+            queryset = queryset.filter(verdict=verdict)
+        return queryset
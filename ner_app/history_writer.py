@@ -0,0 +1,338 @@
+# ner_app/history_writer.py
+import atexit
+import fcntl
+import functools
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+from .metrics import timed
+from .models import QueryHistory
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryWriter:
+    """
+    Write-behind persistence for QueryHistory rows.
+
+    Requests enqueue unsaved rows and return immediately; a background
+    flusher drains the bounded queue with bulk_create, in batches of
+    `batch_size` or every `flush_interval` seconds, whichever comes first.
+
+    - Backpressure: submit() waits at most `put_timeout` seconds for room in
+      the queue, then writes the row to the spill file instead.
+    - Durability: a batch that cannot be written (database down) is appended
+      to a per-process NDJSON spill file in `spill_dir`; spill files from any
+      process are replayed on the next successful flush. A file claimed for
+      replay by a process that died (or longer than `claim_timeout` seconds
+      ago) is claimed again.
+    - Shutdown: close() (registered with atexit) drains the queue.
+
+    on_saved callbacks run after the row has its primary key. A module-level
+    function, or a functools.partial of one with JSON-serializable keyword
+    arguments, is stored with a spilled row and run after its replay; other
+    callables are lost when the row is spilled.
+    """
+
+    def __init__(self, max_queue, batch_size, flush_interval, put_timeout, spill_dir, claim_timeout=600):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.spill_dir = str(spill_dir)
+        self.claim_timeout = claim_timeout
+
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._counters = Counter()
+
+    # Producer side
+
+    def submit(self, record, on_saved=None):
+        work_queue = self._ensure_worker()
+        try:
+            work_queue.put((record, on_saved), timeout=self.put_timeout)
+        except queue.Full:
+            self._count("queue_full")
+            self._spill([(record, on_saved)])
+
+    def close(self, timeout=30):
+        """Drain the queue and stop the flusher"""
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize() if self._queue else 0,
+                "max_queue": self.max_queue,
+                "batch_size": self.batch_size,
+                "flush_interval": self.flush_interval,
+                "spill_files": len(glob.glob(os.path.join(self.spill_dir, "*.ndjson"))),
+                "counters": dict(self._counters),
+            }
+
+    # Flusher
+
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._queue = queue.Queue(maxsize=self.max_queue)
+                    self._thread = threading.Thread(
+                        target=self._run, args=(self._queue,), name="history-writer", daemon=True
+                    )
+                    self._thread.start()
+                    self._pid = pid
+        return self._queue
+
+    def _run(self, work_queue):
+        stopping = False
+        while not stopping:
+            try:
+                item = work_queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._replay_spill()
+                continue
+
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    item = work_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._flush(batch)
+
+        # Drain whatever arrived after the stop marker
+        rest = []
+        while True:
+            try:
+                item = work_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                rest.append(item)
+        if rest:
+            self._flush(rest)
+        connections.close_all()
+
+    def _flush(self, batch):
+        records = [record for record, _ in batch]
+        try:
+            with timed("db_write"):
+                QueryHistory.objects.bulk_create(records)
+        except Exception as e:
+            logger.error("History write error, spilling batch: %s", e)
+            self._count("failed_flushes")
+            self._spill(batch)
+            # Drop the (possibly broken) connection; the next flush reconnects
+            connections.close_all()
+            return
+
+        self._count("flushes")
+        self._count_n("rows_written", len(records))
+        self._run_callbacks(batch)
+        self._replay_spill()
+
+    def _run_callbacks(self, batch):
+        for record, on_saved in batch:
+            if on_saved is not None:
+                try:
+                    on_saved(record)
+                except Exception as e:
+                    logger.error("History on_saved error: %s", e)
+
+    # Spill file
+
+    def _spill(self, batch):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, f"spill-{os.getpid()}.ndjson")
+        # Database defaults (inserted_at) are set again when the row is replayed
+        fields = [
+            f.attname for f in QueryHistory._meta.concrete_fields
+            if not f.primary_key and not f.has_db_default()
+        ]
+        lines = []
+        for record, on_saved in batch:
+            line = {"row": {name: getattr(record, name) for name in fields}}
+            callback = _callback_spec(on_saved)
+            if callback is not None:
+                line["on_saved"] = callback
+            elif on_saved is not None:
+                self._count("callbacks_dropped")
+            lines.append(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+
+        with self._lock:
+            while True:
+                with open(path, "a", encoding="utf-8") as f:
+                    # The flock is also taken by a process claiming the file
+                    # for replay: once it is held, the file cannot be renamed
+                    # away under this append
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    if not _is_open_file(f, path):
+                        # Claimed between open() and flock(); write a new file
+                        continue
+                    f.writelines(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    break
+        self._count_n("rows_spilled", len(batch))
+
+    def _replay_spill(self):
+        pid = os.getpid()
+        for path in glob.glob(os.path.join(self.spill_dir, "spill-*.ndjson.replaying-*")):
+            if self._claim_is_stale(path):
+                # The replaying process crashed; take the claim over
+                if not self._replay_file(path, f"{path.rsplit('.replaying-', 1)[0]}.replaying-{pid}"):
+                    return
+        for path in glob.glob(os.path.join(self.spill_dir, "spill-*.ndjson")):
+            if not self._replay_file(path, f"{path}.replaying-{pid}"):
+                return
+
+    def _claim_is_stale(self, path):
+        try:
+            owner = int(path.rsplit(".replaying-", 1)[1])
+            age = time.time() - os.path.getmtime(path)
+        except (ValueError, OSError):
+            return False
+        if owner == os.getpid() or age > self.claim_timeout:
+            return True
+        try:
+            os.kill(owner, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    def _replay_file(self, path, claimed):
+        """Replay one spill file; False if the database is still failing"""
+        # Claim the file by renaming it so only one process replays it. The
+        # rename happens under the writer's flock, so no append is in flight
+        # and later appends of the owner go to a new file.
+        try:
+            with open(path, "rb") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                if not _is_open_file(f, path):
+                    return True
+                os.rename(path, claimed)
+        except OSError:
+            return True
+        # Refresh the mtime so the claim is not taken over as stale
+        os.utime(claimed)
+
+        batch = []
+        with open(claimed, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    # Torn last line of a process killed mid-spill
+                    logger.error("Skipping unreadable line in %s", claimed)
+                    self._count("rows_unreadable")
+                    continue
+                row = data["row"]
+                row["created_at"] = parse_datetime(row["created_at"])
+                batch.append((QueryHistory(**row), _load_callback(data.get("on_saved"))))
+        records = [record for record, _ in batch]
+        try:
+            QueryHistory.objects.bulk_create(records, batch_size=self.batch_size)
+        except Exception as e:
+            logger.error("History spill replay error: %s", e)
+            self._release(claimed, path.rsplit(".replaying-", 1)[0])
+            connections.close_all()
+            return False
+        os.remove(claimed)
+        self._count_n("rows_replayed", len(records))
+        self._run_callbacks(batch)
+        return True
+
+    def _release(self, claimed, path):
+        """Give a claimed file back without overwriting a newer spill file of the same name"""
+        try:
+            os.link(claimed, path)
+        except FileExistsError:
+            root = path[:-len(".ndjson")]
+            os.link(claimed, f"{root}-{time.time_ns()}.ndjson")
+        os.remove(claimed)
+
+    def _count(self, name):
+        self._count_n(name, 1)
+
+    def _count_n(self, name, n):
+        with self._lock:
+            self._counters[name] += n
+
+
+def _is_open_file(f, path):
+    """Whether `path` still names the open file `f` (not renamed or replaced)"""
+    try:
+        return os.stat(path).st_ino == os.fstat(f.fileno()).st_ino
+    except FileNotFoundError:
+        return False
+
+
+def _callback_spec(on_saved):
+    """[import path, keyword arguments] of a callback that can be spilled, else None"""
+    kwargs = {}
+    if isinstance(on_saved, functools.partial) and not on_saved.args:
+        on_saved, kwargs = on_saved.func, on_saved.keywords
+    qualname = getattr(on_saved, "__qualname__", "")
+    if not qualname or "<" in qualname or "." in qualname:
+        # Lambdas, nested functions and methods cannot be imported back
+        return None
+    try:
+        json.dumps(kwargs)
+    except (TypeError, ValueError):
+        return None
+    return [f"{on_saved.__module__}.{qualname}", kwargs]
+
+
+def _load_callback(spec):
+    if spec is None:
+        return None
+    path, kwargs = spec
+    try:
+        return functools.partial(import_string(path), **kwargs)
+    except ImportError as e:
+        logger.error("History on_saved callback %s not found: %s", path, e)
+        return None
+
+
+history_writer = HistoryWriter(
+    max_queue=settings.HISTORY_QUEUE_SIZE,
+    batch_size=settings.HISTORY_BATCH_SIZE,
+    flush_interval=settings.HISTORY_FLUSH_INTERVAL,
+    put_timeout=settings.HISTORY_PUT_TIMEOUT,
+    spill_dir=settings.HISTORY_SPILL_DIR,
+    claim_timeout=settings.HISTORY_SPILL_CLAIM_TIMEOUT,
+)
+atexit.register(history_writer.close)
@@ -0,0 +1,342 @@
+# ner_app/inference_server.py
+"""
+Optional inference sidecar (INFERENCE_SERVER_SOCKET).
+
+One long-lived process (`manage.py run_inference_server`) owns the NER,
+sentiment and sentence-embedding models; web workers send it batches over a
+Unix socket instead of loading the models themselves. The server runs every
+request through its own MicroBatchers, so concurrent calls from all web
+workers are batched together.
+
+Transport: each client connection owns a shared-memory arena. Only a small
+length-prefixed JSON header goes over the socket; the batch itself
+(offset-indexed UTF-8 texts) and the result (raw float32 embeddings, or
+UTF-8 JSON for NER / sentiment) are written to the arena, so nothing is
+pickled. A result larger than the arena makes the client allocate a bigger
+one and fetch the result from it.
+"""
+import atexit
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+from collections import Counter
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Models served by the sidecar; web workers only load their tokenizers
+SERVED_MODELS = ("ner", "sentiment", "similarity")
+TOKENIZERS = ("ner_tokenizer", "sentiment_tokenizer")
+
+_header = struct.Struct("!I")
+_offset_dtype = np.dtype("<u4")
+
+
+class InferenceServerError(Exception):
+    """The inference server failed or could not be reached"""
+
+
+# Framing
+
+def _send(sock, message):
+    data = json.dumps(message).encode("utf-8")
+    sock.sendall(_header.pack(len(data)) + data)
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("Inference server connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv(sock):
+    (size,) = _header.unpack(_recv_exact(sock, _header.size))
+    return json.loads(_recv_exact(sock, size))
+
+
+def _encode_texts(texts):
+    """Offsets (len(texts) + 1 little-endian uint32) followed by the UTF-8 texts"""
+    encoded = [text.encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=_offset_dtype)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return offsets.tobytes() + b"".join(encoded)
+
+
+def _decode_texts(buffer, count):
+    offsets = np.frombuffer(buffer, dtype=_offset_dtype, count=count + 1)
+    data = buffer[offsets.nbytes:offsets.nbytes + int(offsets[-1])]
+    return [bytes(data[offsets[i]:offsets[i + 1]]).decode("utf-8") for i in range(count)]
+
+
+def _json_default(value):
+    # Pipelines return numpy scalars (scores, offsets)
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _attach(name):
+    shm = shared_memory.SharedMemory(name=name)
+    # The client owns (and unlinks) the segment; before Python 3.13 attaching
+    # also registers it with this process's resource tracker
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+# Client (web workers)
+
+class _Connection:
+    def __init__(self, path, arena_size, timeout):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self.shm = None
+        self.resize(arena_size)
+
+    def resize(self, size):
+        old = self.shm
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        _send(self.sock, {"op": "attach", "name": self.shm.name})
+        reply = _recv(self.sock)
+        if old is not None:
+            old.close()
+            old.unlink()
+        return reply
+
+    def close(self):
+        try:
+            self.sock.close()
+        finally:
+            self.shm.close()
+            self.shm.unlink()
+
+
+class InferenceClient:
+    """
+    Per-thread connections to the inference server (re-created after fork).
+    call(model, texts, **kwargs) returns what the local pipeline would:
+    a list of results for "ner" / "sentiment", a float32 matrix for
+    "similarity".
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        # Connections opened by this process, closed (and arenas unlinked) at exit
+        self._connections = []
+        # Set by serve(): the server process runs the models itself
+        self.in_process = False
+
+    @property
+    def enabled(self):
+        return bool(settings.INFERENCE_SERVER_SOCKET) and not self.in_process
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid() or local.connection is None:
+            local.connection = _Connection(
+                settings.INFERENCE_SERVER_SOCKET,
+                settings.INFERENCE_SERVER_ARENA_BYTES,
+                settings.INFERENCE_SERVER_TIMEOUT,
+            )
+            local.pid = os.getpid()
+            with self._lock:
+                self._connections.append((local.pid, local.connection))
+        return local.connection
+
+    def _drop_connection(self):
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = None
+        if connection is not None and getattr(self._local, "pid", None) == os.getpid():
+            with self._lock:
+                self._connections.remove((os.getpid(), connection))
+            try:
+                connection.close()
+            except OSError:
+                pass
+
+    def close(self):
+        """Close this process's connections and unlink their arenas"""
+        pid = os.getpid()
+        with self._lock:
+            owned = [c for p, c in self._connections if p == pid]
+            self._connections = []
+        for connection in owned:
+            try:
+                connection.close()
+            except OSError:
+                pass
+
+    def call(self, model, texts, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32) if model == "similarity" else []
+        payload = _encode_texts(texts)
+        try:
+            connection = self._connection()
+            if len(payload) > connection.shm.size:
+                connection.resize(len(payload) * 2)
+                self._count("resizes")
+            connection.shm.buf[:len(payload)] = payload
+            _send(connection.sock, {
+                "op": "call",
+                "model": model,
+                "count": len(texts),
+                "kwargs": kwargs,
+            })
+            reply = _recv(connection.sock)
+            if reply.get("resize"):
+                # Result did not fit; the server keeps it for the new arena
+                reply = connection.resize(reply["resize"])
+                self._count("resizes")
+        except (OSError, ConnectionError, ValueError) as e:
+            self._drop_connection()
+            self._count("errors")
+            raise InferenceServerError(f"Inference server unavailable: {e}") from e
+
+        if not reply.get("ok"):
+            self._count("errors")
+            raise InferenceServerError(reply.get("error", "Inference server error"))
+        self._count("calls")
+        self._count_n("items", len(texts))
+        return _read_result(connection.shm.buf, reply)
+
+    def _count(self, name):
+        self._count_n(name, 1)
+
+    def _count_n(self, name, n):
+        with self._lock:
+            self._counters[name] += n
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "socket": settings.INFERENCE_SERVER_SOCKET or None,
+                "counters": dict(self._counters),
+            }
+
+
+def _read_result(buffer, reply):
+    nbytes = reply["nbytes"]
+    if reply["kind"] == "array":
+        dtype = np.dtype(reply["dtype"])
+        matrix = np.frombuffer(buffer, dtype=dtype, count=nbytes // dtype.itemsize)
+        # Copy out: the arena is reused by the next call
+        return matrix.reshape(reply["shape"]).copy()
+    return json.loads(bytes(buffer[:nbytes]))
+
+
+inference_client = InferenceClient()
+atexit.register(inference_client.close)
+
+
+# Server (run_inference_server)
+
+def _run_model(model, texts, kwargs):
+    """Result bytes and reply metadata for one call"""
+    from .ner_module import get_ner_pipeline, ner_batcher
+    from .semantic_module import get_semantic_pipeline, semantic_batcher
+    from .similarity_module import encode_batcher
+
+    if model == "similarity":
+        matrix = np.ascontiguousarray(np.vstack(encode_batcher.submit_many(texts, batching=True)), dtype=np.float32)
+        return matrix.tobytes(), {"kind": "array", "dtype": "float32", "shape": list(matrix.shape)}
+
+    if model == "ner":
+        batcher, get_pipeline = ner_batcher, get_ner_pipeline
+    elif model == "sentiment":
+        batcher, get_pipeline = semantic_batcher, get_semantic_pipeline
+    else:
+        raise ValueError(f"Unknown model: {model}")
+
+    if kwargs:
+        # Non-default pipeline arguments (e.g. top_k) bypass the shared batcher
+        results = get_pipeline()(texts, batch_size=settings.MODEL_BATCH_MAX_SIZE, **kwargs)
+    else:
+        # Always batched: combining calls from every web worker is the
+        # point of the server, whatever MODEL_BATCHING says
+        results = batcher.submit_many(texts, batching=True)
+        if model == "sentiment":
+            # The batcher wraps each result in a list (single-text output shape)
+            results = [r[0] for r in results]
+    data = json.dumps(results, ensure_ascii=False, default=_json_default).encode("utf-8")
+    return data, {"kind": "json"}
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sock = self.request
+        shm = None
+        pending = None
+        try:
+            while True:
+                try:
+                    message = _recv(sock)
+                except ConnectionError:
+                    return
+
+                if message["op"] == "attach":
+                    if shm is not None:
+                        shm.close()
+                    shm = _attach(message["name"])
+                    if pending is not None and len(pending[0]) <= shm.size:
+                        data, reply = pending
+                        pending = None
+                        shm.buf[:len(data)] = data
+                        _send(sock, reply)
+                    else:
+                        _send(sock, {"ok": True})
+                    continue
+
+                try:
+                    texts = _decode_texts(shm.buf, message["count"])
+                    data, meta = _run_model(message["model"], texts, message.get("kwargs") or {})
+                except Exception as e:
+                    logger.exception("Inference server call failed")
+                    _send(sock, {"ok": False, "error": str(e)})
+                    continue
+
+                reply = {"ok": True, "nbytes": len(data), **meta}
+                if len(data) > shm.size:
+                    pending = (data, reply)
+                    _send(sock, {"ok": True, "resize": len(data) * 2})
+                    continue
+                shm.buf[:len(data)] = data
+                _send(sock, reply)
+        finally:
+            if shm is not None:
+                shm.close()
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(path):
+    """Serve model calls on a Unix socket until interrupted"""
+    # Model calls in this process run locally instead of going to the socket
+    inference_client.in_process = True
+    if os.path.exists(path):
+        os.unlink(path)
+    server = InferenceServer(path, _Handler)
+    os.chmod(path, 0o660)
+    logger.info("Inference server listening on %s", path)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
@@ -0,0 +1,229 @@
+# ner_app/jobs.py
+import ipaddress
+import logging
+import os
+import socket
+from datetime import timedelta
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .analysis import analyze_claim, save_analysis
+from .models import AnalysisJob
+from .text_utils import text_hash
+
+logger = logging.getLogger(__name__)
+
+# Accepted job priorities (higher runs first)
+PRIORITY_RANGE = (-100, 100)
+
+
+def validate_priority(value):
+    """The priority as an int; raises ValueError unless it is an integer in PRIORITY_RANGE"""
+    if isinstance(value, str):
+        try:
+            value = int(value)
+        except ValueError:
+            raise ValueError("priority must be an integer")
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError("priority must be an integer")
+    low, high = PRIORITY_RANGE
+    if not low <= value <= high:
+        raise ValueError(f"priority must be between {low} and {high}")
+    return value
+
+
+def validate_callback_url(url):
+    """
+    Raises ValueError unless url is an http(s) URL on an allowed host.
+    Without an allowlist, hosts resolving to a private, loopback,
+    link-local or otherwise non-public address are rejected, so callbacks
+    can't be pointed at internal services.
+    """
+    if not isinstance(url, str):
+        raise ValueError("callback_url must be an http(s) URL")
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("callback_url must be an http(s) URL")
+    allowed = settings.ANALYSIS_JOB_CALLBACK_ALLOWED_HOSTS
+    if allowed:
+        if parsed.hostname not in allowed:
+            raise ValueError(f"callback_url host {parsed.hostname} is not allowed")
+        return
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, port, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError, ValueError):
+        raise ValueError(f"callback_url host {parsed.hostname} does not resolve")
+    for address in addresses:
+        # Strip an IPv6 zone id ("fe80::1%eth0")
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"callback_url host {parsed.hostname} resolves to a non-public address")
+
+
+def enqueue_job(text, text2="", prefilter=None, priority=0, callback_url=None):
+    """
+    Queue an analysis and return (job, created). A claim that is already
+    queued or running is not queued twice: the existing job is returned,
+    its priority raised to `priority` if higher and the callback added.
+    """
+    dedup_key = text_hash(text) + (text_hash(text2) if text2 else "")
+    callbacks = [callback_url] if callback_url else []
+
+    try:
+        with transaction.atomic():
+            job = AnalysisJob.objects.create(
+                text=text,
+                text2=text2,
+                dedup_key=dedup_key,
+                prefilter=prefilter,
+                priority=priority,
+                max_attempts=settings.ANALYSIS_JOB_MAX_ATTEMPTS,
+                callback_urls=callbacks,
+            )
+        return job, True
+    except IntegrityError:
+        # analysisjob_active_dedup: an identical claim is already active
+        pass
+
+    with transaction.atomic():
+        job = (
+            AnalysisJob.objects.select_for_update()
+            .filter(dedup_key=dedup_key, status__in=AnalysisJob.ACTIVE_STATUSES)
+            .first()
+        )
+        if job is None:
+            # Finished between the insert and this lookup; queue it afresh
+            return enqueue_job(text, text2, prefilter, priority, callback_url)
+        update_fields = []
+        if priority > job.priority:
+            job.priority = priority
+            update_fields.append("priority")
+        if callback_url and callback_url not in job.callback_urls:
+            job.callback_urls = job.callback_urls + [callback_url]
+            update_fields.append("callback_urls")
+        if update_fields:
+            job.save(update_fields=update_fields)
+    return job, False
+
+
+def claim_job(worker):
+    """
+    Mark the highest-priority runnable job as running and return it, or None.
+    SKIP LOCKED lets concurrent workers claim different jobs without waiting.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            AnalysisJob.objects.select_for_update(skip_locked=True)
+            .filter(status=AnalysisJob.QUEUED, run_after__lte=now)
+            .order_by("-priority", "created_at")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = AnalysisJob.RUNNING
+        job.attempts += 1
+        job.started_at = now
+        job.worker = worker
+        job.save(update_fields=["status", "attempts", "started_at", "worker"])
+    return job
+
+
+def run_job(job):
+    """
+    Run a claimed job. A failed custom model call is retried with
+    exponential backoff until max_attempts; the final outcome is saved to
+    history and sent to the job's callbacks.
+    """
+    skip = job.prefilter["skipped"] if job.prefilter else ()
+    try:
+        response, embedding = analyze_claim(job.text, job.text2, skip=skip)
+        response["prefilter"] = job.prefilter
+        custom_model_result = response["customModel"]
+        error = "" if custom_model_result.get("success") else custom_model_result.get("error", "")
+    except Exception as e:
+        logger.exception("Analysis job %s failed", job.id)
+        response, embedding, error = None, None, str(e)
+
+    job.result = response
+    job.error = error
+    if error and job.attempts < job.max_attempts:
+        job.status = AnalysisJob.QUEUED
+        job.run_after = timezone.now() + timedelta(
+            seconds=settings.ANALYSIS_JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+        )
+        job.save(update_fields=["result", "error", "status", "run_after"])
+        return job
+
+    job.status = AnalysisJob.FAILED if error else AnalysisJob.DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=["result", "error", "status", "finished_at"])
+    if response is not None:
+        save_analysis(job.text, response["customModel"], embedding, response.get("entities"))
+    send_callbacks(job)
+    return job
+
+
+def requeue_stale_jobs():
+    """
+    Put back jobs whose worker died mid-run (running for longer than
+    ANALYSIS_JOB_LEASE seconds); returns how many were requeued
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.ANALYSIS_JOB_LEASE)
+    stale = AnalysisJob.objects.filter(status=AnalysisJob.RUNNING, started_at__lt=cutoff)
+    requeued = stale.filter(attempts__lt=F("max_attempts")).update(status=AnalysisJob.QUEUED)
+    stale.update(
+        status=AnalysisJob.FAILED,
+        error="Worker lease expired",
+        finished_at=timezone.now(),
+    )
+    return requeued
+
+
+def send_callbacks(job):
+    payload = job_payload(job)
+    for url in job.callback_urls:
+        try:
+            # Checked again: DNS may have changed since the job was queued
+            validate_callback_url(url)
+        except ValueError as e:
+            logger.warning("Callback for job %s to %s skipped: %s", job.id, url, e)
+            continue
+        try:
+            # No redirects: a public URL could redirect to an internal one
+            response = requests.post(
+                url, json=payload, timeout=settings.ANALYSIS_JOB_CALLBACK_TIMEOUT, allow_redirects=False
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.warning("Callback for job %s to %s failed: %s", job.id, url, e)
+
+
+def job_payload(job):
+    """JSON representation returned by /jobs/<id>/ and posted to callbacks"""
+    payload = {
+        "id": str(job.id),
+        "status": job.status,
+        "priority": job.priority,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "error": job.error or None,
+    }
+    if job.status in (AnalysisJob.DONE, AnalysisJob.FAILED):
+        payload["result"] = job.result
+    return payload
+
+
+def worker_name(index=0):
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
@@ -0,0 +1,73 @@
+# ner_app/long_document.py
+from django.conf import settings
+
+
+def split_windows(tokenizer, text, window_tokens=None, stride=None):
+    """
+    Tokenizes `text` once and returns (start, end) character ranges of
+    overlapping windows of at most `window_tokens` tokens; consecutive
+    windows share `stride` tokens so entities on a boundary appear whole in
+    at least one window.
+    """
+    window_tokens = window_tokens or settings.DOCUMENT_WINDOW_TOKENS
+    stride = stride if stride is not None else settings.DOCUMENT_WINDOW_STRIDE
+
+    offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+    if len(offsets) <= window_tokens:
+        return [(0, len(text))]
+
+    windows = []
+    step = max(1, window_tokens - stride)
+    start = 0
+    while True:
+        end = min(start + window_tokens, len(offsets))
+        windows.append((offsets[start][0], offsets[end - 1][1]))
+        if end == len(offsets):
+            return windows
+        start += step
+
+
+def document_windows(tokenizer, text):
+    """
+    Windows of a text longer than DOCUMENT_WINDOW_TOKENS tokens, or None when
+    it fits in one window and runs through the model as is.
+    """
+    # The WordPiece / SentencePiece tokenizers of the models here produce at
+    # most two tokens per character, so short texts skip the tokenizer
+    if len(text) * 2 <= settings.DOCUMENT_WINDOW_TOKENS:
+        return None
+    windows = split_windows(tokenizer, text)
+    return windows if len(windows) > 1 else None
+
+
+def merge_entity_spans(spans):
+    """
+    Merges entity spans found in overlapping windows. Overlapping spans with
+    the same label are joined (an entity cut by one window is complete in the
+    next); for overlapping spans with different labels the higher score wins.
+    """
+    merged = []
+    for span in sorted(spans, key=lambda s: (s["start"], -s["end"])):
+        if merged and span["start"] < merged[-1]["end"]:
+            last = merged[-1]
+            if span["label"] == last["label"]:
+                last["end"] = max(last["end"], span["end"])
+                last["score"] = max(last["score"], span["score"])
+            elif span["score"] > last["score"]:
+                merged[-1] = dict(span)
+            continue
+        merged.append(dict(span))
+    return merged
+
+
+def aggregate_window_scores(window_scores, weights):
+    """
+    Per-document label distribution: the average of each window's label
+    scores weighted by the window length.
+    """
+    totals = {}
+    for scores, weight in zip(window_scores, weights):
+        for s in scores:
+            totals[s["label"]] = totals.get(s["label"], 0.0) + s["score"] * weight
+    total_weight = sum(weights) or 1
+    return {label: value / total_weight for label, value in totals.items()}
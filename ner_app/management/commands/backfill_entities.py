@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from ner_app.entity_index import index_claims
+from ner_app.models import QueryHistory
+from ner_app.ner_module import get_named_entities_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs NER over history rows that have no indexed entities yet (claims "
+        "analyzed before the entity index existed) and indexes the results"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=64, help="Headlines per NER batch")
+        parser.add_argument("--limit", type=int, help="Stop after this many rows")
+
+    def handle(self, *args, **options):
+        queryset = (
+            QueryHistory.objects.filter(entities__isnull=True)
+            .only("id", "headline", "is_fake", "created_at")
+            .order_by("id")
+        )
+        batch_size = options["batch_size"]
+        limit = options["limit"]
+        last_id = 0
+        done = 0
+        while limit is None or done < limit:
+            size = batch_size if limit is None else min(batch_size, limit - done)
+            claims = list(queryset.filter(id__gt=last_id)[:size])
+            if not claims:
+                break
+            entities = get_named_entities_batch([claim.headline for claim in claims])
+            index_claims(list(zip(claims, entities)))
+            last_id = claims[-1].id
+            done += len(claims)
+            self.stdout.write(f"Indexed {done} claims (last id {last_id})")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled entities for {done} claims"))
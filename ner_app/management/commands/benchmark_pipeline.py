@@ -0,0 +1,279 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from ner_app import resources
+from ner_app.model_client import model_client
+from ner_app.model_registry import registry
+from ner_app.ner_module import get_named_entities, get_named_entities_batch
+from ner_app.semantic_module import analyze_semantics, analyze_semantics_batch
+from ner_app.similarity_module import calculate_similarity, calculate_similarity_batch
+
+# One sentence per language, repeated to reach the requested input length
+SAMPLES = {
+    "en": "The prime minister said on Monday that the new vaccine had been approved in London.",
+    "es": "El presidente anunció el lunes en Madrid que la nueva vacuna había sido aprobada.",
+    "fr": "Le président a annoncé lundi à Paris que le nouveau vaccin avait été approuvé.",
+    "de": "Die Kanzlerin sagte am Montag in Berlin, dass der neue Impfstoff zugelassen wurde.",
+    "ar": "قال رئيس الوزراء يوم الاثنين في القاهرة إن اللقاح الجديد قد تمت الموافقة عليه.",
+    "zh": "总理周一在北京表示，新疫苗已经获得批准。",
+}
+
+STAGES = ("entities", "sentiment", "similarity", "analyze", "analyze_batch")
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def _str_list(value):
+    return [v for v in value.split(",") if v]
+
+
+class StubModelHandler(BaseHTTPRequestHandler):
+    """Stands in for the remote fact-check server with a fixed latency"""
+    latency = 0.0
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        query = json.loads(self.rfile.read(length) or b"{}").get("query", "")
+        time.sleep(self.latency)
+        body = json.dumps({
+            "response": {
+                "verdict": "VERIFIED",
+                "credibility": 4,
+                "summary": f"Stub verdict for: {query[:80]}",
+                "reasoning": "Benchmark stub server",
+                "url_references": [],
+            }
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks NER, sentiment, similarity, /analyze/ and /analyze/batch/ across input "
+        "lengths, languages, batch sizes and concurrency levels against a stub model server; "
+        "reports latency percentiles, node throughput and per-worker peak RSS as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stages", type=_str_list, default=list(STAGES), help=f"Comma-separated subset of {','.join(STAGES)}")
+        parser.add_argument("--lengths", type=_int_list, default=[100, 1000], help="Input lengths in characters")
+        parser.add_argument("--languages", type=_str_list, default=["en", "es", "zh"], help=f"Any of {','.join(SAMPLES)}")
+        parser.add_argument("--batch-sizes", type=_int_list, default=[1, 8], help="Texts per call (pipeline stages and /analyze/batch/)")
+        parser.add_argument("--concurrency", type=_int_list, default=[1, 8], help="Concurrent callers")
+        parser.add_argument(
+            "--workers", type=_int_list, default=[1],
+            help="Worker process counts to sweep (forked after warm-up, each with cores / N inference threads)",
+        )
+        parser.add_argument("--requests", type=int, default=20, help="Calls per configuration")
+        parser.add_argument("--stub-latency", type=float, default=200, help="Stub model server latency in ms")
+        parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+
+    def handle(self, *args, **options):
+        StubModelHandler.latency = options["stub_latency"] / 1000.0
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubModelHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        model_client.url = f"http://127.0.0.1:{server.server_port}/query"
+
+        # Throwaway database so /analyze/ history writes don't touch real data
+        setup_test_environment()
+        old_db_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+        # Caching, coalescing and verdict reuse would turn repeated
+        # benchmark inputs into cache hits; the embedding index lives on disk.
+        # The pre-filter would reject the short repeated inputs, and
+        # write-behind history rows could still be queued (or spilled to the
+        # real spill directory) when the throwaway database is dropped.
+        overrides = override_settings(
+            RESULT_CACHE_ENABLED=False,
+            SINGLE_FLIGHT_ENABLED=False,
+            EMBEDDING_INDEX_ENABLED=False,
+            EMBEDDING_CACHE_ENABLED=False,
+            VERDICT_REUSE_THRESHOLD=0,
+            PREFILTER_ENABLED=False,
+            HISTORY_WRITE_BEHIND=False,
+        )
+        overrides.enable()
+        try:
+            registry.warm_up()
+            results = self.run_sweep(options)
+        finally:
+            overrides.disable()
+            connection.creation.destroy_test_db(old_db_name, verbosity=0)
+            teardown_test_environment()
+            server.shutdown()
+
+        report = {
+            "meta": {
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                "pid": os.getpid(),
+                "cpu_count": os.cpu_count(),
+                "inference_backend": settings.INFERENCE_BACKEND,
+                "model_batching": settings.MODEL_BATCHING,
+                "model_load": registry.stats(),
+                "resources": resources.stats(),
+                "stub_latency_ms": options["stub_latency"],
+            },
+            "results": results,
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def run_sweep(self, options):
+        results = []
+        for stage in options["stages"]:
+            # /analyze/ takes one claim per request
+            batch_sizes = [1] if stage == "analyze" else options["batch_sizes"]
+            for language in options["languages"]:
+                for length in options["lengths"]:
+                    for batch_size in batch_sizes:
+                        for concurrency in options["concurrency"]:
+                            for workers in options["workers"]:
+                                result = self.measure(
+                                    stage, language, length, batch_size, concurrency,
+                                    options["requests"], workers,
+                                )
+                                results.append(result)
+                                self.stderr.write(
+                                    f"{stage:14} {language} len={length:<5} batch={batch_size:<3} "
+                                    f"conc={concurrency:<3} workers={workers:<2} "
+                                    f"p50={result['p50_ms']:.1f}ms items/s={result['items_per_sec']:.1f}"
+                                )
+        return results
+
+    def measure(self, stage, language, length, batch_size, concurrency, requests, workers):
+        # A unique prefix per text keeps every input distinct
+        payloads = [
+            [_make_text(language, length, f"{r}-{i}") for i in range(batch_size)]
+            for r in range(requests)
+        ]
+
+        if workers == 1:
+            latencies, wall = _run_calls(stage, payloads, concurrency)
+            worker_rss = [resources.process_memory()["peak_rss_mb"]]
+        else:
+            # Forked after warm-up, like gunicorn workers with preload_app:
+            # weights are shared copy-on-write and each worker gets its share
+            # of the cores. Each worker runs `concurrency` callers.
+            connections.close_all()
+            pool = multiprocessing.get_context("fork").Pool(
+                workers, initializer=_init_worker, initargs=(workers,)
+            )
+            try:
+                start = time.perf_counter()
+                parts = pool.starmap(
+                    _worker_calls,
+                    [(stage, payloads[w::workers], concurrency) for w in range(workers)],
+                )
+                wall = time.perf_counter() - start
+            finally:
+                pool.terminate()
+            latencies = [latency for part, _ in parts for latency in part]
+            worker_rss = [rss for _, rss in parts]
+
+        ms = np.array(latencies) * 1000
+        return {
+            "stage": stage,
+            "language": language,
+            "length": length,
+            "batch_size": batch_size,
+            "concurrency": concurrency,
+            "workers": workers,
+            "threads_per_worker": resources.thread_budget(None if workers == 1 else workers)[0],
+            "requests": requests,
+            "p50_ms": float(np.percentile(ms, 50)),
+            "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99)),
+            # Node throughput: all workers together
+            "requests_per_sec": requests / wall,
+            "items_per_sec": requests * batch_size / wall,
+            "peak_rss_mb": max(worker_rss),
+            "worker_peak_rss_mb": worker_rss,
+        }
+
+
+def _run_calls(stage, payloads, concurrency):
+    """(per-call latencies in seconds, wall time) for calling the stage on every payload"""
+    call = _stage_callable(stage)
+    latencies = []
+    lock = threading.Lock()
+
+    def timed(texts):
+        start = time.perf_counter()
+        call(texts)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, payloads))
+    return latencies, time.perf_counter() - start
+
+
+def _init_worker(workers):
+    resources.configure_process(workers)
+
+
+def _worker_calls(stage, payloads, concurrency):
+    latencies, _ = _run_calls(stage, payloads, concurrency)
+    return latencies, resources.process_memory()["peak_rss_mb"]
+
+
+def _stage_callable(stage):
+    if stage == "entities":
+        return lambda texts: get_named_entities(texts[0]) if len(texts) == 1 else get_named_entities_batch(texts)
+    if stage == "sentiment":
+        return lambda texts: analyze_semantics(texts[0]) if len(texts) == 1 else analyze_semantics_batch(texts)
+    if stage == "similarity":
+        def similarity(texts):
+            pairs = [(t, t[::-1]) for t in texts]
+            if len(pairs) == 1:
+                return calculate_similarity(*pairs[0])
+            return calculate_similarity_batch(pairs)
+        return similarity
+    if stage == "analyze":
+        def analyze(texts):
+            response = Client().post("/analyze/", {"text": texts[0]}, content_type="application/json")
+            assert response.status_code == 200, response.content
+        return analyze
+    if stage == "analyze_batch":
+        def analyze_batch(texts):
+            response = Client().post("/analyze/batch/", texts, content_type="application/json")
+            assert response.status_code == 200, response.content
+            b"".join(response.streaming_content)
+        return analyze_batch
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def _make_text(language, length, tag):
+    sample = SAMPLES[language]
+    text = f"[{tag}] " + " ".join([sample] * (length // len(sample) + 1))
+    return text[:length]
@@ -1,35 +1,169 @@
 import csv
+import gzip
+import json
 import os
-from django.core.management.base import BaseCommand
+import re
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from ner_app.models import QueryHistory
 
+FIELDS = [
+    "id", "headline", "text_hash", "serpapi_result", "gemini_result", "factcheck_result",
+    "verdict", "credibility", "confidence", "is_fake", "created_at",
+]
+JSON_FIELDS = {"serpapi_result", "gemini_result", "factcheck_result"}
+JSON_COLUMNS = [FIELDS.index(name) for name in sorted(JSON_FIELDS)]
+
+# "High (4.0/5)" -> ("High", 4.0)
+CREDIBILITY_RE = re.compile(r"^\s*(.*?)\s*\(\s*([\d.]+)\s*/\s*5\s*\)\s*$")
+
+FORMATS = {"csv": "history.csv", "csv.gz": "history.csv.gz", "parquet": "history.parquet"}
+
+
 class Command(BaseCommand):
-    help = 'Exports QueryHistory table to history.csv'
+    help = 'Exports the QueryHistory table (streamed in chunks) to CSV, gzip-compressed CSV or Parquet'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=FORMATS, default="csv", help="Output format (default: csv)")
+        parser.add_argument("--output", help="Output file (default: history.<format> in the current directory)")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows fetched per server-side cursor round trip")
+        parser.add_argument("--since", help="Only export rows created after this ISO-8601 timestamp")
+        parser.add_argument(
+            "--watermark",
+            help="JSON file holding the insert time exported up to; only rows inserted "
+                 "later are exported and the file is advanced after a successful export",
+        )
+        parser.add_argument(
+            "--settle", type=float, default=60,
+            help="With --watermark, leave rows inserted in the last SETTLE seconds for the "
+                 "next run, so inserts still being committed are not skipped",
+        )
 
-    def handle(self, *args, **kwargs):
-        output_file = os.path.join(os.getcwd(), "history.csv")
-        self.stdout.write(f"Writing CSV to: {output_file}")
+    def handle(self, *args, **options):
+        fmt = options["format"]
+        output_file = options["output"] or os.path.join(os.getcwd(), FORMATS[fmt])
+        self.stdout.write(f"Writing {fmt} to: {output_file}")
+
+        queryset = QueryHistory.objects.order_by("created_at", "id")
+        queryset, upper = self.apply_watermark(queryset, options)
+        # values_list + iterator: server-side cursor, no model instances, no
+        # queryset result cache
+        rows = queryset.values_list(*FIELDS).iterator(chunk_size=options["chunk_size"])
 
         try:
-            with open(output_file, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                # CSV headers
-                writer.writerow(["id", "headline", "serpapi_result", "gemini_result", "factcheck_result", "verdict", "credibility", "created_at"])
-                
-                # Write rows
-                for q in QueryHistory.objects.all():
-                    writer.writerow([
-                        q.id,
-                        q.headline,
-                        q.serpapi_result,
-                        q.gemini_result,
-                        q.factcheck_result,
-                        q.verdict,
-                        q.credibility,
-                        q.created_at
-                    ])
-            
-            self.stdout.write(self.style.SUCCESS(f"Successfully exported {QueryHistory.objects.count()} records to history.csv"))
+            if fmt == "parquet":
+                count = self.write_parquet(output_file, rows, options["chunk_size"])
+            else:
+                count = self.write_csv(output_file, rows, compress=fmt == "csv.gz")
         except Exception as e:
-            self.stderr.write(self.style.ERROR(f"Error exporting CSV: {e}"))
+            # Non-zero exit status, so a scheduled export can tell it failed
+            raise CommandError(f"Error exporting history: {e}") from e
+
+        if upper is not None:
+            with open(options["watermark"], "w") as f:
+                json.dump({"inserted_at": upper.isoformat()}, f)
+
+        self.stdout.write(self.style.SUCCESS(f"Successfully exported {count} records to {output_file}"))
+
+    def apply_watermark(self, queryset, options):
+        if options["since"]:
+            since = parse_datetime(options["since"])
+            if since is None:
+                raise CommandError(f"Invalid --since timestamp: {options['since']}")
+            queryset = queryset.filter(created_at__gt=since)
+
+        path = options["watermark"]
+        if not path:
+            return queryset, None
+        # Watermark on the insert time, not created_at: the write-behind
+        # flusher and spill replay insert rows long after they were created,
+        # behind rows that are already exported. Everything inserted up to
+        # `upper` is exported now and everything after it on the next run.
+        upper = timezone.now() - timedelta(seconds=options["settle"])
+        queryset = queryset.filter(inserted_at__lte=upper)
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    mark = datetime.fromisoformat(json.load(f)["inserted_at"])
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                raise CommandError(f"Invalid watermark file {path}: {e}") from e
+            queryset = queryset.filter(inserted_at__gt=mark)
+        return queryset, upper
+
+    def write_csv(self, output_file, rows, compress):
+        opener = gzip.open if compress else open
+        count = 0
+        with opener(output_file, "wt", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            # CSV headers
+            writer.writerow(FIELDS)
+            for row in rows:
+                writer.writerow(_encode_json_columns(row))
+                count += 1
+        return count
+
+    def write_parquet(self, output_file, rows, chunk_size):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([
+            ("id", pa.int64()),
+            ("headline", pa.string()),
+            ("text_hash", pa.string()),
+            ("serpapi_result", pa.string()),
+            ("gemini_result", pa.string()),
+            ("factcheck_result", pa.string()),
+            ("verdict", pa.dictionary(pa.int32(), pa.string())),
+            ("credibility", pa.dictionary(pa.int32(), pa.string())),
+            ("credibility_score", pa.float64()),
+            ("confidence", pa.float64()),
+            ("is_fake", pa.bool_()),
+            ("created_at", pa.timestamp("us", tz="UTC")),
+        ])
+
+        count = 0
+        with pq.ParquetWriter(output_file, schema, compression="zstd") as writer:
+            for chunk in _chunks(rows, chunk_size):
+                columns = {name: [] for name in schema.names}
+                for row in chunk:
+                    record = dict(zip(FIELDS, _encode_json_columns(row)))
+                    level, score = _split_credibility(record["credibility"])
+                    record["credibility"] = level
+                    record["credibility_score"] = score
+                    for name in schema.names:
+                        columns[name].append(record[name])
+                writer.write_table(pa.table(columns, schema=schema))
+                count += len(chunk)
+        return count
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _encode_json_columns(row):
+    """JSON blob columns as JSON text for CSV / Parquet string columns"""
+    row = list(row)
+    for i in JSON_COLUMNS:
+        if row[i] is not None:
+            row[i] = json.dumps(row[i], ensure_ascii=False)
+    return row
+
 
+def _split_credibility(value):
+    """Credibility label and its numeric 0-5 score, if present"""
+    if not value:
+        return value, None
+    match = CREDIBILITY_RE.match(value)
+    if not match:
+        return value, None
+    return match.group(1), float(match.group(2))
@@ -0,0 +1,275 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Max, Min
+
+from ner_app import resources
+from ner_app.analysis import build_history_record
+from ner_app.entity_index import index_claims, move_verdicts, unindex_claims
+from ner_app.model_client import call_custom_model
+from ner_app.models import QueryHistory
+from ner_app.ner_module import get_named_entities_batch
+
+STAGES = ("verdict", "entities")
+
+# Columns rewritten from a new custom model result (see build_history_record)
+VERDICT_FIELDS = [
+    "serpapi_result", "gemini_result", "factcheck_result",
+    "verdict", "credibility", "confidence", "is_fake",
+]
+
+
+def _str_list(value):
+    return [v for v in value.split(",") if v]
+
+
+class RateLimiter:
+    """Spaces calls at least 1 / rate seconds apart across the threads of a process"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next)
+            self._next = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-scores QueryHistory rows after a model upgrade: re-runs the custom model "
+        "(verdict) and / or NER (entities) over id-range shards in a process pool and "
+        "writes the results back with bulk updates. Progress is checkpointed per shard, "
+        "so an interrupted run resumes where it stopped. Claims are re-scored from the "
+        "stored headline (the first 200 characters)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stages", type=_str_list, default=list(STAGES), help=f"Comma-separated subset of {','.join(STAGES)}")
+        parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Worker processes (shards run in parallel)")
+        parser.add_argument("--shard-size", type=int, default=10000, help="Ids per shard (the unit of checkpointing)")
+        parser.add_argument("--batch-size", type=int, default=64, help="Rows per NER batch / bulk update")
+        parser.add_argument("--concurrency", type=int, default=4, help="Concurrent custom model calls per process")
+        parser.add_argument("--rate", type=float, default=0, help="Custom model calls per second, all processes together (0 = unlimited)")
+        parser.add_argument("--min-id", type=int, help="First history id to re-score")
+        parser.add_argument("--max-id", type=int, help="Last history id to re-score (default: the current maximum)")
+        parser.add_argument("--checkpoint", default="rescore_history.checkpoint.json", help="Checkpoint file")
+        parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and start over")
+        parser.add_argument("--dry-run", action="store_true", help="Run inference without writing or checkpointing; report throughput")
+
+    def handle(self, *args, **options):
+        stages = options["stages"]
+        unknown = set(stages) - set(STAGES)
+        if unknown or not stages:
+            raise CommandError(f"Unknown stages: {', '.join(sorted(unknown)) or '(none)'}")
+
+        checkpoint = None if options["dry_run"] else self.load_checkpoint(options)
+        if checkpoint is None:
+            bounds = QueryHistory.objects.aggregate(first=Min("id"), last=Max("id"))
+            if bounds["first"] is None:
+                self.stdout.write("History is empty")
+                return
+            checkpoint = {
+                "stages": stages,
+                "shard_size": options["shard_size"],
+                # Rows added after the run started are already scored by the new model
+                "min_id": max(bounds["first"], options["min_id"] or 0),
+                "max_id": min(bounds["last"], options["max_id"] or bounds["last"]),
+                "done": [],
+                # Ids whose custom model call failed; retried on the next run
+                "failed": [],
+                "totals": {},
+            }
+
+        size = checkpoint["shard_size"]
+        done = {tuple(shard) for shard in checkpoint["done"]}
+        shards = [
+            (start, min(start + size, checkpoint["max_id"] + 1), None)
+            for start in range(checkpoint["min_id"], checkpoint["max_id"] + 1, size)
+            if (start, min(start + size, checkpoint["max_id"] + 1)) not in done
+        ]
+        failed = sorted(checkpoint.get("failed", []))
+        for i in range(0, len(failed), size):
+            ids = failed[i:i + size]
+            shards.append((ids[0], ids[-1] + 1, ids))
+        self.stdout.write(
+            f"{len(shards)} shards left ({len(done)} done, {len(failed)} failed ids to retry), "
+            f"ids {checkpoint['min_id']}-{checkpoint['max_id']}"
+        )
+
+        processes = max(1, min(options["processes"], len(shards)))
+        worker_options = {
+            "stages": checkpoint["stages"],
+            "batch_size": options["batch_size"],
+            "concurrency": options["concurrency"],
+            "rate": options["rate"] / processes if options["rate"] else 0,
+            "dry_run": options["dry_run"],
+        }
+        totals = Counter()
+        start = time.perf_counter()
+        connections.close_all()
+        if processes == 1:
+            _init_worker(worker_options, 1)
+            results = map(_rescore_shard, shards)
+            pool = None
+        else:
+            pool = multiprocessing.get_context("fork").Pool(
+                processes, initializer=_init_worker, initargs=(worker_options, processes)
+            )
+            results = pool.imap_unordered(_rescore_shard, shards)
+        try:
+            for shard, shard_stats, failed_ids in results:
+                totals.update(shard_stats)
+                if not options["dry_run"]:
+                    start_id, end_id, ids = shard
+                    retried = set(ids or ())
+                    if ids is None:
+                        checkpoint["done"].append([start_id, end_id])
+                    checkpoint["failed"] = sorted(
+                        set(checkpoint.get("failed", [])) - retried | set(failed_ids)
+                    )
+                    checkpoint["totals"] = dict(Counter(checkpoint["totals"]) + Counter(shard_stats))
+                    self.save_checkpoint(options["checkpoint"], checkpoint)
+                self.stdout.write(
+                    f"{'Retry' if shard[2] else 'Shard'} {shard[0]}-{shard[1] - 1}: "
+                    f"{shard_stats.get('rows', 0)} rows, {len(failed_ids)} failed"
+                )
+        finally:
+            if pool is not None:
+                pool.terminate()
+        elapsed = time.perf_counter() - start
+
+        report = {
+            "dry_run": options["dry_run"],
+            "stages": checkpoint["stages"],
+            "processes": processes,
+            "shards": len(shards),
+            "elapsed_sec": round(elapsed, 3),
+            "rows_per_sec": round(totals["rows"] / elapsed, 2) if elapsed else None,
+            **{name: round(value, 3) if isinstance(value, float) else value for name, value in sorted(totals.items())},
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+        if not options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(f"Checkpoint: {options['checkpoint']}"))
+
+    def load_checkpoint(self, options):
+        path = options["checkpoint"]
+        if options["restart"] or not os.path.exists(path):
+            return None
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if checkpoint["stages"] != options["stages"] or checkpoint["shard_size"] != options["shard_size"]:
+            raise CommandError(
+                f"{path} was written with --stages {','.join(checkpoint['stages'])} "
+                f"--shard-size {checkpoint['shard_size']}; pass the same options or --restart"
+            )
+        return checkpoint
+
+    def save_checkpoint(self, path, checkpoint):
+        # Write and rename, so a crash never leaves a truncated checkpoint
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, path)
+
+
+_worker_options = {}
+
+
+def _init_worker(options, processes):
+    _worker_options.update(options, limiter=RateLimiter(options["rate"]))
+    resources.configure_process(processes)
+
+
+def _call_custom_model(text):
+    _worker_options["limiter"].wait()
+    return call_custom_model(text)
+
+
+def _rescore_shard(shard):
+    """
+    Re-score the ids in [start, end) (or only the listed ids) batch by
+    batch; returns (shard, stats, ids whose custom model call failed)
+    """
+    options = _worker_options
+    stages = options["stages"]
+    stats = Counter()
+    failed_ids = []
+    start_id, end_id, ids = shard
+    queryset = QueryHistory.objects.filter(id__in=ids) if ids else QueryHistory.objects.filter(id__lt=end_id)
+    last_id = start_id - 1
+    with ThreadPoolExecutor(max_workers=options["concurrency"]) as remote_pool:
+        while True:
+            claims = list(
+                queryset.filter(id__gt=last_id)
+                .order_by("id")
+                .only("id", "headline", "verdict", "is_fake", "created_at")[:options["batch_size"]]
+            )
+            if not claims:
+                break
+            last_id = claims[-1].id
+            headlines = [claim.headline for claim in claims]
+            stats["rows"] += len(claims)
+
+            records = {}
+            if "verdict" in stages:
+                started = time.perf_counter()
+                for claim, result in zip(claims, remote_pool.map(_call_custom_model, headlines)):
+                    if result.get("success"):
+                        records[claim.id] = build_history_record(claim.headline, result)
+                    else:
+                        failed_ids.append(claim.id)
+                        stats["errors"] += 1
+                stats["remote_calls"] += len(claims)
+                stats["remote_sec"] += time.perf_counter() - started
+
+            entities = None
+            if "entities" in stages:
+                started = time.perf_counter()
+                entities = get_named_entities_batch(headlines)
+                stats["entities_sec"] += time.perf_counter() - started
+
+            changes = [
+                (claim, claim.is_fake) for claim in claims
+                if claim.id in records and records[claim.id].is_fake != claim.is_fake
+            ]
+            stats["verdicts_changed"] += sum(
+                1 for claim in claims
+                if claim.id in records
+                and (records[claim.id].verdict or "").upper() != (claim.verdict or "").upper()
+            )
+            if options["dry_run"]:
+                continue
+
+            started = time.perf_counter()
+            with transaction.atomic():
+                if entities is not None:
+                    # Counted under the old is_fake, re-added under the new one
+                    unindex_claims(claims)
+                updated = [claim for claim in claims if claim.id in records]
+                for claim in updated:
+                    for field in VERDICT_FIELDS:
+                        setattr(claim, field, getattr(records[claim.id], field))
+                if updated:
+                    QueryHistory.objects.bulk_update(updated, VERDICT_FIELDS)
+                if entities is not None:
+                    index_claims(list(zip(claims, entities)))
+                else:
+                    move_verdicts(changes)
+            stats["updated"] += len(updated)
+            stats["db_sec"] += time.perf_counter() - started
+    return shard, dict(stats), failed_ids
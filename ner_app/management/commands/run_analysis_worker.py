@@ -0,0 +1,85 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from ner_app.jobs import claim_job, requeue_stale_jobs, run_job, worker_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Works off queued async /analyze/ jobs. Each thread claims the next job "
+        "with SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers can "
+        "share the queue."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=4, help="Jobs processed concurrently")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to sleep when the queue is empty")
+        parser.add_argument("--once", action="store_true", help="Exit once the queue is empty")
+        parser.add_argument(
+            "--requeue-interval", type=float, default=settings.ANALYSIS_JOB_REQUEUE_INTERVAL,
+            help="Seconds between checks for jobs whose worker died mid-run",
+        )
+
+    def handle(self, *args, **options):
+        self.requeue()
+
+        stop = threading.Event()
+        threads = [
+            threading.Thread(
+                target=self.work,
+                args=(worker_name(index), options["poll_interval"], options["once"], stop),
+                name=f"analysis-worker-{index}",
+            )
+            for index in range(options["threads"])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f"Started {len(threads)} worker threads")
+        try:
+            # Leases of jobs on crashed workers expire while this one runs,
+            # so the check repeats rather than only running at startup
+            next_requeue = time.monotonic() + options["requeue_interval"]
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(1)
+                    if time.monotonic() >= next_requeue:
+                        self.requeue()
+                        next_requeue = time.monotonic() + options["requeue_interval"]
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping after the running jobs finish")
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def requeue(self):
+        close_old_connections()
+        try:
+            requeued = requeue_stale_jobs()
+        except Exception as e:
+            self.stderr.write(f"Requeueing stale jobs failed: {e}")
+            return
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale jobs")
+
+    def work(self, worker, poll_interval, once, stop):
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                job = claim_job(worker)
+                if job is None:
+                    if once:
+                        return
+                    stop.wait(poll_interval)
+                    continue
+                started = time.perf_counter()
+                job = run_job(job)
+                self.stdout.write(
+                    f"{worker} job {job.id} -> {job.status} "
+                    f"(attempt {job.attempts}, {time.perf_counter() - started:.1f}s)"
+                )
+        finally:
+            connections.close_all()
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ner_app import resources
+from ner_app.inference_server import SERVED_MODELS, serve
+from ner_app.model_registry import registry
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the inference sidecar: loads the NER, sentiment and embedding models "
+        "once and serves web workers over a Unix socket (see INFERENCE_SERVER_SOCKET)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--socket", default=settings.INFERENCE_SERVER_SOCKET, help="Unix socket path")
+
+    def handle(self, *args, **options):
+        path = options["socket"]
+        if not path:
+            raise CommandError("Pass --socket or set INFERENCE_SERVER_SOCKET")
+
+        resources.configure_process()
+        registry.warm_up(SERVED_MODELS)
+        self.stdout.write(f"Models loaded, serving on {path}")
+        try:
+            serve(path)
+        except KeyboardInterrupt:
+            pass
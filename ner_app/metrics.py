@@ -0,0 +1,443 @@
+# ner_app/metrics.py
+import atexit
+import contextvars
+import fcntl
+import functools
+import glob
+import json
+import logging
+import os
+import random
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans in-process model calls (ms) up to the slow remote model (minutes)
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Counter:
+    """Monotonic counter, one series per label combination"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._registry = registry
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        if self._registry is not None:
+            self._registry.check_process()
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+
+    @staticmethod
+    def combine(total, value):
+        return (total or 0) + value
+
+    def samples(self, values=None):
+        if values is None:
+            values = self.values()
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value:g}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition layout"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._registry = registry
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values = {}
+
+    def observe(self, value, **labels):
+        if self._registry is not None:
+            self._registry.check_process()
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def values(self):
+        with self._lock:
+            return {key: list(series) for key, series in self._values.items()}
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+
+    @staticmethod
+    def combine(total, series):
+        if total is None:
+            return list(series)
+        return [a + b for a, b in zip(total, series)]
+
+    def samples(self, values=None):
+        if values is None:
+            values = self.values()
+        for key, series in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", f"{bound:g}"))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            cumulative += series[len(self.buckets)]
+            labels = _format_labels(self.labelnames, key, ("le", "+Inf"))
+            yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]:.6f}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+class MetricsRegistry:
+    """
+    Process metrics. Without a directory every gunicorn worker keeps its own
+    series and a scrape of /metrics sees only the worker that served it.
+
+    With `directory` set (multiprocess mode), each process writes a snapshot
+    of its series to metrics-<pid>.json every `flush_interval` seconds and
+    render() sums the snapshots of all processes, so every scrape sees the
+    whole server. Snapshots of exited workers are folded into
+    metrics-archive.json (mark_process_dead) so the totals never go back.
+    """
+
+    ARCHIVE = "metrics-archive.json"
+
+    def __init__(self, directory="", flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics = []
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames, registry=self)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets, registry=self)
+        self._metrics.append(metric)
+        return metric
+
+    def check_process(self):
+        """
+        In a forked child, drop the series inherited from the parent (they are
+        in the parent's snapshot) and start this process's flusher
+        """
+        if not self.directory or (self._pid == os.getpid() and self._flusher is not None):
+            return
+        with self._lock:
+            pid = os.getpid()
+            if self._pid != pid:
+                for metric in self._metrics:
+                    metric.clear()
+                self._pid = pid
+                self._flusher = None
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flusher", daemon=True)
+                self._flusher.start()
+
+    def render(self):
+        if self.directory:
+            self.check_process()
+            self.write_snapshot()
+            values = self._merged_values()
+        else:
+            values = {metric.name: metric.values() for metric in self._metrics}
+
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples(values.get(metric.name, {})))
+        return "\n".join(lines) + "\n"
+
+    # Multiprocess mode
+
+    def snapshot(self):
+        return {
+            metric.name: [[list(key), value] for key, value in metric.values().items()]
+            for metric in self._metrics
+        }
+
+    def write_snapshot(self):
+        if not self.directory or self._pid != os.getpid():
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"metrics-{self._pid}.json")
+        _write_json(path, self.snapshot())
+
+    def mark_process_dead(self, pid):
+        """Fold an exited process's snapshot into the archive (run by the gunicorn master)"""
+        path = os.path.join(self.directory, f"metrics-{pid}.json")
+        with self._archive_lock():
+            snapshot = _read_json(path)
+            if snapshot is None:
+                return
+            archive = os.path.join(self.directory, self.ARCHIVE)
+            merged = self._merge([_read_json(archive) or {}, snapshot])
+            _write_json(archive, {
+                name: [[list(key), value] for key, value in series.items()]
+                for name, series in merged.items()
+            })
+            os.remove(path)
+
+    def reset_directory(self):
+        """Start from empty series (gunicorn master, before the workers fork)"""
+        if self.directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            os.makedirs(self.directory, exist_ok=True)
+
+    def _merged_values(self):
+        with self._archive_lock():
+            snapshots = [
+                _read_json(path) for path in glob.glob(os.path.join(self.directory, "metrics-*.json"))
+            ]
+        return self._merge(snapshot for snapshot in snapshots if snapshot)
+
+    def _merge(self, snapshots):
+        by_name = {metric.name: metric for metric in self._metrics}
+        merged = {name: {} for name in by_name}
+        for snapshot in snapshots:
+            for name, series in snapshot.items():
+                metric = by_name.get(name)
+                if metric is None:
+                    continue
+                for key, value in series:
+                    key = tuple(key)
+                    merged[name][key] = metric.combine(merged[name].get(key), value)
+        return merged
+
+    @contextmanager
+    def _archive_lock(self):
+        # Keeps readers from seeing a dead worker in both its file and the archive
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                logger.warning("Writing the metrics snapshot failed: %s", e)
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+metrics = MetricsRegistry(settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL)
+
+
+@atexit.register
+def _write_final_snapshot():
+    # Counts since the last periodic flush; not after the directory was removed
+    if metrics.directory and os.path.isdir(metrics.directory):
+        metrics.write_snapshot()
+
+stage_seconds = metrics.histogram(
+    "factguard_stage_seconds",
+    "Time spent in a pipeline stage (ner, sentiment, similarity, remote, db_write, serialization)",
+    ("stage",),
+)
+stage_errors = metrics.counter(
+    "factguard_stage_errors_total",
+    "Pipeline stages that raised",
+    ("stage",),
+)
+request_seconds = metrics.histogram(
+    "factguard_request_seconds",
+    "End-to-end request latency",
+    ("endpoint",),
+)
+requests_total = metrics.counter(
+    "factguard_requests_total",
+    "Requests served",
+    ("endpoint", "status"),
+)
+slow_requests = metrics.counter(
+    "factguard_slow_requests_total",
+    "Requests slower than SLOW_REQUEST_MS",
+    ("endpoint",),
+)
+
+
+# Per-request stage timings. Stage threads see the same trace because
+# iter_stages runs them in a copy of the request's context.
+_current_trace = contextvars.ContextVar("factguard_trace", default=None)
+
+
+class RequestTrace:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.stages = {}
+        # Payload logged with the trace when the request is sampled as slow
+        self.detail = None
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def timed(stage):
+    """Record the block's duration under `stage` (and on the current trace)"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        stage_errors.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, elapsed)
+
+
+def instrumented(endpoint):
+    """
+    View decorator: request latency / count metrics, a RequestTrace for the
+    stage timers, and a sampled log line for requests slower than
+    SLOW_REQUEST_MS. A streaming response is measured until its content has
+    been sent (or the client went away).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            trace = RequestTrace(endpoint)
+            token = _current_trace.set(trace)
+            start = time.perf_counter()
+            status = 500
+            streaming = False
+            try:
+                response = view(request, *args, **kwargs)
+                status = response.status_code
+                if response.streaming:
+                    response.streaming_content = _traced_stream(
+                        response.streaming_content, trace, start, status
+                    )
+                    streaming = True
+                return response
+            finally:
+                _current_trace.reset(token)
+                if not streaming:
+                    _record_request(trace, start, status)
+        return wrapper
+    return decorator
+
+
+def _traced_stream(content, trace, start, status):
+    """Yield the chunks of a streamed response with `trace` current while each is produced"""
+    iterator = iter(content)
+    try:
+        while True:
+            token = _current_trace.set(trace)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _current_trace.reset(token)
+            yield chunk
+    finally:
+        if hasattr(iterator, "close"):
+            iterator.close()
+        _record_request(trace, start, status)
+
+
+def _record_request(trace, start, status):
+    endpoint = trace.endpoint
+    elapsed = time.perf_counter() - start
+    request_seconds.observe(elapsed, endpoint=endpoint)
+    requests_total.inc(endpoint=endpoint, status=status)
+    if elapsed * 1000 >= settings.SLOW_REQUEST_MS:
+        slow_requests.inc(endpoint=endpoint)
+        if random.random() < settings.SLOW_REQUEST_SAMPLE_RATE:
+            _log_slow_request(trace, elapsed, status)
+
+
+def _log_slow_request(trace, elapsed, status):
+    stages = {stage: round(seconds * 1000, 1) for stage, seconds in trace.stages.items()}
+    logger.warning(
+        "Slow request %s: %.0fms status=%s stages_ms=%s",
+        trace.endpoint, elapsed * 1000, status, json.dumps(stages),
+    )
+    if trace.detail is not None and logger.isEnabledFor(logging.INFO):
+        logger.info(
+            "Slow request %s detail: %s",
+            trace.endpoint, json.dumps(trace.detail, ensure_ascii=False, default=str),
+        )
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.1 on 2026-10-17 12:25
+
+from django.db import migrations, models
+
+from ner_app.text_utils import text_hash
+
+BLOB_FIELDS = ("serpapi_result", "gemini_result", "factcheck_result")
+
+
+def blank_blobs_to_null(apps, schema_editor):
+    # '' is not valid JSON and would break the text -> jsonb cast
+    QueryHistory = apps.get_model("ner_app", "QueryHistory")
+    for field in BLOB_FIELDS:
+        QueryHistory.objects.filter(**{field: ""}).update(**{field: None})
+
+
+def backfill_structured_columns(apps, schema_editor):
+    """
+    Strips the duplicated sources / raw response out of gemini_result and
+    fills confidence, is_fake and text_hash for existing rows.
+    """
+    QueryHistory = apps.get_model("ner_app", "QueryHistory")
+    batch = []
+    for row in QueryHistory.objects.order_by("id").iterator(chunk_size=2000):
+        result = row.gemini_result if isinstance(row.gemini_result, dict) else {}
+        result.pop("raw_response", None)
+        result.pop("sources", None)
+        row.gemini_result = result or None
+        try:
+            row.confidence = float(result.get("confidence"))
+        except (TypeError, ValueError):
+            row.confidence = None
+        row.is_fake = result.get("is_fake")
+        # Legacy rows only kept the first 200 characters of the claim
+        row.text_hash = text_hash(row.headline)
+        batch.append(row)
+        if len(batch) >= 2000:
+            QueryHistory.objects.bulk_update(batch, ["gemini_result", "confidence", "is_fake", "text_hash"])
+            batch = []
+    if batch:
+        QueryHistory.objects.bulk_update(batch, ["gemini_result", "confidence", "is_fake", "text_hash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ner_app', '0003_remove_queryhistory_isfake'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queryhistory',
+            name='confidence',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='queryhistory',
+            name='is_fake',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='queryhistory',
+            name='text_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.RunPython(blank_blobs_to_null, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='queryhistory',
+            name='factcheck_result',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='queryhistory',
+            name='gemini_result',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='queryhistory',
+            name='serpapi_result',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_structured_columns, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='queryhistory',
+            index=models.Index(fields=['created_at'], name='queryhistory_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='queryhistory',
+            index=models.Index(fields=['verdict'], name='queryhistory_verdict_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='queryhistory',
+            index=models.Index(fields=['text_hash'], name='queryhistory_text_hash_idx'),
+        ),
+    ]
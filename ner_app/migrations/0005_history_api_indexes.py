@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 12:26
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ner_app', '0004_structured_history'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='queryhistory',
+            index=models.Index(fields=['-created_at', '-id'], name='queryhistory_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='queryhistory',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('headline', config='simple'), name='queryhistory_headline_fts_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-17 12:27
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ner_app', '0005_history_api_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='queryhistory',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.1 on 2026-10-17 12:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ner_app', '0007_analysisjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Entity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('normalized', models.CharField(max_length=255)),
+                ('label', models.CharField(blank=True, default='', max_length=20)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('normalized', 'label'), name='entity_normalized_label_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ClaimEntity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('claim', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entities', to='ner_app.queryhistory')),
+                ('entity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='claims', to='ner_app.entity')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['entity', '-created_at', '-claim'], name='claimentity_entity_recent_idx')],
+                'constraints': [models.UniqueConstraint(fields=('claim', 'entity'), name='claimentity_claim_entity_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='EntityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('verdict', models.CharField(max_length=10)),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('entity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='ner_app.entity')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('verdict', 'bucket', 'entity'), name='entityrollup_verdict_bucket_uniq')],
+            },
+        ),
+    ]
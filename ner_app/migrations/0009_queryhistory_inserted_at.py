@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 13:04
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ner_app', '0008_entity_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queryhistory',
+            name='inserted_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='queryhistory',
+            index=models.Index(fields=['inserted_at', 'id'], name='queryhistory_inserted_at_idx'),
+        ),
+    ]
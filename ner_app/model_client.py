@@ -0,0 +1,276 @@
+# ner_app/model_client.py
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .metrics import timed
+from .schemas import CustomModelResult, parse_model_response
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying: the request never reached the model, or the
+# server / proxy in front of Ollama is temporarily unavailable
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """The model server has failed repeatedly; calls fail fast until the reset timeout"""
+
+
+class ModelServerBusy(Exception):
+    """No concurrency slot became free within CUSTOM_MODEL_QUEUE_TIMEOUT"""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half-open after `reset_timeout` seconds, letting one trial call
+    through; the trial's outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError()
+                self.state = "half-open"
+            if self.state == "half-open":
+                if self._trial_in_flight:
+                    raise CircuitOpenError()
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def cancel_call(self):
+        """The call admitted by before_call() was never made"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout": self.reset_timeout,
+            }
+
+
+class CustomModelClient:
+    """
+    HTTP client for the custom fact-check model server.
+
+    - keep-alive connection pool (one requests.Session per process)
+    - separate connect and read timeouts
+    - retries with jittered exponential backoff for failures where the query
+      can safely be sent again (connection errors, 429/502/503/504)
+    - circuit breaker that fails fast while the server is down
+    - semaphore capping the number of in-flight calls to the Ollama backend
+    """
+
+    def __init__(self):
+        self.url = settings.CUSTOM_MODEL_URL
+        self.api_key = settings.CUSTOM_MODEL_API_KEY
+        self.timeout = (settings.CUSTOM_MODEL_CONNECT_TIMEOUT, settings.CUSTOM_MODEL_READ_TIMEOUT)
+        self.retries = settings.CUSTOM_MODEL_RETRIES
+        self.backoff_base = settings.CUSTOM_MODEL_BACKOFF_BASE
+        self.backoff_max = settings.CUSTOM_MODEL_BACKOFF_MAX
+        self.pool_size = settings.CUSTOM_MODEL_POOL_SIZE
+        self.max_concurrency = settings.CUSTOM_MODEL_MAX_CONCURRENCY
+        self.queue_timeout = settings.CUSTOM_MODEL_QUEUE_TIMEOUT
+        self.breaker = CircuitBreaker(
+            settings.CUSTOM_MODEL_BREAKER_THRESHOLD,
+            settings.CUSTOM_MODEL_BREAKER_RESET,
+        )
+
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._session = None
+        self._session_pid = None
+        self._in_flight = 0
+        self._counters = {"requests": 0, "retries": 0, "failures": 0, "rejected": 0}
+
+    @property
+    def session(self):
+        # Sockets must not be shared with a forked parent
+        pid = os.getpid()
+        if self._session_pid != pid:
+            with self._lock:
+                if self._session_pid != pid:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=1,
+                        pool_maxsize=self.pool_size,
+                        pool_block=False,
+                    )
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    session.headers.update({
+                        "Content-Type": "application/json",
+                        "X-API-Key": self.api_key or "",
+                    })
+                    self._session = session
+                    self._session_pid = pid
+        return self._session
+
+    def query(self, query_text):
+        """
+        POST the claim to the model server and return the decoded JSON body.
+        Raises requests exceptions, CircuitOpenError or ModelServerBusy.
+        """
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self._count("rejected")
+            raise
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.breaker.cancel_call()
+            self._count("rejected")
+            raise ModelServerBusy()
+
+        self._adjust_in_flight(1)
+        try:
+            with timed("remote"):
+                response = self._post_with_retries(query_text)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            self.breaker.record_failure()
+            self._count("failures")
+            raise
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            self._count("failures")
+            raise
+        except Exception:
+            # Any other failure (e.g. ChunkedEncodingError) must still end a
+            # half-open trial, or the circuit never closes again
+            self.breaker.record_failure()
+            self._count("failures")
+            raise
+        finally:
+            self._adjust_in_flight(-1)
+            self._slots.release()
+
+        self.breaker.record_success()
+        return response.json()
+
+    def _post_with_retries(self, query_text):
+        payload = json.dumps({"query": query_text})
+        attempt = 0
+        while True:
+            self._count("requests")
+            try:
+                response = self.session.post(self.url, data=payload, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    response.raise_for_status()
+                    return response
+            except requests.exceptions.ConnectionError:
+                # Includes ConnectTimeout. A read timeout means the model may
+                # still be working on the claim, so it is not retried.
+                if attempt >= self.retries:
+                    raise
+            attempt += 1
+            self._count("retries")
+            # Full jitter: sleep uniformly in [0, min(max, base * 2^attempt)]
+            time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+
+    def _adjust_in_flight(self, delta):
+        with self._lock:
+            self._in_flight += delta
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "url": self.url,
+                "pool_maxsize": self.pool_size,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "connect_timeout": self.timeout[0],
+                "read_timeout": self.timeout[1],
+                "breaker": self.breaker.stats(),
+                "counters": dict(self._counters),
+            }
+
+
+model_client = CustomModelClient()
+
+
+# Custom Model Fact Check
+def call_custom_model(query_text: str):
+    """
+    Call your custom fact-checking model API
+    """
+    try:
+        # Get raw response
+        raw_data = model_client.query(query_text)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Raw API response: %s", json.dumps(raw_data, ensure_ascii=False))
+
+        return parse_model_response(raw_data).as_dict()
+
+    except requests.exceptions.Timeout:
+        return custom_model_error(
+            "Request timeout - Model took too long to respond "
+            f"({settings.CUSTOM_MODEL_READ_TIMEOUT:g}s)"
+        )
+    except CircuitOpenError:
+        return custom_model_error(
+            "Custom model unavailable - circuit breaker open after repeated failures"
+        )
+    except ModelServerBusy:
+        return custom_model_error(
+            "Custom model busy - too many requests in flight"
+        )
+    except requests.exceptions.RequestException as e:
+        return custom_model_error(f"Failed to connect to custom model: {str(e)}")
+    except Exception as e:
+        logger.exception("Exception in call_custom_model")
+        return custom_model_error(f"Error calling custom model: {str(e)}")
+
+
+def custom_model_error(message: str):
+    """
+    Result payload for a failed custom model call
+    """
+    return CustomModelResult(
+        success=False,
+        error=message,
+        verdict="Error",
+        credibility="Unknown",
+    ).as_dict()
+
@@ -0,0 +1,70 @@
+# ner_app/model_registry.py
+import os
+import threading
+import time
+
+
+class ModelRegistry:
+    """
+    Loads each model the first time it is requested instead of at import time.
+
+    Modules register a zero-argument loader under a name; get(name) runs it
+    once per process and returns the cached object afterwards. Loading in a
+    parent process before fork (see warm_up and gunicorn.conf.py) lets forked
+    workers share the weights through copy-on-write memory.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._metrics = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._locks[name]:
+            # Another thread may have finished loading while we waited
+            if name not in self._models:
+                start = time.perf_counter()
+                self._models[name] = self._loaders[name]()
+                self._metrics[name] = {
+                    "load_seconds": round(time.perf_counter() - start, 3),
+                    "loaded_at": time.time(),
+                    "loaded_in_pid": os.getpid(),
+                }
+            return self._models[name]
+
+    def names(self):
+        return list(self._loaders)
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def warm_up(self, names=None):
+        """Load the given models (default: all registered) ahead of the first request"""
+        for name in names or list(self._loaders):
+            self.get(name)
+
+    def stats(self):
+        pid = os.getpid()
+        stats = {}
+        for name in self._loaders:
+            metrics = dict(self._metrics.get(name, {}))
+            metrics["loaded"] = name in self._models
+            if metrics["loaded"]:
+                # Loaded in a parent process and inherited through fork
+                metrics["inherited"] = metrics["loaded_in_pid"] != pid
+            stats[name] = metrics
+        return stats
+
+
+registry = ModelRegistry()
@@ -1,14 +1,188 @@
+import uuid
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector
 from django.db import models
+from django.db.models.functions import Now, Upper
+from django.utils import timezone
 
 class QueryHistory(models.Model):
     headline = models.TextField()
-    serpapi_result = models.TextField(null=True, blank=True)
-    gemini_result = models.TextField(null=True, blank=True)
-    factcheck_result = models.TextField(null=True, blank=True)
+    # SHA-256 of the normalized claim text (see text_utils.text_hash)
+    text_hash = models.CharField(max_length=64, null=True, blank=True)
+    # Custom model sources
+    serpapi_result = models.JSONField(null=True, blank=True)
+    # Parsed custom model result, without the sources and raw response
+    gemini_result = models.JSONField(null=True, blank=True)
+    # Raw model server response
+    factcheck_result = models.JSONField(null=True, blank=True)
     verdict = models.CharField(max_length=255, null=True, blank=True)
     credibility = models.CharField(max_length=50, null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    confidence = models.FloatField(null=True, blank=True)
+    is_fake = models.BooleanField(null=True, blank=True)
+    # Set when the row is built (request time), not when the write-behind
+    # flusher inserts it
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Set by the database on INSERT; rows spilled and replayed later get the
+    # replay time. Incremental exports use it as their watermark.
+    inserted_at = models.DateTimeField(db_default=Now(), editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="queryhistory_created_at_idx"),
+            models.Index(fields=["inserted_at", "id"], name="queryhistory_inserted_at_idx"),
+            models.Index(fields=["verdict"], name="queryhistory_verdict_idx"),
+            models.Index(fields=["text_hash"], name="queryhistory_text_hash_idx"),
+            # Keyset pagination of the history API
+            models.Index(fields=["-created_at", "-id"], name="queryhistory_cursor_idx"),
+            # Full-text search over headlines (see filters.HeadlineSearchFilter)
+            GinIndex(
+                SearchVector("headline", config="simple"),
+                name="queryhistory_headline_fts_idx",
+            ),
+            # Substring search (icontains) for scripts without word breaks
+            GinIndex(
+                OpClass(Upper("headline"), name="gin_trgm_ops"),
+                name="queryhistory_headline_trgm_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.headline[:50]}... ({self.verdict})"
 
+    def custom_model_result(self, include_raw=False):
+        """
+        Reassembles the custom model result as returned by call_custom_model
+        """
+        result = dict(self.gemini_result or {})
+        result["sources"] = self.serpapi_result or []
+        if include_raw and self.factcheck_result is not None:
+            result["raw_response"] = self.factcheck_result
+        return result
+
+
+class AnalysisJob(models.Model):
+    """
+    A queued /analyze/ request (async mode), worked off by
+    `manage.py run_analysis_worker`
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+    ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+    # Random ids so job results cannot be enumerated
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    text = models.TextField()
+    text2 = models.TextField(blank=True, default="")
+    # text_hash of text (+ text2); identical active claims share one job
+    dedup_key = models.CharField(max_length=128)
+    # Pre-filter decision made when the job was queued
+    prefilter = models.JSONField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    # Higher runs first
+    priority = models.SmallIntegerField(default=0)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    # Not picked up before this time (retry backoff)
+    run_after = models.DateTimeField(default=timezone.now)
+    # Webhook URLs notified when the job finishes
+    callback_urls = models.JSONField(default=list, blank=True)
+    # /analyze/ response once the job has run
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    worker = models.CharField(max_length=100, blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Worker claim query: queued jobs by priority, then age
+            models.Index(
+                fields=["status", "-priority", "created_at"],
+                name="analysisjob_claim_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dedup_key"],
+                condition=models.Q(status__in=["queued", "running"]),
+                name="analysisjob_active_dedup",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.text[:50]}... ({self.status})"
+
+
+class Entity(models.Model):
+    """A distinct named entity: normalized text + NER label"""
+    # Surface form as first seen
+    name = models.CharField(max_length=255)
+    # text_utils.normalize_text of the name; lookup key
+    normalized = models.CharField(max_length=255)
+    label = models.CharField(max_length=20, blank=True, default="")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["normalized", "label"],
+                name="entity_normalized_label_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.label})"
+
+
+class ClaimEntity(models.Model):
+    """Inverted index: entity -> analyzed claims mentioning it"""
+    entity = models.ForeignKey(Entity, on_delete=models.CASCADE, related_name="claims")
+    claim = models.ForeignKey(QueryHistory, on_delete=models.CASCADE, related_name="entities")
+    # Copied from the claim so "claims mentioning X, newest first" is one
+    # index range scan
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["entity", "-created_at", "-claim"],
+                name="claimentity_entity_recent_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["claim", "entity"],
+                name="claimentity_claim_entity_uniq",
+            ),
+        ]
+
+
+class EntityRollup(models.Model):
+    """
+    Claims per entity, verdict class and hour, incremented as claims are
+    indexed; "top entities among fake claims in the last N hours" sums at
+    most N buckets per entity instead of scanning the claims
+    """
+    entity = models.ForeignKey(Entity, on_delete=models.CASCADE, related_name="rollups")
+    # FAKE / REAL / UNKNOWN from QueryHistory.is_fake (entity_index.verdict_class)
+    verdict = models.CharField(max_length=10)
+    # Start of the hour (UTC)
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["verdict", "bucket", "entity"],
+                name="entityrollup_verdict_bucket_uniq",
+            ),
+        ]
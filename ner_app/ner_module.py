@@ -1,16 +1,122 @@
 # ner_app/ner_module.py
 
-from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
+from django.conf import settings
+
+from .batching import MicroBatcher
+from .inference_server import inference_client
+from .long_document import document_windows, merge_entity_spans, split_windows
+from .model_registry import registry
+from .resources import inference, prepare_model
 
 model_name = "Davlan/bert-base-multilingual-cased-ner-hrl"
 
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForTokenClassification.from_pretrained(model_name)
+def _load_ner_pipeline(backend=None):
+    from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
+
+    if (backend or settings.INFERENCE_BACKEND) == "onnx":
+        from .onnx_backend import load_token_classification
+        model, tokenizer = load_token_classification(model_name)
+    else:
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = prepare_model(AutoModelForTokenClassification.from_pretrained(model_name))
+    return pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
+
+registry.register("ner", _load_ner_pipeline)
+
+def _load_ner_tokenizer(backend=None):
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(model_name)
+
+registry.register("ner_tokenizer", _load_ner_tokenizer)
 
-ner_pipeline = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
+def get_ner_pipeline():
+    return registry.get("ner")
+
+def get_ner_tokenizer():
+    # With the inference server only the tokenizer is loaded in this process
+    if inference_client.enabled:
+        return registry.get("ner_tokenizer")
+    return get_ner_pipeline().tokenizer
+
+@inference
+def _ner_batch(texts):
+    if inference_client.enabled:
+        return inference_client.call("ner", texts)
+    # The pipeline pads each batch to its longest member
+    return get_ner_pipeline()(texts, batch_size=len(texts))
+
+ner_batcher = MicroBatcher("ner", _ner_batch)
 
 def get_named_entities(text):
-    raw_results = ner_pipeline(text)
+    windows = document_windows(get_ner_tokenizer(), text)
+    if windows:
+        return _document_entities(text, windows, ner_batcher.submit_many(_window_texts(text, windows)))
+    return _format_entities(ner_batcher.submit(text))
+
+def get_named_entities_document(text):
+    """
+    Named entities for an article-length text: overlapping windows run as one
+    batch, spans are merged across window boundaries and mapped back to
+    document character offsets. Each entity lists all of its mentions.
+    """
+    windows = split_windows(get_ner_tokenizer(), text)
+    return _document_entities(text, windows, ner_batcher.submit_many(_window_texts(text, windows)))
+
+@inference
+def get_named_entities_batch(texts):
+    """
+    Named entities for many texts in real model batches; one list per text.
+    Long texts are split into windows that run in the same batches.
+    """
+    if not texts:
+        return []
+    tokenizer = get_ner_tokenizer()
+    windows = [document_windows(tokenizer, text) for text in texts]
+    inputs = []
+    for text, text_windows in zip(texts, windows):
+        inputs.extend(_window_texts(text, text_windows) if text_windows else [text])
+
+    if inference_client.enabled:
+        raw = inference_client.call("ner", inputs)
+    else:
+        raw = get_ner_pipeline()(inputs, batch_size=settings.MODEL_BATCH_MAX_SIZE)
+
+    results = []
+    position = 0
+    for text, text_windows in zip(texts, windows):
+        if text_windows:
+            window_raw = raw[position:position + len(text_windows)]
+            results.append(_document_entities(text, text_windows, window_raw))
+            position += len(text_windows)
+        else:
+            results.append(_format_entities(raw[position]))
+            position += 1
+    return results
+
+def _window_texts(text, windows):
+    return [text[start:end] for start, end in windows]
+
+def _document_entities(text, windows, raw):
+    spans = []
+    for (offset, _), window_entities in zip(windows, raw):
+        for ent in window_entities:
+            spans.append({
+                "start": offset + ent["start"],
+                "end": offset + ent["end"],
+                "label": ent.get("entity_group", ""),
+                "score": float(ent.get("score", 0.0)),
+            })
+
+    entities = {}
+    for span in merge_entity_spans(spans):
+        key = (text[span["start"]:span["end"]], span["label"])
+        if key not in entities:
+            entities[key] = {"text": key[0], "label": key[1], "mentions": []}
+        entities[key]["mentions"].append([span["start"], span["end"]])
+    return list(entities.values())
+
+def _format_entities(raw_results):
     unique = set()
     entities = []
 
@@ -27,6 +133,3 @@ def get_named_entities(text):
             })
 
     return entities
-
-
-
@@ -0,0 +1,110 @@
+# ner_app/onnx_backend.py
+"""
+ONNX Runtime inference backend (INFERENCE_BACKEND = "onnx").
+
+Each model is exported to ONNX on first use, optionally dynamically
+quantized to int8, and cached under ONNX_CACHE_DIR so later processes load
+the artifact directly. Requires the optional packages:
+
+    pip install "optimum[onnxruntime]" onnxruntime
+"""
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .resources import onnx_session_options
+
+
+def _require_optimum():
+    try:
+        import optimum.onnxruntime  # noqa: F401
+    except ImportError as e:
+        raise ImproperlyConfigured(
+            'INFERENCE_BACKEND="onnx" needs optimum[onnxruntime] and onnxruntime installed'
+        ) from e
+
+
+def _artifact_dir(model_name):
+    variant = f"int8-{settings.ONNX_QUANTIZATION_TARGET}" if settings.ONNX_QUANTIZE else "fp32"
+    return os.path.join(settings.ONNX_CACHE_DIR, model_name.replace("/", "--"), variant)
+
+
+def _publish(tmp_dir, target):
+    """Move a finished export into place; another process may have won the race"""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.rename(tmp_dir, target)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _load_ort_model(model_cls, model_name):
+    from optimum.onnxruntime import ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    target = _artifact_dir(model_name)
+    file_name = "model_quantized.onnx" if settings.ONNX_QUANTIZE else "model.onnx"
+
+    if not os.path.exists(os.path.join(target, file_name)):
+        os.makedirs(settings.ONNX_CACHE_DIR, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=settings.ONNX_CACHE_DIR)
+        model = model_cls.from_pretrained(model_name, export=True)
+        model.save_pretrained(tmp_dir)
+        if settings.ONNX_QUANTIZE:
+            qconfig = getattr(AutoQuantizationConfig, settings.ONNX_QUANTIZATION_TARGET)(
+                is_static=False, per_channel=False
+            )
+            ORTQuantizer.from_pretrained(model).quantize(save_dir=tmp_dir, quantization_config=qconfig)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(tmp_dir)
+        _publish(tmp_dir, target)
+
+    model = model_cls.from_pretrained(
+        target, file_name=file_name, session_options=onnx_session_options()
+    )
+    tokenizer = AutoTokenizer.from_pretrained(target)
+    return model, tokenizer
+
+
+def load_token_classification(model_name):
+    """(model, tokenizer) for a token classification (NER) pipeline"""
+    _require_optimum()
+    from optimum.onnxruntime import ORTModelForTokenClassification
+
+    return _load_ort_model(ORTModelForTokenClassification, model_name)
+
+
+def load_sequence_classification(model_name):
+    """(model, tokenizer) for a text classification (sentiment) pipeline"""
+    _require_optimum()
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+
+    return _load_ort_model(ORTModelForSequenceClassification, model_name)
+
+
+def load_sentence_transformer(model_name):
+    """SentenceTransformer running on ONNX Runtime"""
+    _require_optimum()
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    target = _artifact_dir(model_name)
+    quantized = f"onnx/model_qint8_{settings.ONNX_QUANTIZATION_TARGET}.onnx"
+    file_name = quantized if settings.ONNX_QUANTIZE else "onnx/model.onnx"
+
+    if not os.path.exists(os.path.join(target, file_name)):
+        os.makedirs(settings.ONNX_CACHE_DIR, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=settings.ONNX_CACHE_DIR)
+        model = SentenceTransformer(model_name, backend="onnx")
+        model.save_pretrained(tmp_dir)
+        if settings.ONNX_QUANTIZE:
+            export_dynamic_quantized_onnx_model(model, settings.ONNX_QUANTIZATION_TARGET, tmp_dir)
+        _publish(tmp_dir, target)
+
+    return SentenceTransformer(
+        target,
+        backend="onnx",
+        model_kwargs={"file_name": file_name, "session_options": onnx_session_options()},
+    )
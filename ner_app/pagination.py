@@ -0,0 +1,13 @@
+# ner_app/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class HistoryCursorPagination(CursorPagination):
+    """
+    Keyset pagination on (created_at, id): every page is an index range scan,
+    so latency does not grow with the page number or the table size.
+    """
+    ordering = ("-created_at", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
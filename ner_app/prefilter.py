@@ -0,0 +1,130 @@
+# ner_app/prefilter.py
+from collections import Counter
+
+from django.conf import settings
+from langdetect.detector_factory import PROFILES_DIRECTORY, DetectorFactory
+from langdetect.lang_detect_exception import LangDetectException
+
+from .model_registry import registry
+from .text_utils import clean_text
+
+# Languages each local model was trained on (langdetect codes, region
+# suffix dropped). The custom model is an LLM and gets every language.
+STAGE_LANGUAGES = {
+    # Davlan/bert-base-multilingual-cased-ner-hrl
+    "entities": {"ar", "de", "en", "es", "fr", "it", "lv", "nl", "pt", "zh"},
+    # cardiffnlp/twitter-xlm-roberta-base-sentiment-multilingual
+    "sentiment": {"ar", "de", "en", "es", "fr", "hi", "it", "pt"},
+    # paraphrase-multilingual-MiniLM-L12-v2
+    "similarity": {
+        "ar", "bg", "ca", "cs", "da", "de", "el", "en", "es", "et", "fa", "fi",
+        "fr", "gu", "he", "hi", "hr", "hu", "id", "it", "ja", "ko", "lt", "lv",
+        "mk", "mr", "nl", "no", "pl", "pt", "ro", "ru", "sk", "sl", "sq", "sv",
+        "th", "tr", "uk", "ur", "vi", "zh",
+    },
+}
+
+
+def _load_language_detector(backend=None):
+    factory = DetectorFactory()
+    factory.load_profile(PROFILES_DIRECTORY)
+    # langdetect is randomized; a fixed seed keeps routing deterministic
+    factory.seed = 0
+    return factory
+
+
+registry.register("language", _load_language_detector)
+
+
+# Repetition is measured per window of this many tokens, so long documents
+# (which reuse their vocabulary) are not mistaken for copy-paste noise
+REPETITION_WINDOW = 50
+
+
+def detect_languages(text, n=2):
+    """[(language code, probability)] of the n most likely languages"""
+    detector = registry.get("language").create()
+    detector.append(text)
+    try:
+        candidates = detector.get_probabilities()[:n]
+    except LangDetectException:
+        return []
+    return [(candidate.lang, candidate.prob) for candidate in candidates]
+
+
+def detect_language(text):
+    """(language code, probability) of the most likely language, or (None, 0.0)"""
+    candidates = detect_languages(text, n=1)
+    return candidates[0] if candidates else (None, 0.0)
+
+
+def junk_reason(text):
+    """Why the text cannot yield a useful verdict, or None if it looks like language"""
+    letters = sum(1 for char in text if char.isalpha())
+    if letters < settings.PREFILTER_MIN_LETTERS:
+        return "too_short"
+    if letters / len(text) < settings.PREFILTER_MIN_LETTER_RATIO:
+        return "non_linguistic"
+
+    # Keyboard mashing and copy-paste noise: one character or a handful of
+    # tokens repeated over and over
+    top_char_count = Counter(text.replace(" ", "")).most_common(1)[0][1]
+    if len(text) >= 10 and top_char_count / len(text.replace(" ", "")) > 0.5:
+        return "repetitive"
+    tokens = text.casefold().split()
+    windows = [
+        tokens[start:start + REPETITION_WINDOW]
+        for start in range(0, len(tokens), REPETITION_WINDOW)
+    ]
+    ratios = [len(set(window)) / len(window) for window in windows if len(window) >= 8]
+    if ratios and sum(ratios) / len(ratios) < 0.25:
+        return "repetitive"
+    return None
+
+
+def prefilter(text):
+    """
+    Cheap checks run before any model: returns (clean text, decision).
+
+    decision["action"] is "analyze" or, for junk input, "short_circuit";
+    decision["skipped"] lists local stages whose model does not support the
+    detected language. Detection on short text is unreliable (short English
+    headlines come back as Danish or Indonesian with full confidence), so
+    nothing is skipped below PREFILTER_MIN_ROUTING_LETTERS letters, for
+    low-confidence detections, or for a stage that supports either of the
+    two most likely languages.
+    """
+    cleaned = clean_text(text)
+    decision = {
+        "action": "analyze",
+        "reason": None,
+        "language": None,
+        "languageConfidence": 0.0,
+        "normalized": cleaned != text,
+        "skipped": [],
+    }
+    if not cleaned:
+        decision.update(action="short_circuit", reason="empty")
+        return cleaned, decision
+
+    reason = junk_reason(cleaned)
+    if reason:
+        decision.update(action="short_circuit", reason=reason)
+        return cleaned, decision
+
+    candidates = detect_languages(cleaned)
+    if not candidates:
+        return cleaned, decision
+    language, confidence = candidates[0]
+    decision["language"] = language
+    decision["languageConfidence"] = round(confidence, 3)
+    letters = sum(1 for char in cleaned if char.isalpha())
+    if (
+        letters >= settings.PREFILTER_MIN_ROUTING_LETTERS
+        and confidence >= settings.PREFILTER_MIN_LANGUAGE_CONFIDENCE
+    ):
+        bases = {lang.split("-")[0] for lang, _ in candidates}
+        decision["skipped"] = [
+            stage for stage, languages in STAGE_LANGUAGES.items() if not bases & languages
+        ]
+    return cleaned, decision
@@ -0,0 +1,165 @@
+# ner_app/resources.py
+"""
+Per-process CPU and memory budget for local inference.
+
+With several gunicorn workers per node, every worker's torch (or ONNX
+Runtime) thread pool defaults to one thread per core, so the workers fight
+over the same cores. Each process instead gets INFERENCE_NUM_THREADS
+intra-op threads (default: cores / INFERENCE_PROCESSES) and
+INFERENCE_INTEROP_THREADS inter-op threads. Model calls run under
+torch.inference_mode, and PyTorch weights can be converted to bfloat16 or
+dynamically quantized to int8 (INFERENCE_PRECISION).
+"""
+import contextlib
+import functools
+import logging
+import os
+import resource
+import sys
+
+import psutil
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PRECISIONS = ("fp32", "bf16", "qint8")
+
+_configured = {}
+
+
+def thread_budget(processes=None):
+    """
+    (intra-op, inter-op) thread counts for this process when `processes`
+    inference processes share the cores (default: the count passed to
+    configure_process, else INFERENCE_PROCESSES)
+    """
+    processes = processes or _configured.get("processes") or settings.INFERENCE_PROCESSES
+    intra = settings.INFERENCE_NUM_THREADS or max(1, (os.cpu_count() or 1) // max(1, processes))
+    return intra, settings.INFERENCE_INTEROP_THREADS
+
+
+def _torch():
+    # torch is not needed for the ONNX backend
+    try:
+        import torch
+    except ImportError:
+        return None
+    return torch
+
+
+def configure_process(processes=None):
+    """
+    Apply the thread budget to this process. Called at startup, when a
+    PyTorch model is loaded and again in every forked worker (gunicorn
+    post_fork). Does not import torch itself.
+
+    Process pools that are not sized by INFERENCE_PROCESSES (rescore or
+    benchmark workers) pass their own size; later calls in the process
+    (model loads, ONNX sessions) keep using it.
+    """
+    if processes:
+        _configured["processes"] = processes
+    intra, inter = thread_budget()
+    # Read by OpenMP / MKL when torch is first imported
+    os.environ.setdefault("OMP_NUM_THREADS", str(intra))
+    os.environ.setdefault("MKL_NUM_THREADS", str(intra))
+
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(intra)
+        try:
+            torch.set_num_interop_threads(inter)
+        except RuntimeError:
+            # Only allowed once, before any inter-op work; a forked worker
+            # keeps the master's setting
+            pass
+    _configured.update(pid=os.getpid(), intra_op=intra, inter_op=inter)
+    logger.debug("Inference threads: %d intra-op, %d inter-op", intra, inter)
+
+
+def onnx_session_options():
+    """onnxruntime.SessionOptions with the process thread budget"""
+    import onnxruntime
+
+    intra, inter = thread_budget()
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = intra
+    options.inter_op_num_threads = inter
+    return options
+
+
+def prepare_model(model):
+    """
+    Eval mode plus INFERENCE_PRECISION for a freshly loaded PyTorch model
+    (a transformers model or a SentenceTransformer)
+    """
+    precision = settings.INFERENCE_PRECISION
+    if precision not in PRECISIONS:
+        raise ValueError(f"INFERENCE_PRECISION must be one of {', '.join(PRECISIONS)}")
+    torch = _torch()
+    configure_process()
+    model.eval()
+    if precision == "bf16":
+        model = model.to(torch.bfloat16)
+    elif precision == "qint8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def inference_context():
+    torch = _torch()
+    if torch is None:
+        return contextlib.nullcontext()
+    return torch.inference_mode()
+
+
+def inference(func):
+    """Run the decorated model call under torch.inference_mode"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with inference_context():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def process_memory():
+    """
+    Memory of this process in MiB. private = RSS minus pages shared with the
+    master and other workers (copy-on-write weights), i.e. the marginal cost
+    of one more worker.
+    """
+    info = psutil.Process().memory_info()
+    shared = getattr(info, "shared", 0)
+    mib = 1024 * 1024
+    return {
+        "rss_mb": round(info.rss / mib, 1),
+        "shared_mb": round(shared / mib, 1),
+        "private_mb": round((info.rss - shared) / mib, 1),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def over_memory_limit():
+    """True once this worker's private memory exceeds INFERENCE_MAX_PRIVATE_MB"""
+    limit = settings.INFERENCE_MAX_PRIVATE_MB
+    return bool(limit) and process_memory()["private_mb"] > limit
+
+
+def stats():
+    torch = sys.modules.get("torch")
+    intra, inter = thread_budget()
+    return {
+        "backend": settings.INFERENCE_BACKEND,
+        "precision": settings.INFERENCE_PRECISION,
+        "threads": {
+            "intra_op": intra,
+            "inter_op": inter,
+            "configured_in_pid": _configured.get("pid"),
+            "torch_intra_op": torch.get_num_threads() if torch else None,
+            "torch_inter_op": torch.get_num_interop_threads() if torch else None,
+        },
+        "cpu_count": os.cpu_count(),
+        "memory": process_memory(),
+        "max_private_mb": settings.INFERENCE_MAX_PRIVATE_MB or None,
+    }
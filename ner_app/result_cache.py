@@ -0,0 +1,158 @@
+# ner_app/result_cache.py
+import copy
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .text_utils import cased_text_hash, text_hash
+
+# Result kinds stored per claim; each has its own TTL in RESULT_CACHE_TTLS
+KINDS = ("entities", "sentiment", "verdict")
+
+# Outputs of the cased local models are keyed on the cleaned text with case
+# kept ("Apple" and "apple" get different entities); verdicts on the
+# case-folded claim
+CASED_KINDS = ("entities", "sentiment")
+
+
+class ResultCache:
+    """
+    Content-addressed cache for /analyze/ stage results, keyed on the hash of
+    the cleaned (entities, sentiment) or normalized (verdict) claim text.
+
+    Two tiers:
+      - an in-process LRU (bounded by max_entries, per-entry TTL)
+      - an optional Django cache backend shared across workers
+
+    invalidate() records the time of the invalidation per normalized claim
+    (in the shared tier when there is one); entries stored before it are
+    treated as misses, so a local entry of another worker is not served
+    after the claim was invalidated anywhere.
+    """
+
+    def __init__(self, max_entries, ttls, backend_alias=None):
+        self.max_entries = max_entries
+        self.ttls = ttls
+        self.backend_alias = backend_alias
+        self._entries = OrderedDict()
+        self._invalidated = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    @property
+    def _shared(self):
+        return caches[self.backend_alias] if self.backend_alias else None
+
+    @staticmethod
+    def _shared_key(kind, digest):
+        return f"factguard:{kind}:{digest}"
+
+    @staticmethod
+    def _digest(kind, text):
+        return cased_text_hash(text) if kind in CASED_KINDS else text_hash(text)
+
+    def get(self, kind, text):
+        """Cached value, or None on a miss"""
+        if not settings.RESULT_CACHE_ENABLED:
+            return None
+        key = (kind, self._digest(kind, text))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+        if entry is not None:
+            _, stored_at, value = entry
+            if stored_at > self.invalidated_at(text_hash(text)):
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                    self._counters[f"{kind}_hits"] += 1
+                return copy.deepcopy(value)
+            with self._lock:
+                self._entries.pop(key, None)
+
+        shared = self._shared
+        if shared is not None:
+            value = shared.get(self._shared_key(*key))
+            if value is not None:
+                # The caller may modify the result (raw_response, reused_from)
+                self._store_local(key, copy.deepcopy(value))
+                self._count(f"{kind}_shared_hits")
+                return value
+
+        self._count(f"{kind}_misses")
+        return None
+
+    def set(self, kind, text, value):
+        if not settings.RESULT_CACHE_ENABLED or value is None:
+            return
+        key = (kind, self._digest(kind, text))
+        self._store_local(key, copy.deepcopy(value))
+        shared = self._shared
+        if shared is not None:
+            shared.set(self._shared_key(*key), value, timeout=self.ttls[kind])
+
+    def invalidate(self, text):
+        """Drop every cached result for a claim; returns the number of local entries removed"""
+        keys = [(kind, self._digest(kind, text)) for kind in KINDS]
+        digest = text_hash(text)
+        now = time.time()
+        removed = 0
+        with self._lock:
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    removed += 1
+            self._invalidated[digest] = now
+            self._invalidated.move_to_end(digest)
+            while len(self._invalidated) > self.max_entries:
+                self._invalidated.popitem(last=False)
+            self._counters["invalidations"] += 1
+        shared = self._shared
+        if shared is not None:
+            shared.delete_many([self._shared_key(*key) for key in keys])
+            # Older than the longest TTL, every entry has expired anyway
+            shared.set(self._shared_key("invalidated", digest), now, timeout=max(self.ttls.values()))
+        return removed
+
+    def invalidated_at(self, digest):
+        """Wall-clock time the claim with this text_hash was last invalidated (0 if never)"""
+        shared = self._shared
+        if shared is not None:
+            return shared.get(self._shared_key("invalidated", digest)) or 0.0
+        with self._lock:
+            return self._invalidated.get(digest, 0.0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": settings.RESULT_CACHE_ENABLED,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "shared_backend": self.backend_alias,
+                "counters": dict(self._counters),
+            }
+
+    def _store_local(self, key, value):
+        expires_at = time.monotonic() + self.ttls[key[0]]
+        with self._lock:
+            self._entries[key] = (expires_at, time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+
+result_cache = ResultCache(
+    max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+    ttls=settings.RESULT_CACHE_TTLS,
+    backend_alias=settings.RESULT_CACHE_BACKEND,
+)
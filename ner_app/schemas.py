@@ -0,0 +1,151 @@
+# ner_app/schemas.py
+import math
+from typing import Annotated, Any, Optional
+
+import numpy as np
+from django.http import HttpResponse
+from pydantic import BaseModel, BeforeValidator, ConfigDict
+from pydantic_core import to_json
+
+# Credibility score (0-5) reported by the custom model -> label
+CREDIBILITY_LABELS = {
+    5: "Very High",
+    4: "High",
+    3: "Medium",
+    2: "Low",
+    1: "Very Low",
+    0: "Unknown",
+}
+
+
+def _lenient_str(value):
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else str(value)
+
+
+def _lenient_float(value):
+    if value is None:
+        return 0.0
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    # NaN / inf are not valid scores (and break the 0-5 label lookup)
+    return value if math.isfinite(value) else 0.0
+
+
+def _lenient_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+# Model output is not trusted to be well-typed: missing or malformed
+# values fall back to "" / 0 / [] instead of failing validation
+LenientStr = Annotated[str, BeforeValidator(_lenient_str)]
+LenientFloat = Annotated[float, BeforeValidator(_lenient_float)]
+LenientList = Annotated[list[Any], BeforeValidator(_lenient_list)]
+
+
+class ModelServerVerdict(BaseModel):
+    """The {"response": {...}} object returned by the fact-check server"""
+
+    model_config = ConfigDict(extra="ignore")
+
+    verdict: LenientStr = "Undetermined"
+    credibility: LenientFloat = 0.0
+    summary: LenientStr = ""
+    reasoning: LenientStr = ""
+    url_references: LenientList = []
+
+
+class CustomModelResult(BaseModel):
+    """customModel block of the /analyze/ response"""
+
+    success: bool
+    verdict: str
+    credibility: str
+    summary: str = ""
+    reasoning: str = ""
+    sources: LenientList = []
+    confidence: float = 0.0
+    is_fake: Optional[bool] = None
+    error: Optional[str] = None
+    raw_response: Any = None
+
+    def as_dict(self):
+        # Unset optional fields (is_fake, error, raw_response) are left out
+        return self.model_dump(exclude_none=True)
+
+
+def parse_model_response(raw_data):
+    """CustomModelResult for a raw fact-check server response"""
+    if not isinstance(raw_data, dict):
+        # A string or list
+        response_str = _lenient_str(raw_data)
+        return CustomModelResult(
+            success=True,
+            verdict="Analysis Complete",
+            credibility="See details",
+            summary=response_str[:500] if response_str else "No summary available",
+            reasoning=response_str,
+            raw_response=raw_data,
+        )
+
+    if isinstance(raw_data.get("response"), dict):
+        nested = ModelServerVerdict.model_validate(raw_data["response"])
+        label = CREDIBILITY_LABELS.get(int(nested.credibility), "Unknown")
+        return CustomModelResult(
+            success=True,
+            verdict=nested.verdict,
+            credibility=f"{label} ({nested.credibility}/5)",
+            summary=nested.summary,
+            reasoning=nested.reasoning,
+            sources=nested.url_references,
+            confidence=nested.credibility * 20,  # 0-5 -> 0-100 percentage
+            is_fake=nested.verdict.upper() != "VERIFIED",
+            raw_response=raw_data,
+        )
+
+    # Direct response (fallback)
+    result = CustomModelResult(
+        success=True,
+        verdict=_lenient_str(_first(raw_data, "verdict", "label", "prediction") or "Unknown"),
+        credibility=_lenient_str(_first(raw_data, "credibility", "confidence_level") or "Unknown"),
+        summary=_lenient_str(_first(raw_data, "summary", "analysis", "explanation")),
+        reasoning=_lenient_str(_first(raw_data, "reasoning", "rationale", "details")),
+        sources=_first(raw_data, "sources", "references", "links"),
+        confidence=_lenient_float(_first(raw_data, "confidence", "score", "confidence_score")),
+        raw_response=raw_data,
+    )
+    # A plain text response (common with Ollama)
+    text_response = _lenient_str(raw_data.get("response") or raw_data.get("text"))
+    if text_response and not result.summary:
+        result.summary = text_response[:500]
+        result.reasoning = text_response
+    return result
+
+
+def _first(data, *keys):
+    for key in keys:
+        if data.get(key):
+            return data[key]
+    return None
+
+
+def _json_fallback(value):
+    # numpy scalars / arrays from the model pipelines
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(data):
+    """UTF-8 JSON bytes via pydantic_core (compact, non-ASCII kept as is)"""
+    return to_json(data, fallback=_json_fallback)
+
+
+def json_response(data, status=200):
+    """JsonResponse equivalent using the pydantic_core encoder"""
+    return HttpResponse(dumps(data), content_type="application/json", status=status)
@@ -1,16 +1,47 @@
 # ner_app/semantic_module.py
 
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
+from django.conf import settings
+
+from .batching import MicroBatcher
+from .inference_server import inference_client
+from .long_document import aggregate_window_scores, document_windows, split_windows
+from .model_registry import registry
+from .resources import inference, prepare_model
 
 # Best multilingual sentiment model
 model_name = "cardiffnlp/twitter-xlm-roberta-base-sentiment-multilingual"
 
-# Load tokenizer & model
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForSequenceClassification.from_pretrained(model_name)
+def _load_semantic_pipeline(backend=None):
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
+
+    # Load tokenizer & model
+    if (backend or settings.INFERENCE_BACKEND) == "onnx":
+        from .onnx_backend import load_sequence_classification
+        model, tokenizer = load_sequence_classification(model_name)
+    else:
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = prepare_model(AutoModelForSequenceClassification.from_pretrained(model_name))
+
+    # Build pipeline
+    return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+
+registry.register("sentiment", _load_semantic_pipeline)
+
+def _load_semantic_tokenizer(backend=None):
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(model_name)
 
-# Build pipeline
-semantic_pipeline = pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+registry.register("sentiment_tokenizer", _load_semantic_tokenizer)
+
+def get_semantic_pipeline():
+    return registry.get("sentiment")
+
+def get_semantic_tokenizer():
+    # With the inference server only the tokenizer is loaded in this process
+    if inference_client.enabled:
+        return registry.get("sentiment_tokenizer")
+    return get_semantic_pipeline().tokenizer
 
 # Label mapping from model output to human-readable labels
 label_map = {
@@ -19,14 +50,76 @@ label_map = {
     "LABEL_2": "positive"
 }
 
+@inference
+def _semantic_batch(texts):
+    # One top-label result per text; wrapped in a list to match the
+    # single-text pipeline output
+    if inference_client.enabled:
+        return [[r] for r in inference_client.call("sentiment", texts)]
+    return [[r] for r in get_semantic_pipeline()(texts, batch_size=len(texts))]
+
+semantic_batcher = MicroBatcher("sentiment", _semantic_batch)
+
 def analyze_semantics(text):
     """
     Returns semantic sentiment analysis of the input text.
     Output: [{'label': 'positive/neutral/negative', 'score': confidence}]
     """
-    results = semantic_pipeline(text)
+    windows = document_windows(get_semantic_tokenizer(), text)
+    if windows:
+        return _document_sentiment(windows, _window_scores(_window_texts(text, windows)))
+    return _map_labels(semantic_batcher.submit(text))
+
+def analyze_semantics_document(text):
+    """
+    Document-level sentiment for an article-length text: overlapping windows
+    run as one batch and their label scores are averaged, weighted by length.
+    """
+    windows = split_windows(get_semantic_tokenizer(), text)
+    return _document_sentiment(windows, _window_scores(_window_texts(text, windows)))
+
+def analyze_semantics_batch(texts):
+    """
+    Sentiment for many texts in real model batches; one result list per text.
+    Long texts are split into windows that run in the same batches.
+    """
+    if not texts:
+        return []
+    tokenizer = get_semantic_tokenizer()
+    windows = [document_windows(tokenizer, text) for text in texts]
+    inputs = []
+    for text, text_windows in zip(texts, windows):
+        inputs.extend(_window_texts(text, text_windows) if text_windows else [text])
+    scores = _window_scores(inputs)
+
+    results = []
+    position = 0
+    for text_windows in windows:
+        if text_windows:
+            results.append(_document_sentiment(text_windows, scores[position:position + len(text_windows)]))
+            position += len(text_windows)
+        else:
+            results.append(_map_labels([max(scores[position], key=lambda s: s["score"])]))
+            position += 1
+    return results
+
+@inference
+def _window_scores(texts):
+    """Scores of every label for each text"""
+    if inference_client.enabled:
+        return inference_client.call("sentiment", texts, top_k=None)
+    return get_semantic_pipeline()(texts, batch_size=settings.MODEL_BATCH_MAX_SIZE, top_k=None)
+
+def _window_texts(text, windows):
+    return [text[start:end] for start, end in windows]
+
+def _document_sentiment(windows, window_scores):
+    scores = aggregate_window_scores(window_scores, [end - start for start, end in windows])
+    label = max(scores, key=scores.get)
+    return _map_labels([{"label": label, "score": scores[label]}])
+
+def _map_labels(results):
     # Map labels for readability
     for r in results:
         r["label"] = label_map.get(r["label"], r["label"])
     return results
-
@@ -6,3 +6,20 @@ class QueryHistorySerializer(serializers.ModelSerializer):
         model = QueryHistory
         fields = '__all__'
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Sparse fieldsets: ?fields=id,headline,verdict
+        requested = requested_fields(self.context.get("request"))
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+
+def requested_fields(request):
+    """Field names from the ?fields= query parameter, or None for all fields"""
+    if request is None:
+        return None
+    value = request.query_params.get("fields", "")
+    names = {name.strip() for name in value.split(",") if name.strip()}
+    return names or None
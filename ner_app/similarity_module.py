@@ -1,16 +1,95 @@
 # ner_app/similarity_module.py
-from sentence_transformers import SentenceTransformer, util
+import numpy as np
+from django.conf import settings
 
-# Load multilingual model
-model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
+from .batching import MicroBatcher
+from .embedding_cache import embedding_cache
+from .inference_server import inference_client
+from .model_registry import registry
+from .resources import inference, prepare_model
+
+model_name = "paraphrase-multilingual-MiniLM-L12-v2"
+
+def _load_sentence_model(backend=None):
+    from sentence_transformers import SentenceTransformer
+
+    if (backend or settings.INFERENCE_BACKEND) == "onnx":
+        from .onnx_backend import load_sentence_transformer
+        return load_sentence_transformer(model_name)
+
+    # Load multilingual model
+    return prepare_model(SentenceTransformer(model_name))
+
+registry.register("similarity", _load_sentence_model)
+
+def get_sentence_model():
+    return registry.get("similarity")
+
+@inference
+def _encode_batch(texts):
+    if inference_client.enabled:
+        return list(inference_client.call("similarity", texts))
+    return list(get_sentence_model().encode(texts, batch_size=len(texts)))
+
+encode_batcher = MicroBatcher("similarity", _encode_batch)
+
+def encoder_id():
+    # Cached vectors are only valid for the encoder that produced them
+    return f"{model_name}:{settings.INFERENCE_BACKEND}"
+
+def encode_texts(texts):
+    """
+    Returns a float32 matrix with one L2-normalized embedding per text.
+    Each distinct text is encoded at most once; known texts come from the
+    embedding cache.
+    """
+    unique = list(dict.fromkeys(texts))
+    encoder = encoder_id()
+    vectors = embedding_cache.get_many(unique, encoder)
+    missing = [text for text in unique if text not in vectors]
+    if missing:
+        # Encode (batched with concurrent requests)
+        encoded = dict(zip(missing, encode_batcher.submit_many(missing)))
+        embedding_cache.set_many(encoded, encoder)
+        vectors.update(encoded)
+
+    embeddings = np.vstack([vectors[text] for text in texts]).astype(np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
 
 def calculate_similarity(text1, text2):
-    # Encode sentences
-    embeddings = model.encode([text1, text2], convert_to_tensor=True)
-    
-    # Cosine similarity
-    score = util.cos_sim(embeddings[0], embeddings[1]).item()
+    a, b = encode_texts([text1, text2])
+
+    # Cosine similarity (embeddings are normalized)
+    score = float(np.dot(a, b))
+    return similarity_result(score)
 
+def calculate_similarity_batch(pairs):
+    """
+    Similarity for many (text1, text2) pairs; each distinct text is encoded once.
+    """
+    unique = list(dict.fromkeys(t for pair in pairs for t in pair))
+    if not unique:
+        return []
+    row = {text: i for i, text in enumerate(unique)}
+    embeddings = encode_texts(unique)
+    left = embeddings[[row[a] for a, _ in pairs]]
+    right = embeddings[[row[b] for _, b in pairs]]
+    scores = np.einsum("ij,ij->i", left, right)
+    return [similarity_result(float(score)) for score in scores]
+
+def similarity_matrix(left, right=None):
+    """
+    Cosine similarity of every text in `left` against every text in `right`
+    (or against `left` itself) as a len(left) x len(right) float32 matrix.
+    Each distinct text is encoded once and all scores come from one matmul.
+    """
+    texts = left + (right or [])
+    embeddings = encode_texts(texts)
+    left_embeddings = embeddings[:len(left)]
+    right_embeddings = embeddings[len(left):] if right is not None else left_embeddings
+    return left_embeddings @ right_embeddings.T
+
+def similarity_result(score):
     # Label mapping
     if score > 0.7:
         label = "High Similarity"
@@ -23,4 +102,3 @@ def calculate_similarity(text1, text2):
         "label": label,
         "score": score
     }
-
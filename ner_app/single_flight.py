@@ -0,0 +1,105 @@
+# ner_app/single_flight.py
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller (leader)
+    runs the function, everyone who arrives while it is running waits for and
+    receives the same result (or exception).
+
+    Within a process this is a dict of in-flight futures. Across workers it
+    is optional (SINGLE_FLIGHT_CACHE_ALIAS): the leader takes a lock entry
+    with cache.add(), which is atomic in every Django cache backend (with
+    DatabaseCache, the cache table is the lock table), and publishes its
+    result for followers in other processes, who poll for it.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            self._count("followers")
+            return call.result()
+
+        self._count("leaders")
+        try:
+            result = self._run_shared(key, func)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "shared_backend": settings.SINGLE_FLIGHT_CACHE_ALIAS,
+                "counters": dict(self._counters),
+            }
+
+    def _run_shared(self, key, func):
+        alias = settings.SINGLE_FLIGHT_CACHE_ALIAS
+        if not alias:
+            return func()
+
+        cache = caches[alias]
+        lock_key = f"factguard:flight:{self.name}:{key}:lock"
+        result_key = f"factguard:flight:{self.name}:{key}:result"
+        wait = settings.SINGLE_FLIGHT_WAIT
+
+        if not cache.add(lock_key, uuid.uuid4().hex, timeout=wait):
+            # Another worker is computing it
+            result = self._wait_for(cache, lock_key, result_key, wait)
+            if result is not None:
+                self._count("remote_followers")
+                return result[0]
+            # Leader gave up or timed out; compute it here
+            self._count("remote_wait_timeouts")
+            return func()
+
+        try:
+            result = func()
+            # Boxed so a None result is distinguishable from a miss. Set
+            # before the lock is released, so a follower that sees the lock
+            # gone always finds the result.
+            cache.set(result_key, (result,), timeout=settings.SINGLE_FLIGHT_RESULT_TTL)
+            return result
+        finally:
+            cache.delete(lock_key)
+
+    def _wait_for(self, cache, lock_key, result_key, wait):
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            result = cache.get(result_key)
+            if result is not None:
+                return result
+            if cache.get(lock_key) is None:
+                return cache.get(result_key)
+            time.sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
+        return None
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
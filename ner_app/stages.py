@@ -0,0 +1,134 @@
+# ner_app/stages.py
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connections
+
+# Pools for the /analyze/ fan-out: "local" for the model stages, "remote"
+# for calls to the custom model server, so remote calls that take minutes
+# (or overran their timeout and still hold their thread) cannot starve the
+# local stages of threads. A stage that overruns its timeout keeps its worker
+# until it returns, so the pools are sized well above the stage count.
+# One set of pools per process: a forked child does not inherit the parent's
+# threads.
+_executors = {}
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+# While a stage with a timeout is still queued its deadline is not known yet;
+# check back this often
+_START_POLL_INTERVAL = 0.05
+
+
+def _get_executor(pool="local"):
+    global _executor_pid
+    with _executor_lock:
+        if _executor_pid != os.getpid():
+            _executors.clear()
+            _executor_pid = os.getpid()
+        if pool not in _executors:
+            workers = {
+                "local": settings.ANALYZE_MAX_WORKERS,
+                "remote": settings.ANALYZE_REMOTE_MAX_WORKERS,
+            }[pool]
+            _executors[pool] = ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix=f"analyze-{pool}",
+            )
+        return _executors[pool]
+
+
+def _run_stage(func, started, name):
+    started[name] = time.monotonic()
+    try:
+        return func()
+    finally:
+        # Pool threads outlive the request; don't leave their DB connections open
+        connections.close_all()
+
+
+def iter_stages(stages, timeouts=None, fallbacks=None, default_timeout=None, heartbeat=None,
+                pools=None):
+    """
+    Run every stage concurrently and yield (name, result) as each one finishes.
+
+    stages:    {name: zero-argument callable}
+    timeouts:  {name: seconds}; a stage without an entry uses default_timeout.
+               The clock starts when the stage starts running, not while it
+               waits for a free thread.
+    fallbacks: {name: zero-argument callable} used when a stage times out
+               (stages without a fallback yield None)
+    heartbeat: if set, (None, None) is yielded whenever that many seconds pass
+               without a stage finishing (lets streaming callers keep the
+               connection alive)
+    pools:     {name: "local" | "remote"}; stages default to the local pool
+
+    Exceptions raised by a stage propagate to the caller.
+    """
+    timeouts = timeouts or {}
+    fallbacks = fallbacks or {}
+
+    if not settings.ANALYZE_CONCURRENT:
+        # Sequential mode: same contract, no thread hand-off
+        for name, func in stages.items():
+            yield name, func()
+        return
+
+    pools = pools or {}
+    pending = {}
+    limits = {}
+    started = {}
+    for name, func in stages.items():
+        executor = _get_executor(pools.get(name, "local"))
+        # Run in a copy of the caller's context so per-request stage timers
+        # (ner_app.metrics) record onto the request's trace
+        context = contextvars.copy_context()
+        pending[executor.submit(context.run, _run_stage, func, started, name)] = name
+        limits[name] = timeouts.get(name, default_timeout)
+
+    def deadline(name):
+        if limits[name] is None or name not in started:
+            return None
+        return started[name] + limits[name]
+
+    last_yield = time.monotonic()
+    while pending:
+        now = time.monotonic()
+        wake_ups = [d - now for d in map(deadline, pending.values()) if d is not None]
+        if any(limits[n] is not None and n not in started for n in pending.values()):
+            wake_ups.append(_START_POLL_INTERVAL)
+        if heartbeat is not None:
+            wake_ups.append(last_yield + heartbeat - now)
+        wait_for = max(0, min(wake_ups)) if wake_ups else None
+
+        done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+        if heartbeat is not None and not done and time.monotonic() - last_yield >= heartbeat:
+            last_yield = time.monotonic()
+            yield None, None
+        for future in done:
+            name = pending.pop(future)
+            last_yield = time.monotonic()
+            yield name, future.result()
+
+        now = time.monotonic()
+        for future, name in list(pending.items()):
+            stage_deadline = deadline(name)
+            if stage_deadline is not None and now >= stage_deadline:
+                # Cannot interrupt a running thread; just stop waiting for it
+                future.cancel()
+                del pending[future]
+                fallback = fallbacks.get(name)
+                yield name, fallback() if fallback else None
+
+
+def run_stages(stages, timeouts=None, fallbacks=None, default_timeout=None, pools=None):
+    """
+    Run every stage concurrently and return {name: result} once all have
+    finished or timed out. Latency is bounded by the slowest stage rather
+    than the sum of all stages.
+    """
+    return dict(iter_stages(stages, timeouts, fallbacks, default_timeout, pools=pools))
@@ -0,0 +1,76 @@
+import threading
+
+from django.test import SimpleTestCase, override_settings
+
+from ner_app import batching
+from ner_app.batching import MicroBatcher
+
+
+@override_settings(MODEL_BATCHING=True)
+class MicroBatcherTests(SimpleTestCase):
+
+    def batcher(self, process_batch=None, max_batch_size=8, max_wait_ms=50):
+        self.batches = []
+
+        def record(items):
+            self.batches.append(list(items))
+            return [item * 10 for item in items]
+
+        batcher = MicroBatcher("test", process_batch or record, max_batch_size, max_wait_ms)
+        self.addCleanup(batching._batchers.pop, "test", None)
+        return batcher
+
+    def test_concurrent_submits_share_a_batch(self):
+        batcher = self.batcher(max_wait_ms=300)
+        results = {}
+        start = threading.Barrier(4)
+
+        def submit(item):
+            start.wait()
+            results[item] = batcher.submit(item)
+
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, {0: 0, 1: 10, 2: 20, 3: 30})
+        self.assertEqual(len(self.batches), 1)
+        self.assertEqual(batcher.stats()["batch_size_histogram"], {4: 1})
+
+    def test_batches_are_capped_and_results_keep_their_order(self):
+        batcher = self.batcher(max_batch_size=2, max_wait_ms=0)
+        self.assertEqual(batcher.submit_many([1, 2, 3, 4, 5]), [10, 20, 30, 40, 50])
+        self.assertTrue(all(len(batch) <= 2 for batch in self.batches))
+        self.assertEqual(sum(self.batches, []), [1, 2, 3, 4, 5])
+
+    def test_error_reaches_every_caller_and_the_worker_survives(self):
+        def process_batch(items):
+            if "bad" in items:
+                raise ValueError("bad input")
+            return items
+
+        batcher = self.batcher(process_batch, max_wait_ms=0)
+        with self.assertRaises(ValueError):
+            batcher.submit_many(["bad", "good"])
+        self.assertEqual(batcher.submit("good"), "good")
+
+    def test_short_result_list_fails_instead_of_hanging(self):
+        batcher = self.batcher(lambda items: items[:1], max_wait_ms=100)
+        with self.assertRaises(RuntimeError):
+            batcher.submit_many([1, 2])
+
+    @override_settings(MODEL_BATCHING=False)
+    def test_disabled_batching_calls_directly(self):
+        batcher = self.batcher()
+        self.assertEqual(batcher.submit_many([1, 2]), [10, 20])
+        self.assertEqual(self.batches, [[1, 2]])
+        self.assertIsNone(batcher._queue)
+
+    @override_settings(MODEL_BATCHING=False)
+    def test_batching_can_be_forced_per_call(self):
+        # The inference server batches whatever MODEL_BATCHING says
+        batcher = self.batcher()
+        self.assertEqual(batcher.submit_many([1, 2], batching=True), [10, 20])
+        self.assertIsNotNone(batcher._queue)
@@ -0,0 +1,104 @@
+import tempfile
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from ner_app.embedding_index import EmbeddingIndex
+
+
+def clustered_vectors(n, dim=16, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return (centers[rng.integers(clusters, size=n)] + 0.1 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+class EmbeddingIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_empty_index(self):
+        index = EmbeddingIndex(self.directory)
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.search(np.ones(4)), [])
+
+    def test_brute_force_cosine_ranking(self):
+        index = EmbeddingIndex(self.directory)
+        index.add_many([10, 20, 30], [[1, 0, 0], [1, 1, 0], [0, 0, 1]])
+        # Scaled copies have the same cosine score
+        results = index.search([5, 0, 0], k=2)
+        self.assertEqual([claim_id for claim_id, _ in results], [10, 20])
+        self.assertAlmostEqual(results[0][1], 1.0, places=6)
+        self.assertAlmostEqual(results[1][1], np.sqrt(0.5), places=6)
+        self.assertEqual(len(index.search([0, 0, 1], k=10)), 3)
+
+    def test_rows_added_by_another_process_are_seen(self):
+        reader = EmbeddingIndex(self.directory)
+        writer = EmbeddingIndex(self.directory)
+        writer.add(1, [1.0, 0.0])
+        self.assertEqual(reader.search([1.0, 0.0], k=1)[0][0], 1)
+        writer.add(2, [0.0, 1.0])
+        self.assertEqual(len(reader), 2)
+        self.assertEqual(reader.search([0.0, 1.0], k=1)[0][0], 2)
+
+    def test_ivf_matches_brute_force_on_clustered_data(self):
+        vectors = clustered_vectors(2000)
+        ids = np.arange(2000) + 1000
+        exact = EmbeddingIndex(self.directory, ann_threshold=10**9)
+        exact.add_many(ids, vectors)
+        ivf = EmbeddingIndex(self.directory, ann_threshold=500, nprobe=8)
+
+        queries = clustered_vectors(50, seed=1)
+        hits = 0
+        for query in queries:
+            expected = {claim_id for claim_id, _ in exact.search(query, k=5)}
+            hits += len(expected & {claim_id for claim_id, _ in ivf.search(query, k=5)})
+        self.assertIsNotNone(ivf._ivf)
+        self.assertGreaterEqual(hits / (5 * len(queries)), 0.95)
+
+        # A stored vector finds itself
+        self.assertEqual(ivf.search(vectors[123], k=1)[0][0], 1123)
+
+    def test_ivf_scans_rows_added_after_the_build(self):
+        index = EmbeddingIndex(self.directory, ann_threshold=500, nprobe=1)
+        index.add_many(np.arange(1000), clustered_vectors(1000))
+        index.search(np.ones(16))
+        built_rows = index._ivf["rows"]
+
+        outlier = np.zeros(16, dtype=np.float32)
+        outlier[0] = 1.0
+        index.add(99999, outlier)
+        self.assertEqual(index.search(outlier, k=1)[0][0], 99999)
+        # Fewer than 20% new rows: the IVF index is not rebuilt
+        self.assertEqual(index._ivf["rows"], built_rows)
+
+    def test_torn_write_is_cut_back_before_the_next_append(self):
+        index = EmbeddingIndex(self.directory)
+        index.add_many([1, 2], [[1, 0, 0], [0, 1, 0]])
+        # A writer died after appending its vector but before its id
+        with open(index._vectors_path, "ab") as f:
+            f.write(np.array([[0, 0, 1]], dtype=np.float32).tobytes())
+        self.assertEqual(len(index), 2)
+
+        index.add(3, [1, 1, 0])
+        self.assertEqual(len(index), 3)
+        self.assertLess(index.search([0, 0, 1], k=3)[0][1], 0.9)
+        self.assertEqual(index.search([1, 1, 0], k=1)[0][0], 3)
+
+    def test_index_of_another_encoder_is_not_searched(self):
+        EmbeddingIndex(self.directory, encoder="old-model:torch").add(1, [1.0, 0.0])
+        index = EmbeddingIndex(self.directory, encoder="new-model:onnx")
+        self.assertEqual(index.search([1.0, 0.0]), [])
+
+        # The next write starts a new index
+        index.add(2, [1.0, 0.0, 0.0])
+        self.assertEqual(index.search([1.0, 0.0, 0.0]), [(2, 1.0)])
+        self.assertEqual(EmbeddingIndex(self.directory, encoder="old-model:torch").search([1.0, 0.0]), [])
+
+    def test_dimension_mismatch_is_rejected(self):
+        index = EmbeddingIndex(self.directory)
+        index.add(1, [1.0, 0.0])
+        with self.assertRaises(ValueError):
+            index.add(2, [1.0, 0.0, 0.0])
@@ -0,0 +1,49 @@
+from django.test import TestCase, override_settings
+
+from ner_app.entity_index import index_claims, move_verdicts, top_entities, unindex_claims
+from ner_app.models import EntityRollup, QueryHistory
+
+PFIZER = [{"text": "Pfizer", "label": "ORG"}]
+
+
+@override_settings(ENTITY_INDEX_ENABLED=True)
+class TopEntitiesTests(TestCase):
+
+    def claim(self, verdict, is_fake, entities=PFIZER):
+        claim = QueryHistory.objects.create(headline="Pfizer vaccine claim", verdict=verdict, is_fake=is_fake)
+        index_claims([(claim, entities)])
+        return claim
+
+    def counts(self, **params):
+        response = self.client.get("/entities/top/", params)
+        self.assertEqual(response.status_code, 200)
+        return {row["entity"]: row["claims"] for row in response.json()["results"]}
+
+    def test_rollups_are_keyed_on_is_fake(self):
+        # Raw model verdicts vary in wording
+        self.claim("Likely False", True)
+        self.claim("FAKE NEWS", True)
+        self.claim("Verified", False)
+        self.claim("Error analyzing claim", None)
+
+        self.assertEqual(self.counts(verdict="FAKE"), {"Pfizer": 2})
+        self.assertEqual(self.counts(verdict="fake"), {"Pfizer": 2})
+        self.assertEqual(self.counts(fake="1"), {"Pfizer": 2})
+        self.assertEqual(self.counts(fake="0"), {"Pfizer": 1})
+        self.assertEqual(self.counts(verdict="UNKNOWN"), {"Pfizer": 1})
+        self.assertEqual(self.counts(), {"Pfizer": 4})
+
+    def test_unknown_verdict_is_rejected(self):
+        self.assertEqual(self.client.get("/entities/top/", {"verdict": "Likely False"}).status_code, 400)
+        self.assertEqual(self.client.get("/entities/top/", {"fake": "maybe"}).status_code, 400)
+
+    def test_move_and_unindex(self):
+        claim = self.claim("Likely False", True)
+        claim.verdict, claim.is_fake = "Verified", False
+        move_verdicts([(claim, True)])
+        self.assertEqual(top_entities("FAKE"), [])
+        self.assertEqual(top_entities("REAL")[0]["claims"], 1)
+
+        unindex_claims([claim])
+        self.assertEqual(top_entities(), [])
+        self.assertEqual(set(EntityRollup.objects.values_list("count", flat=True)), {0})
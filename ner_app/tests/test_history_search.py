@@ -0,0 +1,34 @@
+from django.test import TestCase
+
+from ner_app.models import QueryHistory
+
+HEADLINES = [
+    "新冠疫苗安全吗",
+    "疫苗导致自闭症",
+    "政府发布新政策",
+    "新しいワクチンが承認された",
+    "COVID 疫苗 approved",
+]
+
+
+class HistorySearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for headline in HEADLINES:
+            QueryHistory.objects.create(headline=headline, verdict="VERIFIED")
+
+    def search(self, query):
+        response = self.client.get("/history/", {"search": query, "fields": "headline"})
+        self.assertEqual(response.status_code, 200)
+        return sorted(item["headline"] for item in response.json()["results"])
+
+    def test_chinese_word_inside_a_headline(self):
+        self.assertEqual(self.search("疫苗"), sorted(["COVID 疫苗 approved", "疫苗导致自闭症", "新冠疫苗安全吗"]))
+
+    def test_japanese(self):
+        self.assertEqual(self.search("ワクチン"), ["新しいワクチンが承認された"])
+
+    def test_terms_and_exclusions(self):
+        self.assertEqual(self.search("疫苗 -自闭症 -covid"), ["新冠疫苗安全吗"])
+        self.assertEqual(self.search('"疫苗" covid'), ["COVID 疫苗 approved"])
@@ -0,0 +1,209 @@
+import csv
+import fcntl
+import functools
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from ner_app.history_writer import HistoryWriter
+from ner_app.models import QueryHistory
+
+
+def record(headline, age=0):
+    return QueryHistory(headline=headline, verdict="VERIFIED", created_at=timezone.now() - timedelta(seconds=age))
+
+
+saved_headlines = []
+
+
+def remember_headline(saved, suffix=""):
+    saved_headlines.append(saved.headline + suffix)
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", ""])
+    process.wait()
+    return process.pid
+
+
+class HistoryWriterSpillTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.spill_dir = directory.name
+        self.writer = HistoryWriter(
+            max_queue=10, batch_size=10, flush_interval=0.1, put_timeout=0, spill_dir=self.spill_dir
+        )
+
+    def spill_files(self):
+        return sorted(os.listdir(self.spill_dir))
+
+    def headlines(self):
+        return sorted(QueryHistory.objects.values_list("headline", flat=True))
+
+    def test_flush_writes_rows_and_runs_callbacks(self):
+        saved = []
+        self.writer._flush([(record("one"), saved.append), (record("two"), None)])
+        self.assertEqual(self.headlines(), ["one", "two"])
+        self.assertIsNotNone(saved[0].pk)
+
+    def test_failed_flush_is_spilled_and_replayed(self):
+        with mock.patch.object(QueryHistory.objects, "bulk_create", side_effect=RuntimeError("db down")), \
+                self.assertLogs("ner_app.history_writer", "ERROR"):
+            self.writer._flush([(record("one"), None)])
+        self.assertEqual(self.spill_files(), [f"spill-{os.getpid()}.ndjson"])
+        self.assertEqual(self.headlines(), [])
+
+        self.writer._flush([(record("two"), None)])
+        self.assertEqual(self.headlines(), ["one", "two"])
+        self.assertEqual(self.spill_files(), [])
+        self.assertEqual(self.writer.stats()["counters"]["rows_replayed"], 1)
+
+    def test_replayed_rows_keep_created_at(self):
+        row = record("old", age=3600)
+        self.writer._spill([(row, None)])
+        self.writer._replay_spill()
+        replayed = QueryHistory.objects.get()
+        self.assertEqual(replayed.created_at, row.created_at)
+        # Inserted now, not when the row was built
+        self.assertGreater(replayed.inserted_at, row.created_at + timedelta(minutes=59))
+
+    def test_claim_of_a_dead_process_is_replayed(self):
+        self.writer._spill([(record("orphaned"), None)])
+        spilled = os.path.join(self.spill_dir, self.spill_files()[0])
+        os.rename(spilled, f"{spilled}.replaying-{dead_pid()}")
+
+        self.writer._replay_spill()
+        self.assertEqual(self.headlines(), ["orphaned"])
+        self.assertEqual(self.spill_files(), [])
+
+    def test_recent_claim_of_a_live_process_is_left_alone(self):
+        self.writer._spill([(record("in progress"), None)])
+        spilled = os.path.join(self.spill_dir, self.spill_files()[0])
+        claimed = f"{spilled}.replaying-{os.getppid()}"
+        os.rename(spilled, claimed)
+
+        self.writer._replay_spill()
+        self.assertEqual(self.headlines(), [])
+
+        # Claims older than claim_timeout are taken over even if the pid is in use
+        past = time.time() - self.writer.claim_timeout - 1
+        os.utime(claimed, (past, past))
+        self.writer._replay_spill()
+        self.assertEqual(self.headlines(), ["in progress"])
+
+    def test_torn_line_is_skipped(self):
+        self.writer._spill([(record("complete"), None)])
+        with open(os.path.join(self.spill_dir, self.spill_files()[0]), "a") as f:
+            f.write('{"headline": "tor')
+        with self.assertLogs("ner_app.history_writer", "ERROR"):
+            self.writer._replay_spill()
+        self.assertEqual(self.headlines(), ["complete"])
+
+    def test_failed_replay_does_not_overwrite_a_newer_spill_file(self):
+        self.writer._spill([(record("first"), None)])
+
+        def spill_during_replay(*args, **kwargs):
+            # The owning process spills again while the old file is claimed
+            self.writer._spill([(record("second"), None)])
+            raise RuntimeError("db down")
+
+        with mock.patch.object(QueryHistory.objects, "bulk_create", side_effect=spill_during_replay), \
+                self.assertLogs("ner_app.history_writer", "ERROR"):
+            self.writer._replay_spill()
+        self.assertEqual(len(self.spill_files()), 2)
+
+        self.writer._replay_spill()
+        self.assertEqual(self.headlines(), ["first", "second"])
+
+    def test_callbacks_of_spilled_rows_run_after_replay(self):
+        saved_headlines.clear()
+        callback = functools.partial(remember_headline, suffix="!")
+        with mock.patch.object(QueryHistory.objects, "bulk_create", side_effect=RuntimeError("db down")), \
+                self.assertLogs("ner_app.history_writer", "ERROR"):
+            self.writer._flush([(record("one"), callback), (record("two"), remember_headline)])
+        self.assertEqual(saved_headlines, [])
+
+        self.writer._replay_spill()
+        self.assertEqual(saved_headlines, ["one!", "two"])
+
+    def test_callbacks_that_cannot_be_imported_are_dropped(self):
+        self.writer._spill([(record("one"), lambda saved: None)])
+        self.assertEqual(self.writer.stats()["counters"]["callbacks_dropped"], 1)
+        self.writer._replay_spill()
+        self.assertEqual(self.headlines(), ["one"])
+
+    def test_append_after_a_claim_goes_to_a_new_file(self):
+        self.writer._spill([(record("one"), None)])
+        spilled = os.path.join(self.spill_dir, self.spill_files()[0])
+        claimed = f"{spilled}.replaying-{os.getppid()}"
+        real_flock = fcntl.flock
+        calls = []
+
+        def claim_before_lock(f, operation):
+            # Another process claims the file between open() and flock()
+            if not calls:
+                os.rename(spilled, claimed)
+            calls.append(operation)
+            real_flock(f, operation)
+
+        with mock.patch("ner_app.history_writer.fcntl.flock", side_effect=claim_before_lock):
+            self.writer._spill([(record("two"), None)])
+
+        with open(claimed) as f:
+            self.assertEqual([json.loads(line)["row"]["headline"] for line in f], ["one"])
+        with open(spilled) as f:
+            self.assertEqual([json.loads(line)["row"]["headline"] for line in f], ["two"])
+
+
+class ExportWatermarkTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = os.path.join(directory.name, "history.csv")
+        self.watermark = os.path.join(directory.name, "watermark.json")
+
+    def export(self):
+        call_command(
+            "export_history", output=self.output, watermark=self.watermark, settle=0, stdout=io.StringIO()
+        )
+        with open(self.output, newline="", encoding="utf-8") as f:
+            return [row["headline"] for row in csv.DictReader(f)]
+
+    def test_late_insert_is_exported_on_the_next_run(self):
+        record("first").save()
+        self.assertEqual(self.export(), ["first"])
+        time.sleep(0.01)
+
+        # Created before the last export, inserted after it (write-behind / spill replay)
+        record("late", age=3600).save()
+        self.assertEqual(self.export(), ["late"])
+        self.assertEqual(self.export(), [])
+
+    def test_invalid_watermark_fails_the_command(self):
+        with open(self.watermark, "w") as f:
+            json.dump({"id": 1}, f)
+        with self.assertRaises(CommandError):
+            self.export()
+        self.assertFalse(os.path.exists(self.output))
+
+    def test_failed_export_fails_the_command(self):
+        record("first").save()
+        with mock.patch("ner_app.management.commands.export_history.Command.write_csv",
+                        side_effect=OSError("disk full")):
+            with self.assertRaises(CommandError):
+                self.export()
+        # The watermark is not advanced
+        self.assertFalse(os.path.exists(self.watermark))
@@ -0,0 +1,130 @@
+import json
+import socket
+from datetime import timedelta
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from ner_app import jobs
+from ner_app.jobs import requeue_stale_jobs, send_callbacks, validate_callback_url, validate_priority
+from ner_app.models import AnalysisJob
+
+
+def resolves_to(*addresses):
+    infos = [(socket.AF_INET6 if ":" in a else socket.AF_INET, socket.SOCK_STREAM, 6, "", (a, 443)) for a in addresses]
+    return mock.patch.object(jobs.socket, "getaddrinfo", return_value=infos)
+
+
+@override_settings(ANALYSIS_JOB_CALLBACK_ALLOWED_HOSTS=[])
+class ValidateCallbackUrlTests(SimpleTestCase):
+
+    def test_public_host_is_accepted(self):
+        with resolves_to("93.184.216.34"):
+            validate_callback_url("https://hooks.example.com/factguard")
+
+    def test_internal_addresses_are_rejected(self):
+        for address in ("127.0.0.1", "10.1.2.3", "192.168.0.10", "169.254.169.254", "::1", "fe80::1%eth0",
+                        "::ffff:127.0.0.1", "0.0.0.0", "100.64.0.1"):
+            with self.subTest(address=address), resolves_to(address):
+                with self.assertRaisesRegex(ValueError, "non-public"):
+                    validate_callback_url("https://hooks.example.com/")
+
+    def test_any_internal_address_rejects_the_host(self):
+        with resolves_to("93.184.216.34", "10.0.0.5"), self.assertRaises(ValueError):
+            validate_callback_url("https://hooks.example.com/")
+
+    def test_literal_ip_is_checked(self):
+        with self.assertRaises(ValueError):
+            validate_callback_url("http://127.0.0.1:8000/admin/")
+
+    def test_unresolvable_host_is_rejected(self):
+        with mock.patch.object(jobs.socket, "getaddrinfo", side_effect=socket.gaierror), \
+                self.assertRaisesRegex(ValueError, "does not resolve"):
+            validate_callback_url("https://missing.invalid/")
+
+    def test_non_http_scheme_is_rejected(self):
+        with self.assertRaises(ValueError):
+            validate_callback_url("file:///etc/passwd")
+
+    @override_settings(ANALYSIS_JOB_CALLBACK_ALLOWED_HOSTS=["hooks.internal"])
+    def test_allowlist_replaces_the_address_check(self):
+        with resolves_to("10.0.0.5"):
+            validate_callback_url("https://hooks.internal/")
+        with self.assertRaisesRegex(ValueError, "not allowed"):
+            validate_callback_url("https://hooks.example.com/")
+
+    def test_callbacks_are_revalidated_and_not_redirected(self):
+        job = AnalysisJob(status=AnalysisJob.DONE, created_at=timezone.now(),
+                          callback_urls=["https://hooks.example.com/a", "https://rebound.example.com/b"])
+
+        def getaddrinfo(host, *args, **kwargs):
+            address = "93.184.216.34" if host == "hooks.example.com" else "127.0.0.1"
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, 443))]
+
+        with mock.patch.object(jobs.socket, "getaddrinfo", side_effect=getaddrinfo), \
+                mock.patch.object(jobs.requests, "post") as post, \
+                self.assertLogs("ner_app.jobs", "WARNING"):
+            send_callbacks(job)
+        post.assert_called_once()
+        self.assertEqual(post.call_args.args, ("https://hooks.example.com/a",))
+        self.assertFalse(post.call_args.kwargs["allow_redirects"])
+
+
+@override_settings(ANALYSIS_JOB_LEASE=60)
+class RequeueStaleJobsTests(TestCase):
+
+    def running_job(self, started_ago, attempts=1):
+        return AnalysisJob.objects.create(
+            text="Claim", dedup_key=f"{started_ago}-{attempts}", status=AnalysisJob.RUNNING,
+            attempts=attempts, max_attempts=3, started_at=timezone.now() - timedelta(seconds=started_ago),
+        )
+
+    def test_expired_leases_are_requeued_or_failed(self):
+        stale = self.running_job(120)
+        exhausted = self.running_job(120, attempts=3)
+        fresh = self.running_job(10)
+
+        self.assertEqual(requeue_stale_jobs(), 1)
+        for job in (stale, exhausted, fresh):
+            job.refresh_from_db()
+        self.assertEqual(stale.status, AnalysisJob.QUEUED)
+        self.assertEqual(exhausted.status, AnalysisJob.FAILED)
+        self.assertEqual(fresh.status, AnalysisJob.RUNNING)
+
+
+class ValidatePriorityTests(SimpleTestCase):
+
+    def test_integers_in_range_are_accepted(self):
+        for value, expected in ((0, 0), (-100, -100), (100, 100), ("7", 7), (" -3 ", -3)):
+            with self.subTest(value=value):
+                self.assertEqual(validate_priority(value), expected)
+
+    def test_other_values_are_rejected(self):
+        for value in (None, [], {}, True, 1.5, "high", 101, -101, 40000):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                validate_priority(value)
+
+
+@override_settings(PREFILTER_ENABLED=False)
+class EnqueueAnalysisViewTests(TestCase):
+
+    def post(self, **fields):
+        body = {"text": "Vaccine approved", "async": True, **fields}
+        return self.client.post("/analyze/", json.dumps(body), content_type="application/json")
+
+    def test_invalid_priority_is_a_bad_request(self):
+        for priority in (None, [1], {"level": 1}, 1000):
+            with self.subTest(priority=priority):
+                response = self.post(priority=priority)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("priority", response.json()["error"])
+        self.assertFalse(AnalysisJob.objects.exists())
+
+    def test_non_string_callback_url_is_a_bad_request(self):
+        self.assertEqual(self.post(callback_url=123).status_code, 400)
+
+    def test_job_is_queued_with_its_priority(self):
+        response = self.post(priority="5")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(AnalysisJob.objects.get().priority, 5)
@@ -0,0 +1,129 @@
+import re
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from ner_app import ner_module, semantic_module
+from ner_app.long_document import document_windows, merge_entity_spans, split_windows
+
+
+def whitespace_tokenizer(text, add_special_tokens=False, return_offsets_mapping=True):
+    return {"offset_mapping": [match.span() for match in re.finditer(r"\S+", text)]}
+
+
+def words(n):
+    return " ".join(f"w{i}" for i in range(n))
+
+
+def span(start, end, label="PER", score=0.9):
+    return {"start": start, "end": end, "label": label, "score": score}
+
+
+class SplitWindowsTests(SimpleTestCase):
+
+    def test_short_text_is_one_window(self):
+        self.assertEqual(split_windows(whitespace_tokenizer, "a b c", window_tokens=4, stride=1), [(0, 5)])
+
+    def test_windows_overlap_by_stride(self):
+        text = words(10)
+        windows = split_windows(whitespace_tokenizer, text, window_tokens=4, stride=2)
+        self.assertEqual([text[start:end].split() for start, end in windows], [
+            ["w0", "w1", "w2", "w3"],
+            ["w2", "w3", "w4", "w5"],
+            ["w4", "w5", "w6", "w7"],
+            ["w6", "w7", "w8", "w9"],
+        ])
+
+    def test_last_window_ends_at_the_last_token(self):
+        text = words(7) + "  "
+        windows = split_windows(whitespace_tokenizer, text, window_tokens=4, stride=1)
+        self.assertEqual(text[windows[-1][0]:windows[-1][1]].split()[-1], "w6")
+
+
+@override_settings(DOCUMENT_WINDOW_TOKENS=8, DOCUMENT_WINDOW_STRIDE=2)
+class DocumentWindowsTests(SimpleTestCase):
+
+    def test_decided_by_token_count(self):
+        # Many characters, few tokens: one window
+        self.assertIsNone(document_windows(whitespace_tokenizer, "supercalifragilistic " * 8))
+        # Fewer characters, more tokens: windows
+        self.assertEqual(len(document_windows(whitespace_tokenizer, words(14))), 2)
+
+    def test_short_text_is_not_tokenized(self):
+        tokenizer = mock.Mock()
+        self.assertIsNone(document_windows(tokenizer, "abc"))
+        tokenizer.assert_not_called()
+
+
+class MergeEntitySpansTests(SimpleTestCase):
+
+    def test_same_label_overlaps_are_joined(self):
+        merged = merge_entity_spans([span(0, 5, score=0.7), span(3, 12, score=0.9)])
+        self.assertEqual(merged, [span(0, 12, score=0.9)])
+
+    def test_higher_score_wins_a_label_conflict(self):
+        merged = merge_entity_spans([span(0, 5, "ORG", 0.6), span(2, 8, "PER", 0.8)])
+        self.assertEqual(merged, [span(2, 8, "PER", 0.8)])
+
+    def test_disjoint_and_adjacent_spans_are_kept(self):
+        spans = [span(10, 14), span(0, 5), span(5, 8)]
+        self.assertEqual(merge_entity_spans(spans), [span(0, 5), span(5, 8), span(10, 14)])
+
+    def test_duplicate_from_overlapping_windows(self):
+        self.assertEqual(merge_entity_spans([span(4, 9), span(4, 9)]), [span(4, 9)])
+
+
+def fake_ner(texts, batch_size=1):
+    # Every token starting with "P" is a person
+    return [
+        [{"entity_group": "PER", "score": 0.9, "word": m.group(), "start": m.start(), "end": m.end()}
+         for m in re.finditer(r"\bP\w*", text)]
+        for text in texts
+    ]
+
+
+def fake_sentiment(texts, batch_size=1, top_k=None):
+    return [
+        [{"label": "LABEL_2", "score": 0.7}, {"label": "LABEL_0", "score": 0.3}] if "good" in text
+        else [{"label": "LABEL_0", "score": 0.6}, {"label": "LABEL_2", "score": 0.4}]
+        for text in texts
+    ]
+
+
+@override_settings(
+    DOCUMENT_WINDOW_TOKENS=8, DOCUMENT_WINDOW_STRIDE=2, MODEL_BATCH_MAX_SIZE=4, INFERENCE_SERVER_SOCKET="",
+)
+class BatchDocumentModeTests(SimpleTestCase):
+
+    def setUp(self):
+        for module, pipeline_getter, tokenizer_getter, pipeline in (
+            (ner_module, "get_ner_pipeline", "get_ner_tokenizer", fake_ner),
+            (semantic_module, "get_semantic_pipeline", "get_semantic_tokenizer", fake_sentiment),
+        ):
+            for name, value in ((pipeline_getter, lambda pipeline=pipeline: pipeline),
+                                (tokenizer_getter, lambda: whitespace_tokenizer)):
+                patcher = mock.patch.object(module, name, value)
+                patcher.start()
+                self.addCleanup(patcher.stop)
+
+    def test_long_text_in_a_batch_is_windowed(self):
+        document = words(6) + " Paris " + words(6) + " Paris"
+        entities = ner_module.get_named_entities_batch(["Pat", document, "Pam"])
+        self.assertEqual(entities[0], [{"text": "Pat", "label": "PER"}])
+        self.assertEqual(entities[2], [{"text": "Pam", "label": "PER"}])
+        # Same shape as the single-text document mode, mentions at document offsets
+        self.assertEqual(entities[1], ner_module.get_named_entities_document(document))
+        self.assertEqual(len(entities[1][0]["mentions"]), 2)
+        for start, end in entities[1][0]["mentions"]:
+            self.assertEqual(document[start:end], "Paris")
+
+    def test_long_text_sentiment_in_a_batch(self):
+        document = "bad " * 12 + "good " * 4
+        results = semantic_module.analyze_semantics_batch(["so good", document, "bad"])
+        self.assertEqual(results[0], [{"label": "positive", "score": 0.7}])
+        self.assertEqual(results[1], semantic_module.analyze_semantics_document(document))
+        self.assertEqual(results[2], [{"label": "negative", "score": 0.6}])
+
+    def test_empty_batch(self):
+        self.assertEqual(ner_module.get_named_entities_batch([]), [])
+        self.assertEqual(semantic_module.analyze_semantics_batch([]), [])
@@ -0,0 +1,131 @@
+import os
+import tempfile
+
+from django.http import JsonResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from ner_app.metrics import MetricsRegistry, current_trace, instrumented, requests_total, timed
+
+
+def sample(text, line_start):
+    return [line for line in text.splitlines() if line.startswith(line_start)]
+
+
+class MetricsRegistryTests(SimpleTestCase):
+
+    def test_process_local_render(self):
+        registry = MetricsRegistry()
+        requests = registry.counter("requests_total", "Requests", ("status",))
+        latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        requests.inc(status=200)
+        requests.inc(2, status=200)
+        latency.observe(0.05)
+        latency.observe(5)
+
+        text = registry.render()
+        self.assertIn('requests_total{status="200"} 3', text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="1"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 2', text)
+        self.assertIn("latency_seconds_count 2", text)
+
+
+class InstrumentedViewTests(SimpleTestCase):
+
+    def requests(self, endpoint):
+        return sum(n for (name, _), n in requests_total.values().items() if name == endpoint)
+
+    def test_streamed_response_is_counted_when_the_stream_ends(self):
+        traces = []
+
+        def chunks():
+            with timed("test_stage"):
+                traces.append(current_trace())
+            yield b"one\n"
+            yield b"two\n"
+
+        @instrumented("test_stream")
+        def view(request):
+            return StreamingHttpResponse(chunks())
+
+        before = self.requests("test_stream")
+        response = view(RequestFactory().get("/"))
+        self.assertEqual(self.requests("test_stream"), before)
+
+        self.assertEqual(b"".join(response.streaming_content), b"one\ntwo\n")
+        self.assertEqual(self.requests("test_stream"), before + 1)
+        # Stage timers inside the stream land on the request's trace
+        self.assertIn("test_stage", traces[0].stages)
+
+    def test_abandoned_stream_is_counted_once(self):
+        @instrumented("test_abandoned")
+        def view(request):
+            return StreamingHttpResponse(iter([b"one", b"two"]))
+
+        before = self.requests("test_abandoned")
+        response = view(RequestFactory().get("/"))
+        next(iter(response.streaming_content))
+        # The server closes the response when the client goes away
+        response.close()
+        self.assertEqual(self.requests("test_abandoned"), before + 1)
+
+    def test_plain_response_is_counted_right_away(self):
+        @instrumented("test_plain")
+        def view(request):
+            return JsonResponse({}, status=400)
+
+        before = self.requests("test_plain")
+        view(RequestFactory().get("/"))
+        self.assertEqual(self.requests("test_plain"), before + 1)
+
+
+class MultiprocessMetricsTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # No periodic flush during the test; snapshots are written explicitly
+        self.registry = MetricsRegistry(directory.name, flush_interval=3600)
+        self.requests = self.registry.counter("requests_total", "Requests", ("status",))
+        self.latency = self.registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+
+    def fork_worker(self, requests, latency):
+        """Run a forked worker that records metrics, writes its snapshot and exits"""
+        pid = os.fork()
+        if pid == 0:
+            try:
+                for _ in range(requests):
+                    self.requests.inc(status=200)
+                self.latency.observe(latency)
+                self.registry.write_snapshot()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        return pid
+
+    def test_render_sums_all_workers(self):
+        self.requests.inc(status=200)
+        self.fork_worker(requests=2, latency=0.5)
+        self.fork_worker(requests=4, latency=5)
+
+        text = self.registry.render()
+        # Inherited counts are not counted again by the children
+        self.assertEqual(sample(text, "requests_total"), ['requests_total{status="200"} 7'])
+        self.assertIn('latency_seconds_bucket{le="1"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 2', text)
+
+    def test_exited_worker_stays_in_the_totals(self):
+        first = self.fork_worker(requests=2, latency=0.5)
+        second = self.fork_worker(requests=3, latency=0.5)
+        self.registry.mark_process_dead(first)
+        self.registry.mark_process_dead(second)
+
+        files = sorted(os.listdir(self.registry.directory))
+        self.assertNotIn(f"metrics-{first}.json", files)
+        self.assertIn("metrics-archive.json", files)
+        self.assertEqual(sample(self.registry.render(), "requests_total"), ['requests_total{status="200"} 5'])
+
+    def test_reset_directory(self):
+        self.fork_worker(requests=2, latency=0.5)
+        self.registry.reset_directory()
+        self.assertEqual(sample(self.registry.render(), "requests_total"), [])
@@ -0,0 +1,72 @@
+import time
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from ner_app.model_client import CircuitBreaker, CircuitOpenError, CustomModelClient
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        for _ in range(2):
+            breaker.before_call()
+            breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_success_resets_the_failure_count(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.before_call()
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_success()
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_half_open_admits_one_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.before_call()
+        breaker.record_failure()
+
+        breaker.before_call()
+        self.assertEqual(breaker.state, "half-open")
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        breaker.before_call()
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=0.05)
+        breaker.state, breaker.opened_at = "open", time.monotonic() - 1
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+
+@override_settings(CUSTOM_MODEL_BREAKER_THRESHOLD=1, CUSTOM_MODEL_BREAKER_RESET=0)
+class CustomModelClientBreakerTests(SimpleTestCase):
+
+    def test_unexpected_error_ends_the_half_open_trial(self):
+        client = CustomModelClient()
+        response = mock.Mock(json=lambda: {"response": {}})
+        side_effects = [
+            requests.exceptions.ConnectionError(),  # opens the circuit
+            requests.exceptions.ChunkedEncodingError(),  # half-open trial
+            response,  # next trial succeeds
+        ]
+        with mock.patch.object(client, "_post_with_retries", side_effect=side_effects):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                client.query("claim")
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                client.query("claim")
+            self.assertFalse(client.breaker._trial_in_flight)
+            self.assertEqual(client.query("claim"), {"response": {}})
+        self.assertEqual(client.breaker.state, "closed")
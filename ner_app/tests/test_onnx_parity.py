@@ -0,0 +1,58 @@
+import importlib.util
+import os
+import unittest
+
+import numpy as np
+from django.test import SimpleTestCase
+
+# Parity between the PyTorch and ONNX Runtime backends. Downloads and
+# exports all three models, so it only runs when asked for:
+#   RUN_ONNX_PARITY=1 django-admin test ner_app --settings=ner_project.settings
+RUN_ONNX_PARITY = os.getenv("RUN_ONNX_PARITY") == "1" and importlib.util.find_spec("optimum") is not None
+
+PARITY_TEXTS = [
+    "Barack Obama met Angela Merkel in Berlin on Tuesday.",
+    "El presidente Pedro Sánchez visitó Buenos Aires con representantes de la ONU.",
+    "Emmanuel Macron a annoncé une nouvelle réforme à Paris.",
+    "I absolutely love how fast this vaccine was approved!",
+]
+
+# Dynamic int8 quantization shifts scores slightly; labels must not change
+SCORE_TOLERANCE = 0.05
+EMBEDDING_MIN_COSINE = 0.98
+
+
+@unittest.skipUnless(RUN_ONNX_PARITY, "set RUN_ONNX_PARITY=1 with optimum[onnxruntime] installed")
+class OnnxBackendParityTests(SimpleTestCase):
+
+    def test_ner_parity(self):
+        from ner_app.ner_module import _load_ner_pipeline
+
+        torch_results = _load_ner_pipeline("pytorch")(PARITY_TEXTS)
+        onnx_results = _load_ner_pipeline("onnx")(PARITY_TEXTS)
+        for expected, actual in zip(torch_results, onnx_results):
+            self.assertEqual(
+                [(e["word"], e["entity_group"]) for e in expected],
+                [(e["word"], e["entity_group"]) for e in actual],
+            )
+            for e, a in zip(expected, actual):
+                self.assertAlmostEqual(e["score"], a["score"], delta=SCORE_TOLERANCE)
+
+    def test_sentiment_parity(self):
+        from ner_app.semantic_module import _load_semantic_pipeline
+
+        torch_results = _load_semantic_pipeline("pytorch")(PARITY_TEXTS)
+        onnx_results = _load_semantic_pipeline("onnx")(PARITY_TEXTS)
+        for expected, actual in zip(torch_results, onnx_results):
+            self.assertEqual(expected["label"], actual["label"])
+            self.assertAlmostEqual(expected["score"], actual["score"], delta=SCORE_TOLERANCE)
+
+    def test_embedding_parity(self):
+        from ner_app.similarity_module import _load_sentence_model
+
+        expected = _load_sentence_model("pytorch").encode(PARITY_TEXTS)
+        actual = _load_sentence_model("onnx").encode(PARITY_TEXTS)
+        cosines = np.sum(expected * actual, axis=1) / (
+            np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+        )
+        self.assertTrue(np.all(cosines >= EMBEDDING_MIN_COSINE), cosines)
@@ -0,0 +1,76 @@
+import random
+
+from django.test import SimpleTestCase, override_settings
+
+from ner_app.prefilter import junk_reason, prefilter
+
+# langdetect misreads these as da / id / fr / pt with probability 1.0
+SHORT_ENGLISH_HEADLINES = [
+    "Biden signs bill",
+    "Obama born in Kenya",
+    "Apple unveils iPhone",
+    "Man bites dog in Ohio",
+    "Pope Francis endorses Trump for president",
+]
+
+
+def zipf_document(words=5000, vocabulary=300, seed=0):
+    """Long text whose vocabulary is reused like a real document's"""
+    rng = random.Random(seed)
+    vocab = [f"word{i}" for i in range(vocabulary)]
+    weights = [1 / (rank + 1) for rank in range(vocabulary)]
+    return " ".join(rng.choices(vocab, weights, k=words))
+
+
+@override_settings(
+    PREFILTER_MIN_LETTERS=3,
+    PREFILTER_MIN_LETTER_RATIO=0.3,
+    PREFILTER_MIN_LANGUAGE_CONFIDENCE=0.8,
+    PREFILTER_MIN_ROUTING_LETTERS=50,
+)
+class PrefilterRoutingTests(SimpleTestCase):
+
+    def test_short_english_headlines_run_every_stage(self):
+        for headline in SHORT_ENGLISH_HEADLINES:
+            with self.subTest(headline=headline):
+                _, decision = prefilter(headline)
+                self.assertEqual(decision["action"], "analyze")
+                self.assertEqual(decision["skipped"], [])
+
+    def test_long_english_text_runs_every_stage(self):
+        _, decision = prefilter(
+            "Pope Francis shocks the world and endorses Donald Trump for president, "
+            "according to a statement released by the Vatican on Sunday."
+        )
+        self.assertEqual(decision["language"], "en")
+        self.assertEqual(decision["skipped"], [])
+
+    def test_long_unsupported_language_skips_local_models(self):
+        _, decision = prefilter(
+            "Selama beberapa minggu terakhir, pemerintah daerah telah mengumumkan "
+            "bahwa vaksin baru akan didistribusikan ke seluruh rumah sakit di provinsi."
+        )
+        self.assertEqual(decision["language"], "id")
+        self.assertEqual(decision["skipped"], ["entities", "sentiment"])
+
+
+@override_settings(PREFILTER_MIN_LETTERS=3, PREFILTER_MIN_LETTER_RATIO=0.3)
+class JunkReasonTests(SimpleTestCase):
+
+    def test_long_document_is_not_repetitive(self):
+        # ~6% distinct tokens overall, but varied within any 50-token window
+        self.assertIsNone(junk_reason(zipf_document()))
+
+    def test_repeated_phrase_is_repetitive(self):
+        self.assertEqual(junk_reason("buy now cheap pills " * 40), "repetitive")
+        self.assertEqual(junk_reason("buy now cheap pills " * 400), "repetitive")
+
+    def test_keyboard_mashing_is_repetitive(self):
+        self.assertEqual(junk_reason("aaaaaaaaaaaaaaaaaaaaaaaa"), "repetitive")
+
+    def test_short_and_non_linguistic_input(self):
+        self.assertEqual(junk_reason("ok"), "too_short")
+        self.assertEqual(junk_reason("12345 67890 !!! abc 2024-01-01"), "non_linguistic")
+
+    def test_headline_is_not_junk(self):
+        self.assertIsNone(junk_reason("Biden signs bill"))
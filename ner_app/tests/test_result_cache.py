@@ -0,0 +1,88 @@
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from ner_app.result_cache import ResultCache
+
+TTLS = {"entities": 60, "sentiment": 60, "verdict": 60}
+
+SHARED_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "default"},
+    "results": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "results"},
+}
+
+
+@override_settings(RESULT_CACHE_ENABLED=True)
+class ResultCacheTests(SimpleTestCase):
+
+    def test_hit_returns_a_copy(self):
+        cache = ResultCache(max_entries=10, ttls=TTLS)
+        cache.set("verdict", "Claim", {"verdict": "VERIFIED"})
+        cache.get("verdict", "Claim")["verdict"] = "changed"
+        self.assertEqual(cache.get("verdict", "Claim"), {"verdict": "VERIFIED"})
+
+    def test_cased_kinds_keep_case(self):
+        cache = ResultCache(max_entries=10, ttls=TTLS)
+        entities = [{"text": "Apple", "label": "ORG"}]
+        cache.set("entities", "Apple unveils iPhone", entities)
+        cache.set("verdict", "Apple unveils iPhone", {"verdict": "VERIFIED"})
+
+        self.assertIsNone(cache.get("entities", "apple unveils iphone"))
+        self.assertEqual(cache.get("entities", "Apple  unveils iPhone "), entities)
+        # Verdicts are shared across case and whitespace variants
+        self.assertEqual(cache.get("verdict", "apple unveils iphone"), {"verdict": "VERIFIED"})
+
+    def test_expired_entry_is_a_miss(self):
+        cache = ResultCache(max_entries=10, ttls={**TTLS, "verdict": 0})
+        cache.set("verdict", "Claim", {"verdict": "VERIFIED"})
+        self.assertIsNone(cache.get("verdict", "Claim"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ResultCache(max_entries=2, ttls=TTLS)
+        cache.set("verdict", "one", 1)
+        cache.set("verdict", "two", 2)
+        cache.get("verdict", "one")
+        cache.set("verdict", "three", 3)
+        self.assertEqual(cache.get("verdict", "one"), 1)
+        self.assertIsNone(cache.get("verdict", "two"))
+        self.assertEqual(cache.stats()["counters"]["evictions"], 1)
+
+    def test_invalidate_drops_every_kind(self):
+        cache = ResultCache(max_entries=10, ttls=TTLS)
+        for kind in ("entities", "sentiment", "verdict"):
+            cache.set(kind, "Claim", kind)
+        self.assertEqual(cache.invalidate("Claim"), 3)
+        for kind in ("entities", "sentiment", "verdict"):
+            self.assertIsNone(cache.get(kind, "Claim"))
+        # Results stored after the invalidation are served again
+        cache.set("verdict", "Claim", "fresh")
+        self.assertEqual(cache.get("verdict", "Claim"), "fresh")
+
+
+@override_settings(RESULT_CACHE_ENABLED=True, CACHES=SHARED_CACHES)
+class SharedResultCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        caches["results"].clear()
+        # Two workers: separate local tiers, one shared backend
+        self.worker_a = ResultCache(max_entries=10, ttls=TTLS, backend_alias="results")
+        self.worker_b = ResultCache(max_entries=10, ttls=TTLS, backend_alias="results")
+
+    def test_shared_hit_fills_the_local_tier(self):
+        self.worker_a.set("verdict", "Claim", "verdict")
+        self.assertEqual(self.worker_b.get("verdict", "Claim"), "verdict")
+        self.assertEqual(self.worker_b.stats()["counters"]["verdict_shared_hits"], 1)
+        self.worker_b.get("verdict", "Claim")
+        self.assertEqual(self.worker_b.stats()["counters"]["verdict_hits"], 1)
+
+    def test_invalidation_reaches_other_workers_local_entries(self):
+        self.worker_a.set("verdict", "Claim", "stale")
+        self.assertEqual(self.worker_b.get("verdict", "Claim"), "stale")
+
+        self.worker_a.invalidate("Claim")
+        self.assertIsNone(self.worker_b.get("verdict", "Claim"))
+        self.assertIsNone(self.worker_a.get("verdict", "Claim"))
+
+    def test_shared_hit_returns_a_copy(self):
+        self.worker_a.set("verdict", "Claim", {"verdict": "VERIFIED"})
+        self.worker_b.get("verdict", "Claim")["reused_from"] = {"id": 1}
+        self.assertEqual(self.worker_b.get("verdict", "Claim"), {"verdict": "VERIFIED"})
@@ -0,0 +1,106 @@
+import json
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from ner_app.schemas import dumps, json_response, parse_model_response
+
+
+class ParseModelResponseTests(SimpleTestCase):
+
+    def test_nested_response(self):
+        result = parse_model_response({"response": {
+            "verdict": "VERIFIED",
+            "credibility": 4,
+            "summary": "Confirmed by officials",
+            "reasoning": "Two sources",
+            "url_references": ["https://example.org/a"],
+        }})
+        self.assertTrue(result.success)
+        self.assertEqual(result.verdict, "VERIFIED")
+        self.assertEqual(result.credibility, "High (4.0/5)")
+        self.assertEqual(result.confidence, 80.0)
+        self.assertIs(result.is_fake, False)
+        self.assertEqual(result.sources, ["https://example.org/a"])
+
+    def test_nested_response_with_malformed_fields(self):
+        result = parse_model_response({"response": {
+            "verdict": None,
+            "credibility": "high",
+            "summary": 12,
+            "url_references": "https://example.org/a",
+            "unexpected": {"ignored": True},
+        }})
+        self.assertEqual(result.verdict, "")
+        self.assertEqual(result.credibility, "Unknown (0.0/5)")
+        self.assertEqual(result.confidence, 0.0)
+        self.assertEqual(result.summary, "12")
+        self.assertEqual(result.sources, ["https://example.org/a"])
+        self.assertIs(result.is_fake, True)
+
+    def test_nested_response_with_missing_fields(self):
+        result = parse_model_response({"response": {}})
+        self.assertEqual(result.verdict, "Undetermined")
+        self.assertEqual(result.sources, [])
+        self.assertIs(result.is_fake, True)
+
+    def test_non_finite_credibility(self):
+        for value in ("nan", "inf", float("-inf")):
+            result = parse_model_response({"response": {"verdict": "VERIFIED", "credibility": value}})
+            self.assertEqual(result.credibility, "Unknown (0.0/5)")
+            self.assertEqual(result.confidence, 0.0)
+
+    def test_direct_response_aliases(self):
+        result = parse_model_response({
+            "label": "FALSE",
+            "confidence_level": "low",
+            "explanation": "Fabricated quote",
+            "references": ["https://example.org/b"],
+            "score": "0.25",
+        })
+        self.assertEqual(result.verdict, "FALSE")
+        self.assertEqual(result.credibility, "low")
+        self.assertEqual(result.summary, "Fabricated quote")
+        self.assertEqual(result.sources, ["https://example.org/b"])
+        self.assertEqual(result.confidence, 0.25)
+        self.assertIsNone(result.is_fake)
+
+    def test_plain_text_response(self):
+        text = "x" * 600
+        result = parse_model_response({"response": text})
+        self.assertEqual(result.verdict, "Unknown")
+        self.assertEqual(result.summary, text[:500])
+        self.assertEqual(result.reasoning, text)
+
+    def test_non_dict_response(self):
+        result = parse_model_response("The claim is unsupported")
+        self.assertEqual(result.verdict, "Analysis Complete")
+        self.assertEqual(result.summary, "The claim is unsupported")
+        self.assertEqual(parse_model_response(None).summary, "No summary available")
+        self.assertEqual(parse_model_response(["a"]).raw_response, ["a"])
+
+    def test_as_dict_leaves_out_unset_fields(self):
+        data = parse_model_response({"verdict": "TRUE"}).as_dict()
+        self.assertNotIn("is_fake", data)
+        self.assertNotIn("error", data)
+        self.assertEqual(data["raw_response"], {"verdict": "TRUE"})
+
+
+class DumpsTests(SimpleTestCase):
+
+    def test_numpy_values(self):
+        data = {"score": np.float32(0.5), "ids": np.arange(3), "label": "fake"}
+        self.assertEqual(json.loads(dumps(data)), {"score": 0.5, "ids": [0, 1, 2], "label": "fake"})
+
+    def test_non_ascii_is_kept(self):
+        self.assertEqual(dumps({"headline": "新冠疫苗"}), '{"headline":"新冠疫苗"}'.encode())
+
+    def test_unknown_type_raises(self):
+        with self.assertRaises(Exception):
+            dumps({"value": object()})
+
+    def test_json_response(self):
+        response = json_response({"ok": True}, status=202)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(json.loads(response.content), {"ok": True})
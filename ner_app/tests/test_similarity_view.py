@@ -0,0 +1,60 @@
+import json
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from ner_app import views
+
+
+def fake_similarity_matrix(left, right=None):
+    right = left if right is None else right
+    # Texts are numbers; closer numbers are more similar
+    a = np.array([float(t) for t in left])[:, None]
+    b = np.array([float(t) for t in right])[None, :]
+    return 1.0 / (1.0 + np.abs(a - b))
+
+
+@override_settings(SIMILARITY_MAX_TEXTS=10, SIMILARITY_MAX_CELLS=4)
+class SimilarityViewTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(views, "similarity_matrix", side_effect=fake_similarity_matrix)
+        self.similarity_matrix = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, body):
+        return self.client.post("/similarity/", json.dumps(body), content_type="application/json")
+
+    def test_non_object_body_is_a_bad_request(self):
+        for body in ([1, 2], "text", 3, None):
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body).status_code, 400)
+
+    def test_small_matrix(self):
+        response = self.post({"left": ["1", "2"], "right": ["1", "3"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["matrix"]), 2)
+
+    def test_large_matrix_needs_a_threshold(self):
+        body = {"left": ["1", "2", "3"], "right": ["1", "2"]}
+        self.assertEqual(self.post(body).status_code, 400)
+        self.similarity_matrix.assert_not_called()
+
+        response = self.post({**body, "threshold": 0.4})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["pairs"][0]["score"], 1.0)
+
+    def test_pairs_are_capped_best_first(self):
+        response = self.post({"left": ["1", "2", "3"], "right": ["1", "2", "4"], "threshold": 0})
+        data = response.json()
+        self.assertTrue(data["truncated"])
+        self.assertEqual(len(data["pairs"]), 4)
+        scores = [pair["score"] for pair in data["pairs"]]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(scores[:2], [1.0, 1.0])
+
+    def test_query_mode_is_not_capped(self):
+        response = self.post({"query": "1", "candidates": ["1", "2", "3", "4", "5", "6"], "top_k": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["index"] for r in response.json()["results"]], [0, 1])
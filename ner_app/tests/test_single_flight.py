@@ -0,0 +1,130 @@
+import threading
+import time
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from ner_app.single_flight import SingleFlight
+
+SHARED_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "default"},
+    "flight": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "flight"},
+}
+
+
+def run_concurrently(flight, key, func, callers):
+    results = [None] * callers
+    errors = [None] * callers
+
+    def call(i):
+        try:
+            results[i] = flight.do(key, func)
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+@override_settings(SINGLE_FLIGHT_CACHE_ALIAS="")
+class SingleFlightTests(SimpleTestCase):
+
+    def blocking_func(self, result=None, error=None):
+        """func that runs until release is set, counting its calls"""
+        self.calls = 0
+        self.release = threading.Event()
+
+        def func():
+            self.calls += 1
+            self.release.wait(5)
+            if error is not None:
+                raise error
+            return result
+        return func
+
+    def wait_for_followers(self, flight, n):
+        deadline = time.monotonic() + 5
+        while flight.stats()["counters"].get("followers", 0) < n and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def test_concurrent_calls_share_one_computation(self):
+        flight = SingleFlight("test")
+        threads, results, errors = run_concurrently(flight, "claim", self.blocking_func({"verdict": "FAKE"}), 5)
+        self.wait_for_followers(flight, 4)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [{"verdict": "FAKE"}] * 5)
+        self.assertEqual(errors, [None] * 5)
+        self.assertEqual(flight.stats()["counters"], {"leaders": 1, "followers": 4})
+        self.assertEqual(flight.stats()["in_flight"], 0)
+
+    def test_followers_receive_the_exception(self):
+        flight = SingleFlight("test")
+        threads, results, errors = run_concurrently(
+            flight, "claim", self.blocking_func(error=RuntimeError("model down")), 3
+        )
+        self.wait_for_followers(flight, 2)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(isinstance(e, RuntimeError) for e in errors))
+
+    def test_later_calls_and_other_keys_run_again(self):
+        flight = SingleFlight("test")
+        calls = []
+        flight.do("a", lambda: calls.append("a"))
+        flight.do("a", lambda: calls.append("a"))
+        flight.do("b", lambda: calls.append("b"))
+        self.assertEqual(calls, ["a", "a", "b"])
+
+
+@override_settings(
+    CACHES=SHARED_CACHES,
+    SINGLE_FLIGHT_CACHE_ALIAS="flight",
+    SINGLE_FLIGHT_WAIT=1,
+    SINGLE_FLIGHT_POLL_INTERVAL=0.01,
+    SINGLE_FLIGHT_RESULT_TTL=60,
+)
+class SharedSingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = caches["flight"]
+        self.cache.clear()
+        self.lock_key = "factguard:flight:test:claim:lock"
+        self.result_key = "factguard:flight:test:claim:result"
+
+    def test_leader_publishes_the_result(self):
+        flight = SingleFlight("test")
+        self.assertEqual(flight.do("claim", lambda: "verdict"), "verdict")
+        self.assertEqual(self.cache.get(self.result_key), ("verdict",))
+        self.assertIsNone(self.cache.get(self.lock_key))
+
+    def test_follower_in_another_worker_waits_for_the_result(self):
+        # Another worker holds the lock and publishes its result a bit later
+        self.cache.add(self.lock_key, "other-worker", timeout=60)
+
+        def other_worker():
+            time.sleep(0.1)
+            self.cache.set(self.result_key, (None,), timeout=60)
+            self.cache.delete(self.lock_key)
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        flight = SingleFlight("test")
+        # A None result is passed on too
+        self.assertIsNone(flight.do("claim", lambda: self.fail("computed twice")))
+        thread.join()
+        self.assertEqual(flight.stats()["counters"]["remote_followers"], 1)
+
+    def test_follower_computes_when_the_leader_never_finishes(self):
+        self.cache.add(self.lock_key, "crashed-worker", timeout=60)
+        flight = SingleFlight("test")
+        self.assertEqual(flight.do("claim", lambda: "local"), "local")
+        self.assertEqual(flight.stats()["counters"]["remote_wait_timeouts"], 1)
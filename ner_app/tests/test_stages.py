@@ -0,0 +1,70 @@
+import threading
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from ner_app import stages
+from ner_app.stages import iter_stages, run_stages
+
+
+def sleeper(seconds, value):
+    def stage():
+        time.sleep(seconds)
+        return value
+    return stage
+
+
+@override_settings(ANALYZE_CONCURRENT=True, ANALYZE_MAX_WORKERS=1, ANALYZE_REMOTE_MAX_WORKERS=1)
+class IterStagesTests(SimpleTestCase):
+
+    def setUp(self):
+        # Fresh single-thread pools sized by the settings above
+        stages._executors.clear()
+        self.addCleanup(stages._executors.clear)
+
+    def test_results_in_completion_order(self):
+        results = list(iter_stages(
+            {"slow": sleeper(0.2, "slow"), "fast": sleeper(0, "fast")},
+            pools={"slow": "remote"},
+        ))
+        self.assertEqual(results, [("fast", "fast"), ("slow", "slow")])
+
+    def test_timeout_yields_the_fallback(self):
+        results = run_stages(
+            {"remote": sleeper(1, "late")},
+            timeouts={"remote": 0.1},
+            fallbacks={"remote": lambda: "fallback"},
+            pools={"remote": "remote"},
+        )
+        self.assertEqual(results, {"remote": "fallback"})
+
+    def test_queued_stage_is_not_timed_out_before_it_runs(self):
+        # Another request holds the only local thread for longer than this
+        # request's timeout; the stage still runs once the thread is free
+        busy = threading.Thread(target=lambda: run_stages({"other": sleeper(0.3, None)}))
+        busy.start()
+        time.sleep(0.05)
+        results = run_stages({"entities": sleeper(0, ["entity"])}, timeouts={"entities": 0.2})
+        busy.join()
+        self.assertEqual(results, {"entities": ["entity"]})
+
+    def test_slow_remote_stage_does_not_block_local_stages(self):
+        started = time.monotonic()
+        results = iter_stages(
+            {"customModel": sleeper(0.5, "verdict"), "entities": sleeper(0, ["entity"])},
+            pools={"customModel": "remote"},
+        )
+        self.assertEqual(next(results), ("entities", ["entity"]))
+        self.assertLess(time.monotonic() - started, 0.3)
+        self.assertEqual(next(results), ("customModel", "verdict"))
+
+    def test_heartbeat_while_waiting(self):
+        results = list(iter_stages({"slow": sleeper(0.35, "done")}, heartbeat=0.1))
+        self.assertEqual(results[-1], ("slow", "done"))
+        self.assertGreaterEqual(results.count((None, None)), 2)
+
+    def test_stage_exception_propagates(self):
+        def fail():
+            raise ValueError("boom")
+        with self.assertRaises(ValueError):
+            run_stages({"entities": fail})
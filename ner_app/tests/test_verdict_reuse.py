@@ -0,0 +1,77 @@
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+import numpy as np
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ner_app import analysis
+from ner_app.embedding_index import EmbeddingIndex
+from ner_app.models import QueryHistory
+from ner_app.result_cache import ResultCache
+
+VECTOR = np.array([1.0, 0.0, 0.0, 0.0], dtype=np.float32)
+TTLS = {"entities": 60, "sentiment": 60, "verdict": 60}
+
+
+@override_settings(
+    VERDICT_REUSE_THRESHOLD=0.95,
+    VERDICT_REUSE_MAX_AGE=3600,
+    EMBEDDING_INDEX_ENABLED=True,
+    ENTITY_INDEX_ENABLED=False,
+    HISTORY_WRITE_BEHIND=False,
+    RESULT_CACHE_ENABLED=True,
+)
+class VerdictReuseTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.index = EmbeddingIndex(directory.name)
+        self.cache = ResultCache(max_entries=10, ttls=TTLS)
+        for target, value in (("embedding_index", self.index), ("result_cache", self.cache)):
+            patcher = mock.patch.object(analysis, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def checked_claim(self, text="Vaccine approved", age=0, result=None):
+        claim = QueryHistory.objects.create(
+            headline=text,
+            text_hash=analysis.text_hash(text),
+            gemini_result=result or {"success": True, "verdict": "VERIFIED"},
+            created_at=timezone.now() - timedelta(seconds=age),
+        )
+        self.index.add(claim.id, VECTOR)
+        return claim
+
+    def test_recent_claim_is_reused(self):
+        claim = self.checked_claim()
+        result = analysis.find_prior_verdict(VECTOR)
+        self.assertEqual(result["verdict"], "VERIFIED")
+        self.assertEqual(result["reused_from"]["id"], claim.id)
+
+    def test_claim_older_than_max_age_is_not_reused(self):
+        self.checked_claim(age=7200)
+        self.assertIsNone(analysis.find_prior_verdict(VECTOR))
+
+    def test_newer_candidate_is_used_when_the_closest_is_too_old(self):
+        self.checked_claim(age=7200)
+        recent = self.checked_claim(age=60)
+        self.assertEqual(analysis.find_prior_verdict(VECTOR)["reused_from"]["id"], recent.id)
+
+    def test_invalidated_claim_is_not_reused(self):
+        self.checked_claim("Vaccine approved")
+        self.cache.invalidate("vaccine  APPROVED")
+        self.assertIsNone(analysis.find_prior_verdict(VECTOR))
+
+    def test_reused_row_is_not_a_source(self):
+        self.checked_claim(result={"success": True, "verdict": "VERIFIED", "reused_from": {"id": 1}})
+        self.assertIsNone(analysis.find_prior_verdict(VECTOR))
+
+    def test_reused_verdict_is_saved_but_not_indexed(self):
+        self.checked_claim()
+        result = analysis.find_prior_verdict(VECTOR)
+        saved = analysis.save_analysis("Vaccine was approved", result, VECTOR)
+        self.assertIsNotNone(saved.id)
+        self.assertEqual(len(self.index), 1)
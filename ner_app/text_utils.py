@@ -0,0 +1,33 @@
+# ner_app/text_utils.py
+import hashlib
+import re
+import unicodedata
+
+_whitespace = re.compile(r"\s+")
+
+
+def clean_text(text):
+    """
+    Text as handed to the models: NFKC-normalized with runs of whitespace
+    collapsed. Case is kept (the NER model is cased).
+    """
+    text = unicodedata.normalize("NFKC", text or "")
+    return _whitespace.sub(" ", text).strip()
+
+
+def normalize_text(text):
+    """
+    Canonical form of a claim used for cache keys and deduplication:
+    clean_text, case-folded.
+    """
+    return clean_text(text).casefold()
+
+
+def text_hash(text):
+    """SHA-256 hex digest of the normalized text"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def cased_text_hash(text):
+    """SHA-256 hex digest of clean_text (for results of the cased models)"""
+    return hashlib.sha256(clean_text(text).encode("utf-8")).hexdigest()
@@ -1,7 +1,21 @@
 # ner_app/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import home, analyze_view, QueryHistoryViewSet
+from .views import (
+    home,
+    analyze_view,
+    analyze_batch_view,
+    analyze_stream_view,
+    job_view,
+    similar_claims_view,
+    entity_claims_view,
+    top_entities_view,
+    similarity_view,
+    pipeline_stats,
+    metrics_view,
+    invalidate_cache_view,
+    QueryHistoryViewSet,
+)
 
 # Register DRF router for history API
 router = DefaultRouter()
@@ -10,6 +24,16 @@ router.register(r'history', QueryHistoryViewSet)
 urlpatterns = [
     path("", home),                # Home
     path("analyze/", analyze_view), # Analyze API
+    path("analyze/batch/", analyze_batch_view), # Bulk analyze (NDJSON stream)
+    path("analyze/stream/", analyze_stream_view), # Analyze, streamed per stage (SSE / NDJSON)
+    path("jobs/<uuid:job_id>/", job_view), # Async analysis job status
+    path("similar/", similar_claims_view), # Near-duplicate claim lookup
+    path("entities/claims/", entity_claims_view), # Claims mentioning an entity
+    path("entities/top/", top_entities_view), # Top entities by verdict / time window
+    path("similarity/", similarity_view), # 1 x N / N x M similarity
+    path("stats/", pipeline_stats), # Pipeline stats
+    path("metrics/", metrics_view), # Prometheus metrics
+    path("cache/invalidate/", invalidate_cache_view), # Result cache invalidation
     path("", include(router.urls)), # History API (via router)
 ]
 
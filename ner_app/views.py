@@ -1,288 +1,638 @@
 # ner_app/views.py
-from django.http import JsonResponse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-import json, os, requests
-from rest_framework import viewsets, filters
-from .models import QueryHistory
-from .serializers import QueryHistorySerializer
-from .ner_module import get_named_entities
-from .semantic_module import analyze_semantics
-from .similarity_module import calculate_similarity
-from .fake_news_module import classify_fake_news
-
-# Custom Model API Configuration
-CUSTOM_MODEL_URL = os.getenv(
-    "CUSTOM_MODEL_URL",
-    "http://PRIVATE_MODEL_SERVER/query"
+import json
+import logging
+import numpy as np
+from rest_framework import viewsets
+from .models import AnalysisJob, QueryHistory
+from .serializers import QueryHistorySerializer, requested_fields
+from .pagination import HistoryCursorPagination
+from .filters import HeadlineSearchFilter
+from .ner_module import get_named_entities_batch
+from .semantic_module import analyze_semantics_batch
+from .similarity_module import (
+    calculate_similarity_batch,
+    encode_texts,
+    similarity_matrix,
+    similarity_result,
 )
-CUSTOM_MODEL_API_KEY = os.getenv("CUSTOM_MODEL_API_KEY")
+from .batching import batching_stats
+from .result_cache import result_cache
+from .model_registry import registry
+from .embedding_index import embedding_index
+from .embedding_cache import embedding_cache
+from .entity_index import VERDICT_CLASSES, claims_mentioning, index_claims, top_entities, verdict_class
+from .history_writer import history_writer
+from .inference_server import inference_client
+from .model_client import call_custom_model, custom_model_error, model_client
+from .prefilter import prefilter
+from .schemas import dumps, json_response
+from .jobs import enqueue_job, job_payload, validate_callback_url, validate_priority
+from . import resources
+from .metrics import current_trace, instrumented, metrics, timed
+from .analysis import (
+    analysis_flight,
+    analyze_claim_shared,
+    build_history_record,
+    find_prior_verdict,
+    iter_analysis,
+    save_analysis,
+)
+
+logger = logging.getLogger(__name__)
+
 # Home
 @csrf_exempt
 def home(request):
     return JsonResponse({"message": "FactGuard API is running!"})
 
 
-# Custom Model Fact Check
-def call_custom_model(query_text: str):
-    """
-    Call your custom fact-checking model API
-    """
+# Analyze
+@csrf_exempt
+@instrumented("analyze")
+def analyze_view(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST allowed"}, status=405)
+
     try:
-        payload = json.dumps({"query": query_text})
-        headers = {
-            "Content-Type": "application/json",
-            "X-API-Key": CUSTOM_MODEL_API_KEY,
-        }
+        data = json.loads(request.body)
+        text = data.get("text", "").strip()
+        text2 = data.get("text2", "").strip()
+
+        if not text:
+            return JsonResponse({"error": "No text provided"}, status=400)
 
-        response = requests.post(
-            CUSTOM_MODEL_URL,
-            headers=headers,
-            data=payload,
-            timeout=300,  # Increased timeout for Ollama
+        # Junk input never reaches the models; unsupported languages skip
+        # the local models that were not trained on them
+        decision = None
+        if settings.PREFILTER_ENABLED:
+            with timed("prefilter"):
+                text, decision = prefilter(text)
+            if decision["action"] == "short_circuit":
+                return prefilter_response(decision)
+
+        # Async mode: queue the claim for run_analysis_worker and return
+        # the job right away
+        if data.get("async") or request.GET.get("async") == "1":
+            return enqueue_analysis(data, text, text2, decision)
+
+        response, embedding = analyze_claim_shared(
+            text, text2, skip=decision["skipped"] if decision else ()
         )
-        response.raise_for_status()
-
-        # Get raw response
-        raw_data = response.json()
-        print("Raw API Response:", json.dumps(raw_data, indent=2))  # Debug log
-
-        # Helper function to safely get string value
-        def safe_str(value, max_length=None):
-            if value is None:
-                return ""
-            if not isinstance(value, str):
-                value = str(value)
-            if max_length and len(value) > max_length:
-                return value[:max_length]
-            return value
-
-        # Helper function to safely get numeric value
-        def safe_num(value, default=0):
-            if value is None:
-                return default
-            try:
-                return float(value)
-            except (ValueError, TypeError):
-                return default
-
-        # Parse the response - adjust based on your actual API structure
-        if isinstance(raw_data, dict):
-            # Check if response is nested inside 'response' key (your actual format)
-            if "response" in raw_data and isinstance(raw_data["response"], dict):
-                nested = raw_data["response"]
-
-                # Extract is_fake and convert to verdict
-                # is_fake = nested.get("is_fake", False)
-                verdict = nested.get("verdict", "Undetermined")
-                is_fake = True if verdict.upper() != "VERIFIED" else False
-
-                # Map credibility number to text
-                credibility_num = safe_num(nested.get("credibility"), 0)
-                credibility_map = {
-                    5: "Very High",
-                    4: "High",
-                    3: "Medium",
-                    2: "Low",
-                    1: "Very Low",
-                    0: "Unknown",
-                }
-                credibility_text = credibility_map.get(int(credibility_num), "Unknown")
-
-                result = {
-                    "success": True,
-                    "verdict": verdict,
-                    "credibility": f"{credibility_text} ({credibility_num}/5)",
-                    "summary": safe_str(nested.get("summary", "")),
-                    "reasoning": safe_str(nested.get("reasoning", "")),
-                    "sources": nested.get("url_references", []),
-                    "confidence": credibility_num
-                    * 20,  # Convert 0-5 to 0-100 percentage
-                    "is_fake": is_fake,
-                    "raw_response": raw_data,
-                }
-                return result
-
-            # Direct response (fallback)
-            result = {
-                "success": True,
-                "verdict": safe_str(
-                    raw_data.get("verdict")
-                    or raw_data.get("label")
-                    or raw_data.get("prediction")
-                    or "Unknown"
-                ),
-                "credibility": safe_str(
-                    raw_data.get("credibility")
-                    or raw_data.get("confidence_level")
-                    or "Unknown"
-                ),
-                "summary": safe_str(
-                    raw_data.get("summary")
-                    or raw_data.get("analysis")
-                    or raw_data.get("explanation")
-                    or ""
-                ),
-                "reasoning": safe_str(
-                    raw_data.get("reasoning")
-                    or raw_data.get("rationale")
-                    or raw_data.get("details")
-                    or ""
-                ),
-                "sources": raw_data.get("sources")
-                or raw_data.get("references")
-                or raw_data.get("links")
-                or [],
-                "confidence": safe_num(
-                    raw_data.get("confidence")
-                    or raw_data.get("score")
-                    or raw_data.get("confidence_score"),
-                    0,
-                ),
-                "raw_response": raw_data,
-            }
-
-            # If there's a direct text response (common with Ollama)
-            if "response" in raw_data or "text" in raw_data:
-                text_response = raw_data.get("response") or raw_data.get("text")
-                text_response = safe_str(text_response)
-                if text_response and not result["summary"]:
-                    result["summary"] = text_response[
-                        :500
-                    ]  # Use first 500 chars as summary
-                    result["reasoning"] = text_response
+        response["prefilter"] = decision
 
-            return result
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Parsed custom model result: %s",
+                json.dumps(response["customModel"], ensure_ascii=False),
+            )
+        # Logged with the stage timings if the request is sampled as slow
+        current_trace().detail = response["customModel"]
+
+        save_analysis(text, response["customModel"], embedding, response.get("entities"))
+
+        if not include_raw_response(request, data):
+            response = {**response, "customModel": without_raw_response(response["customModel"])}
+        with timed("serialization"):
+            return json_response(response)
 
-        else:
-            # If response is a string or list
-            response_str = safe_str(raw_data)
-            return {
-                "success": True,
-                "verdict": "Analysis Complete",
-                "credibility": "See details",
-                "summary": (
-                    response_str[:500] if response_str else "No summary available"
-                ),
-                "reasoning": response_str,
-                "sources": [],
-                "confidence": 0,
-                "raw_response": raw_data,
-            }
-
-    except requests.exceptions.Timeout:
-        return {
-            "success": False,
-            "error": "Request timeout - Model took too long to respond (60s)",
-            "verdict": "Error",
-            "credibility": "Unknown",
-            "summary": "",
-            "reasoning": "",
-            "sources": [],
-            "confidence": 0,
-        }
-    except requests.exceptions.RequestException as e:
-        return {
-            "success": False,
-            "error": f"Failed to connect to custom model: {str(e)}",
-            "verdict": "Error",
-            "credibility": "Unknown",
-            "summary": "",
-            "reasoning": "",
-            "sources": [],
-            "confidence": 0,
-        }
     except Exception as e:
-        import traceback
-
-        error_details = traceback.format_exc()
-        print("Exception in call_custom_model:", error_details)
-        return {
-            "success": False,
-            "error": f"Error calling custom model: {str(e)}",
-            "verdict": "Error",
-            "credibility": "Unknown",
-            "summary": "",
-            "reasoning": "",
-            "sources": [],
-            "confidence": 0,
-        }
+        logger.exception("Error in analyze_view")
+        return JsonResponse({"error": str(e)}, status=500)
 
 
-# Analyze
+def include_raw_response(request, data):
+    if "include_raw" in data:
+        return data["include_raw"] in (True, 1, "1", "true")
+    if "raw" in request.GET:
+        return request.GET["raw"] == "1"
+    return settings.ANALYZE_INCLUDE_RAW_RESPONSE
+
+
+def without_raw_response(custom_model_result):
+    # Copy: the result dict may be shared with the cache and other requests
+    if custom_model_result is None or "raw_response" not in custom_model_result:
+        return custom_model_result
+    return {k: v for k, v in custom_model_result.items() if k != "raw_response"}
+
+
+def enqueue_analysis(data, text, text2, decision):
+    callback_url = data.get("callback_url") or None
+    if isinstance(callback_url, str):
+        callback_url = callback_url.strip() or None
+    try:
+        priority = validate_priority(data.get("priority", 0))
+        if callback_url is not None:
+            validate_callback_url(callback_url)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    job, created = enqueue_job(text, text2, decision, priority, callback_url)
+    payload = job_payload(job)
+    payload["url"] = f"/jobs/{job.id}/"
+    payload["deduplicated"] = not created
+    return JsonResponse(payload, status=202)
+
+
+# Async analysis job status (poll until status is done / failed)
+def job_view(request, job_id):
+    job = AnalysisJob.objects.filter(id=job_id).first()
+    if job is None:
+        return JsonResponse({"error": "Job not found"}, status=404)
+    return JsonResponse(job_payload(job))
+
+
+# Analyze, streamed: each stage's result is sent as soon as it finishes,
+# the custom model verdict last. Server-sent events by default (POST, or GET
+# with ?text= for EventSource); ?format=ndjson for chunked NDJSON.
 @csrf_exempt
-def analyze_view(request):
+@instrumented("analyze_stream")
+def analyze_stream_view(request):
+    if request.method == "POST":
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({"error": "Invalid JSON"}, status=400)
+    elif request.method == "GET":
+        data = request.GET
+    else:
+        return JsonResponse({"error": "Only GET or POST allowed"}, status=405)
+
+    text = (data.get("text") or "").strip()
+    text2 = (data.get("text2") or "").strip()
+    if not text:
+        return JsonResponse({"error": "No text provided"}, status=400)
+
+    decision = None
+    if settings.PREFILTER_ENABLED:
+        with timed("prefilter"):
+            text, decision = prefilter(text)
+        if decision["action"] == "short_circuit" and settings.PREFILTER_ACTION == "reject":
+            return prefilter_response(decision)
+
+    if request.GET.get("format") == "ndjson":
+        encode, content_type = ndjson_event, "application/x-ndjson"
+    else:
+        encode, content_type = sse_event, "text/event-stream"
+
+    include_raw = include_raw_response(request, data)
+    events = stream_analysis(text, text2, decision, include_raw)
+    response = StreamingHttpResponse(
+        (encode(event, payload) for event, payload in events),
+        content_type=content_type,
+    )
+    # Keep proxies (nginx) from buffering the stream
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def stream_analysis(text, text2, decision, include_raw=False):
+    """
+    Yields (event, payload) pairs for analyze_stream_view: "prefilter", then
+    one event per stage as it completes ("customModel" last), then "done".
+    Idle intervals yield ("heartbeat", None).
+    """
+    yield "prefilter", decision
+    if decision and decision["action"] == "short_circuit":
+        message = f"Input not analyzable ({decision['reason']})"
+        yield "customModel", custom_model_error(message)
+        yield "done", None
+        return
+
+    embedding = {}
+    custom_model_result = entities = None
+    for stage, result in iter_analysis(
+        text,
+        text2,
+        skip=decision["skipped"] if decision else (),
+        embedding=embedding,
+        heartbeat=settings.ANALYZE_STREAM_HEARTBEAT,
+    ):
+        if stage is None:
+            yield "heartbeat", None
+            continue
+        if stage == "entities":
+            entities = result
+        if stage == "customModel":
+            custom_model_result = result
+            if not include_raw:
+                result = without_raw_response(result)
+        yield stage, result
+
+    save_analysis(text, custom_model_result, embedding.get("vector"), entities)
+    yield "done", None
+
+
+def sse_event(event, payload):
+    if event == "heartbeat":
+        # Comment line: ignored by EventSource, keeps the connection alive
+        return ": heartbeat\n\n"
+    return b"event: %s\ndata: %s\n\n" % (event.encode("ascii"), dumps(payload))
+
+
+def ndjson_event(event, payload):
+    return dumps({"event": event, "data": payload}) + b"\n"
+
+
+def prefilter_response(decision):
+    """
+    Response for input the pre-filter ruled out: a 422 error with
+    PREFILTER_ACTION=reject, otherwise the usual /analyze/ shape with empty
+    results (not saved to history)
+    """
+    message = f"Input not analyzable ({decision['reason']})"
+    if settings.PREFILTER_ACTION == "reject":
+        return JsonResponse({"error": message, "prefilter": decision}, status=422)
+    return JsonResponse({
+        "entities": [],
+        "sentiment": [],
+        "similarity": None,
+        "customModel": custom_model_error(message),
+        "prefilter": decision,
+    })
+
+
+# Bulk analyze: JSON list or NDJSON upload in, NDJSON stream out
+@csrf_exempt
+@instrumented("analyze_batch")
+def analyze_batch_view(request):
     if request.method != "POST":
         return JsonResponse({"error": "Only POST allowed"}, status=405)
 
     try:
-        data = json.loads(request.body)
-        text = data.get("text", "").strip()
-        text2 = data.get("text2", "").strip()
+        items = parse_batch_items(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    if not items:
+        return JsonResponse({"error": "No text provided"}, status=400)
+    if len(items) > settings.ANALYZE_BATCH_MAX_ITEMS:
+        return JsonResponse(
+            {"error": f"At most {settings.ANALYZE_BATCH_MAX_ITEMS} items per batch"},
+            status=400,
+        )
 
+    return StreamingHttpResponse(
+        stream_batch_results(items, include_raw_response(request, {})), content_type="application/x-ndjson"
+    )
+
+
+def parse_batch_items(request):
+    """
+    Accepts a JSON list (or {"items": [...]}) or an NDJSON body; each item is
+    either a string or an object with "text" and optional "text2".
+    """
+    body = request.body.decode("utf-8")
+    if "ndjson" in request.content_type:
+        raw_items = [json.loads(line) for line in body.splitlines() if line.strip()]
+    else:
+        raw_items = json.loads(body)
+        if isinstance(raw_items, dict):
+            raw_items = raw_items.get("items", [])
+    if not isinstance(raw_items, list):
+        raise ValueError("Expected a list of items")
+
+    items = []
+    for raw in raw_items:
+        if isinstance(raw, str):
+            raw = {"text": raw}
+        if not isinstance(raw, dict):
+            raise ValueError("Each item must be a string or an object")
+        text = (raw.get("text") or "").strip()
         if not text:
-            return JsonResponse({"error": "No text provided"}, status=400)
+            raise ValueError("Every item needs a non-empty text")
+        items.append({"text": text, "text2": (raw.get("text2") or "").strip()})
+    return items
+
 
-        # NER (Named Entity Recognition) - KEPT INTACT
-        entities = get_named_entities(text)
+def stream_batch_results(items, include_raw=False):
+    """
+    Yields one NDJSON line per item as soon as its custom model result is in.
+
+    Items are processed in chunks: NER, sentiment, similarity and embeddings
+    run as real model batches, then the chunk's custom model calls are handed
+    to a bounded pool while the next chunk's local stages run.
+    """
+    pool = ThreadPoolExecutor(
+        max_workers=settings.ANALYZE_BATCH_CONCURRENCY,
+        thread_name_prefix="analyze-batch",
+    )
+    pending = {}
+    local_results = {}
+    records = []
+
+    def custom_model_stage(text, vector):
+        try:
+            cached = result_cache.get("verdict", text)
+            if cached is not None:
+                return cached
+            if vector is not None:
+                prior = find_prior_verdict(vector)
+                if prior is not None:
+                    return prior
+            result = call_custom_model(text)
+            if result.get("success"):
+                result_cache.set("verdict", text, result)
+            return result
+        finally:
+            connections.close_all()
+
+    def finish(future):
+        index = pending.pop(future)
+        text = items[index]["text"]
+        custom_model_result = future.result()
+        local = local_results.pop(index)
+        records.append(
+            (build_history_record(text, custom_model_result), local["vector"], local["entities"])
+        )
+        line = {
+            "index": index,
+            "text": text,
+            "entities": local["entities"],
+            "sentiment": local["sentiment"],
+            "similarity": local["similarity"],
+            "customModel": (
+                custom_model_result if include_raw else without_raw_response(custom_model_result)
+            ),
+        }
+        with timed("serialization"):
+            return dumps(line) + b"\n"
 
-        # Sentiment Analysis - KEPT INTACT
-        semantics = analyze_semantics(text)
+    try:
+        chunk_size = settings.ANALYZE_BATCH_CHUNK_SIZE
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start:start + chunk_size]
+            texts = [item["text"] for item in chunk]
+
+            with timed("ner"):
+                entities = get_named_entities_batch(texts)
+            with timed("sentiment"):
+                sentiments = analyze_semantics_batch(texts)
+            pairs = [(item["text"], item["text2"]) for item in chunk if item["text2"]]
+            with timed("similarity"):
+                similarities = iter(calculate_similarity_batch(pairs))
+            vectors = (
+                encode_texts(texts) if settings.EMBEDDING_INDEX_ENABLED else [None] * len(texts)
+            )
 
-        # Similarity (if text2 provided) - KEPT INTACT
-        similarity = calculate_similarity(text, text2) if text2 else None
+            for offset, item in enumerate(chunk):
+                index = start + offset
+                local_results[index] = {
+                    "entities": entities[offset],
+                    "sentiment": sentiments[offset],
+                    "similarity": next(similarities) if item["text2"] else None,
+                    "vector": vectors[offset],
+                }
+                future = pool.submit(custom_model_stage, item["text"], vectors[offset])
+                pending[future] = index
 
-        # ===== CUSTOM MODEL FACT CHECK =====
-        custom_model_result = call_custom_model(text)
+            # Stream whatever has finished while the next chunk is prepared
+            for future in [f for f in pending if f.done()]:
+                yield finish(future)
+            if len(records) >= chunk_size:
+                save_batch_records(records)
 
-        print(
-            "Parsed Custom Model Result:", json.dumps(custom_model_result, indent=2)
-        )  # Debug log
+        for future in as_completed(list(pending)):
+            yield finish(future)
+        save_batch_records(records)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
 
-        # Determine verdict from custom model
-        if custom_model_result.get("success"):
-            verdict = custom_model_result.get("verdict", "Unknown")
-            credibility = custom_model_result.get("credibility", "Unknown")
-        else:
-            verdict = "Error analyzing claim"
-            credibility = "Unknown"
 
-        # Save query to database
+def save_batch_records(records):
+    """
+    bulk_create the buffered (record, vector, entities) rows and index their
+    embeddings and entities
+    """
+    if not records:
+        return
+    batch = list(records)
+    records.clear()
+    try:
+        with timed("db_write"):
+            QueryHistory.objects.bulk_create([record for record, _, _ in batch])
+    except Exception as e:
+        logger.error("DB save error: %s", e)
+        return
+    try:
+        index_claims([(record, entities) for record, _, entities in batch])
+    except Exception as e:
+        logger.error("Entity index error: %s", e)
+    # Reused verdicts are not indexed again (see save_analysis)
+    fresh = [
+        (record, vector) for record, vector, _ in batch
+        if vector is not None and "reused_from" not in (record.gemini_result or {})
+    ]
+    if settings.EMBEDDING_INDEX_ENABLED and fresh:
         try:
-            QueryHistory.objects.create(
-                headline=text[:200],
-                serpapi_result=json.dumps(
-                    custom_model_result.get("sources", []), ensure_ascii=False
-                ),
-                gemini_result=json.dumps(custom_model_result, ensure_ascii=False),
-                factcheck_result=json.dumps(
-                    custom_model_result.get("raw_response", {}), ensure_ascii=False
-                ),
-                verdict=verdict,
-                credibility=credibility,
+            embedding_index.add_many(
+                [record.id for record, _ in fresh],
+                [vector for _, vector in fresh],
             )
         except Exception as e:
-            print("DB save error:", e)
-
-        # Build response
-        response = {
-            "entities": entities,  # NER results
-            "sentiment": semantics,  # Sentiment analysis
-            "similarity": similarity,  # Similarity score
-            "customModel": custom_model_result,  # Your custom model results
-        }
+            logger.error("Embedding index error: %s", e)
 
-        return JsonResponse(response, safe=False)
 
-    except Exception as e:
-        import traceback
+# Previously checked claims similar to a query
+@instrumented("similar")
+def similar_claims_view(request):
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return JsonResponse({"error": "No query provided"}, status=400)
+    try:
+        k = min(int(request.GET.get("k", 5)), 100)
+    except ValueError:
+        return JsonResponse({"error": "k must be an integer"}, status=400)
+
+    matches = embedding_index.search(encode_texts([query])[0], k=k)
+    scores = dict(matches)
+    claims = QueryHistory.objects.filter(id__in=scores).values(
+        "id", "headline", "verdict", "credibility", "created_at"
+    )
+    results = sorted(
+        ({**claim, "score": scores[claim["id"]]} for claim in claims),
+        key=lambda claim: claim["score"],
+        reverse=True,
+    )
+    return JsonResponse({"query": query, "results": results})
+
+
+# Claims mentioning an entity, newest first
+#   ?entity=...&label=PER&limit=50&before=<claim id of the last result>
+def entity_claims_view(request):
+    name = request.GET.get("entity", "").strip()
+    if not name:
+        return JsonResponse({"error": "No entity provided"}, status=400)
+    try:
+        limit = min(int(request.GET.get("limit", 50)), settings.ENTITY_QUERY_MAX_RESULTS)
+        before = request.GET.get("before")
+        before = int(before) if before else None
+    except ValueError:
+        return JsonResponse({"error": "limit and before must be integers"}, status=400)
 
-        traceback.print_exc()
-        return JsonResponse({"error": str(e)}, status=500)
+    results = claims_mentioning(name, request.GET.get("label"), limit, before)
+    return JsonResponse({"entity": name, "results": results})
+
+
+# Most mentioned entities in a time window
+#   ?verdict=FAKE&hours=24&label=ORG&limit=20
+# verdict is FAKE, REAL or UNKNOWN (QueryHistory.is_fake); ?fake=1 / ?fake=0
+# is the same as FAKE / REAL
+def top_entities_view(request):
+    try:
+        hours = float(request.GET.get("hours", 24))
+        limit = min(int(request.GET.get("limit", 20)), settings.ENTITY_QUERY_MAX_RESULTS)
+    except ValueError:
+        return JsonResponse({"error": "hours and limit must be numbers"}, status=400)
+
+    verdict = request.GET.get("verdict", "").strip().upper() or None
+    fake = request.GET.get("fake", "").strip().lower()
+    if fake:
+        if fake not in ("1", "0", "true", "false"):
+            return JsonResponse({"error": "fake must be 1 or 0"}, status=400)
+        verdict = verdict_class(fake in ("1", "true"))
+    if verdict is not None and verdict not in VERDICT_CLASSES:
+        return JsonResponse({"error": f"verdict must be one of {', '.join(VERDICT_CLASSES)}"}, status=400)
+    results = top_entities(verdict, hours, request.GET.get("label"), limit)
+    return JsonResponse({"verdict": verdict, "hours": hours, "results": results})
+
+
+# Vectorized similarity: one query against N candidates
+#   {"query": "...", "candidates": [...], "top_k": 10}
+# or an N x M matrix ({"left": [...], "right": [...]}; without "right" the
+# left texts are compared with each other). With "threshold" only the pairs
+# scoring at or above it are returned instead of the full matrix; matrices
+# of more than SIMILARITY_MAX_CELLS cells need a threshold.
+@csrf_exempt
+@instrumented("similarity")
+def similarity_view(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST allowed"}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        threshold = data.get("threshold")
+        threshold = float(threshold) if threshold is not None else None
+        top_k = data.get("top_k")
+        top_k = int(top_k) if top_k is not None else None
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "Invalid JSON object, threshold or top_k"}, status=400)
+
+    if "query" in data:
+        left = [data["query"]]
+        right = data.get("candidates")
+        if not isinstance(right, list):
+            return JsonResponse({"error": "candidates must be a list"}, status=400)
+    else:
+        left, right = data.get("left"), data.get("right")
+        if not isinstance(left, list) or (right is not None and not isinstance(right, list)):
+            return JsonResponse({"error": "left (and right) must be lists"}, status=400)
+
+    texts = left + (right or [])
+    if not all(isinstance(t, str) and t.strip() for t in texts):
+        return JsonResponse({"error": "Every text must be a non-empty string"}, status=400)
+    if not left or (right is not None and not right):
+        return JsonResponse({"error": "No texts provided"}, status=400)
+    if max(len(left), len(right or [])) > settings.SIMILARITY_MAX_TEXTS:
+        return JsonResponse(
+            {"error": f"At most {settings.SIMILARITY_MAX_TEXTS} texts per side"}, status=400
+        )
+    cells = len(left) * len(right if right is not None else left)
+    if "query" not in data and threshold is None and cells > settings.SIMILARITY_MAX_CELLS:
+        return JsonResponse(
+            {"error": f"Matrices over {settings.SIMILARITY_MAX_CELLS} cells need a threshold"},
+            status=400,
+        )
+
+    with timed("similarity"):
+        scores = similarity_matrix(left, right)
+
+    if "query" in data:
+        row = scores[0]
+        order = np.argsort(-row)
+        if threshold is not None:
+            order = order[row[order] >= threshold]
+        if top_k is not None:
+            order = order[:top_k]
+        results = [
+            {"index": int(i), "text": right[i], **similarity_result(float(row[i]))}
+            for i in order
+        ]
+        return JsonResponse({"query": left[0], "results": results})
+
+    if threshold is None:
+        return JsonResponse({"matrix": scores.round(6).tolist()})
+
+    # Sparse output; a self-comparison only reports each pair once (i < j)
+    if right is None:
+        scores = np.triu(scores, k=1) + np.tril(np.full_like(scores, -np.inf))
+    rows, cols = np.nonzero(scores >= threshold)
+    # Best pairs first; a low threshold can match nearly every cell
+    order = np.argsort(-scores[rows, cols], kind="stable")[:settings.SIMILARITY_MAX_CELLS]
+    pairs = [
+        {"left": int(rows[k]), "right": int(cols[k]), "score": round(float(scores[rows[k], cols[k]]), 6)}
+        for k in order
+    ]
+    return JsonResponse({"pairs": pairs, "truncated": len(rows) > len(order)})
+
+
+# Pipeline stats (batching queue depth / batch-size histograms, cache
+# counters, model load times, model server pool / breaker state,
+# request coalescing, write-behind queue, embedding cache, inference
+# threads and process memory, inference sidecar)
+def pipeline_stats(request):
+    return JsonResponse({
+        "batching": batching_stats(),
+        "cache": result_cache.stats(),
+        "models": registry.stats(),
+        "customModel": model_client.stats(),
+        "singleFlight": analysis_flight.stats(),
+        "historyWriter": history_writer.stats(),
+        "embeddingCache": embedding_cache.stats(),
+        "resources": resources.stats(),
+        "inferenceServer": inference_client.stats(),
+    })
+
+
+# Prometheus scrape endpoint (stage / request latency histograms and counters)
+def metrics_view(request):
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# Drop cached results for a claim
+@csrf_exempt
+def invalidate_cache_view(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST allowed"}, status=405)
+
+    data = json.loads(request.body or b"{}")
+    text = data.get("text", "").strip()
+    if not text:
+        return JsonResponse({"error": "No text provided"}, status=400)
+
+    return JsonResponse({"invalidated": result_cache.invalidate(text)})
 
 
 # History API (for React frontend)
 class QueryHistoryViewSet(viewsets.ModelViewSet):
-    queryset = QueryHistory.objects.all().order_by("-created_at")
+    queryset = QueryHistory.objects.all().order_by("-created_at", "-id")
     serializer_class = QueryHistorySerializer
-    filter_backends = [filters.SearchFilter]
-    search_fields = ["headline", "verdict", "credibility"]
+    pagination_class = HistoryCursorPagination
+    filter_backends = [HeadlineSearchFilter]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Only load the requested columns; the JSON blobs are skipped unless
+        # asked for. id and created_at are always needed for the cursor.
+        requested = requested_fields(self.request)
+        if requested:
+            model_fields = {f.name for f in QueryHistory._meta.concrete_fields}
+            queryset = queryset.only(*(requested & model_fields | {"id", "created_at"}))
+        return queryset
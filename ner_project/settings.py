@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -138,3 +139,236 @@ CORS_ALLOWED_ORIGINS = [
 ]
 ALLOWED_HOSTS = ["127.0.0.1", "localhost"]
 
+
+
+# Analysis pipeline
+# /analyze/ fans out NER, sentiment, similarity and the custom model call on a
+# thread pool; set ANALYZE_CONCURRENT=0 to run the stages one after another.
+# The custom model call runs on its own pool (ANALYZE_REMOTE_MAX_WORKERS), so
+# slow remote calls never hold the threads of the local model stages.
+ANALYZE_CONCURRENT = os.getenv("ANALYZE_CONCURRENT", "1") == "1"
+ANALYZE_MAX_WORKERS = int(os.getenv("ANALYZE_MAX_WORKERS", "16"))
+ANALYZE_REMOTE_MAX_WORKERS = int(os.getenv("ANALYZE_REMOTE_MAX_WORKERS", "32"))
+# Per-stage timeouts in seconds, counted from when the stage starts running
+ANALYZE_STAGE_TIMEOUTS = {
+    "entities": float(os.getenv("ANALYZE_NER_TIMEOUT", "30")),
+    "sentiment": float(os.getenv("ANALYZE_SENTIMENT_TIMEOUT", "30")),
+    "similarity": float(os.getenv("ANALYZE_SIMILARITY_TIMEOUT", "30")),
+    "customModel": float(os.getenv("ANALYZE_CUSTOM_MODEL_TIMEOUT", "300")),
+}
+
+# Cross-request micro-batching for the NER, sentiment and similarity models.
+# Concurrent single-text calls are grouped into one padded forward pass of at
+# most MODEL_BATCH_MAX_SIZE texts, waiting at most MODEL_BATCH_MAX_WAIT_MS.
+MODEL_BATCHING = os.getenv("MODEL_BATCHING", "1") == "1"
+MODEL_BATCH_MAX_SIZE = int(os.getenv("MODEL_BATCH_MAX_SIZE", "16"))
+MODEL_BATCH_MAX_WAIT_MS = float(os.getenv("MODEL_BATCH_MAX_WAIT_MS", "5"))
+
+# /analyze/ result cache keyed on the normalized claim text. Model outputs are
+# stable, fact-check verdicts go stale, so each kind has its own TTL (seconds).
+# RESULT_CACHE_BACKEND names an entry in CACHES to share results across workers.
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") == "1"
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+RESULT_CACHE_TTLS = {
+    "entities": int(os.getenv("RESULT_CACHE_ENTITIES_TTL", str(7 * 24 * 3600))),
+    "sentiment": int(os.getenv("RESULT_CACHE_SENTIMENT_TTL", str(7 * 24 * 3600))),
+    "verdict": int(os.getenv("RESULT_CACHE_VERDICT_TTL", str(6 * 3600))),
+}
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND") or None
+
+# Load every model when the app starts (serving processes) instead of on first
+# use. gunicorn.conf.py enables this and preloads the app in the master process.
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "0") == "1"
+
+# Persistent embedding index of analyzed headlines (near-duplicate lookup).
+# Brute-force search up to EMBEDDING_INDEX_ANN_THRESHOLD rows, IVF beyond.
+EMBEDDING_INDEX_ENABLED = os.getenv("EMBEDDING_INDEX_ENABLED", "1") == "1"
+EMBEDDING_INDEX_DIR = os.getenv("EMBEDDING_INDEX_DIR", str(BASE_DIR / "embedding_index"))
+EMBEDDING_INDEX_ANN_THRESHOLD = int(os.getenv("EMBEDDING_INDEX_ANN_THRESHOLD", "50000"))
+EMBEDDING_INDEX_NPROBE = int(os.getenv("EMBEDDING_INDEX_NPROBE", "8"))
+
+# Named entities of analyzed claims are stored with their history rows
+# (entity -> claims index plus hourly per-verdict rollups) for the
+# /entities/claims/ and /entities/top/ endpoints. Existing history is indexed
+# with `manage.py backfill_entities`.
+ENTITY_INDEX_ENABLED = os.getenv("ENTITY_INDEX_ENABLED", "1") == "1"
+ENTITY_QUERY_MAX_RESULTS = int(os.getenv("ENTITY_QUERY_MAX_RESULTS", "200"))
+
+# Sentence embeddings are cached in a local SQLite file keyed on the text hash
+# (and encoder), pruned oldest-first beyond EMBEDDING_CACHE_MAX_ENTRIES.
+# /similarity/ compares at most SIMILARITY_MAX_TEXTS texts per side. A full
+# N x M matrix is returned for at most SIMILARITY_MAX_CELLS cells (larger
+# comparisons need a threshold), and at most that many pairs are returned.
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "1") == "1"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", str(BASE_DIR / "embedding_cache.sqlite3"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "1000000"))
+SIMILARITY_MAX_TEXTS = int(os.getenv("SIMILARITY_MAX_TEXTS", "5000"))
+SIMILARITY_MAX_CELLS = int(os.getenv("SIMILARITY_MAX_CELLS", "250000"))
+# /analyze/ reuses the verdict of a previously checked claim at or above this
+# cosine similarity instead of calling the custom model (0 disables reuse).
+# Only claims checked within VERDICT_REUSE_MAX_AGE seconds (default: the
+# verdict cache TTL) are reused.
+VERDICT_REUSE_THRESHOLD = float(os.getenv("VERDICT_REUSE_THRESHOLD", "0.95"))
+VERDICT_REUSE_MAX_AGE = int(os.getenv("VERDICT_REUSE_MAX_AGE", str(RESULT_CACHE_TTLS["verdict"])))
+
+# /analyze/batch/: local stages run in chunks of ANALYZE_BATCH_CHUNK_SIZE texts,
+# at most ANALYZE_BATCH_CONCURRENCY custom model calls are in flight at once.
+ANALYZE_BATCH_MAX_ITEMS = int(os.getenv("ANALYZE_BATCH_MAX_ITEMS", "50000"))
+ANALYZE_BATCH_CHUNK_SIZE = int(os.getenv("ANALYZE_BATCH_CHUNK_SIZE", "64"))
+ANALYZE_BATCH_CONCURRENCY = int(os.getenv("ANALYZE_BATCH_CONCURRENCY", "8"))
+
+# Custom fact-check model server
+CUSTOM_MODEL_URL = os.getenv("CUSTOM_MODEL_URL", "http://PRIVATE_MODEL_SERVER/query")
+CUSTOM_MODEL_API_KEY = os.getenv("CUSTOM_MODEL_API_KEY")
+# Seconds to establish a connection / to wait for the (slow, Ollama) response
+CUSTOM_MODEL_CONNECT_TIMEOUT = float(os.getenv("CUSTOM_MODEL_CONNECT_TIMEOUT", "5"))
+CUSTOM_MODEL_READ_TIMEOUT = float(os.getenv("CUSTOM_MODEL_READ_TIMEOUT", "300"))
+# Keep-alive pool size and cap on concurrent in-flight calls per process;
+# callers wait up to CUSTOM_MODEL_QUEUE_TIMEOUT seconds for a free slot
+CUSTOM_MODEL_POOL_SIZE = int(os.getenv("CUSTOM_MODEL_POOL_SIZE", "16"))
+CUSTOM_MODEL_MAX_CONCURRENCY = int(os.getenv("CUSTOM_MODEL_MAX_CONCURRENCY", "8"))
+CUSTOM_MODEL_QUEUE_TIMEOUT = float(os.getenv("CUSTOM_MODEL_QUEUE_TIMEOUT", "30"))
+# Retries (connection errors, 429/502/503/504) with jittered exponential backoff
+CUSTOM_MODEL_RETRIES = int(os.getenv("CUSTOM_MODEL_RETRIES", "2"))
+CUSTOM_MODEL_BACKOFF_BASE = float(os.getenv("CUSTOM_MODEL_BACKOFF_BASE", "0.5"))
+CUSTOM_MODEL_BACKOFF_MAX = float(os.getenv("CUSTOM_MODEL_BACKOFF_MAX", "8"))
+# Circuit breaker: open after N consecutive failures, retry after RESET seconds
+CUSTOM_MODEL_BREAKER_THRESHOLD = int(os.getenv("CUSTOM_MODEL_BREAKER_THRESHOLD", "5"))
+CUSTOM_MODEL_BREAKER_RESET = float(os.getenv("CUSTOM_MODEL_BREAKER_RESET", "30"))
+# The custom model's raw response is kept in history (factcheck_result) but left
+# out of API responses unless enabled here or per request ("include_raw": true
+# in the body, or ?raw=1)
+ANALYZE_INCLUDE_RAW_RESPONSE = os.getenv("ANALYZE_INCLUDE_RAW_RESPONSE", "0") == "1"
+
+# /analyze/stream/ sends a keep-alive every ANALYZE_STREAM_HEARTBEAT seconds
+# while waiting on a stage (the custom model can take minutes), so the
+# non-streaming /analyze/ path can sit behind a shorter proxy timeout.
+ANALYZE_STREAM_HEARTBEAT = float(os.getenv("ANALYZE_STREAM_HEARTBEAT", "15"))
+
+# Async /analyze/ jobs ({"async": true}), run by `manage.py run_analysis_worker`.
+# A failed custom model call is retried up to ANALYSIS_JOB_MAX_ATTEMPTS times,
+# waiting ANALYSIS_JOB_RETRY_BACKOFF seconds (doubled per attempt). Jobs running
+# longer than ANALYSIS_JOB_LEASE seconds are assumed orphaned and requeued;
+# workers look for them every ANALYSIS_JOB_REQUEUE_INTERVAL seconds.
+# Webhook callbacks are limited to ANALYSIS_JOB_CALLBACK_ALLOWED_HOSTS if set,
+# otherwise to hosts that resolve to public addresses.
+ANALYSIS_JOB_MAX_ATTEMPTS = int(os.getenv("ANALYSIS_JOB_MAX_ATTEMPTS", "3"))
+ANALYSIS_JOB_RETRY_BACKOFF = float(os.getenv("ANALYSIS_JOB_RETRY_BACKOFF", "30"))
+ANALYSIS_JOB_LEASE = float(os.getenv("ANALYSIS_JOB_LEASE", "900"))
+ANALYSIS_JOB_REQUEUE_INTERVAL = float(os.getenv("ANALYSIS_JOB_REQUEUE_INTERVAL", "60"))
+ANALYSIS_JOB_CALLBACK_TIMEOUT = float(os.getenv("ANALYSIS_JOB_CALLBACK_TIMEOUT", "10"))
+ANALYSIS_JOB_CALLBACK_ALLOWED_HOSTS = [
+    host for host in os.getenv("ANALYSIS_JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if host
+]
+
+# Request coalescing: concurrent /analyze/ calls for the same normalized claim
+# share one computation. SINGLE_FLIGHT_CACHE_ALIAS (an entry in CACHES, e.g. a
+# DatabaseCache) extends this across worker processes; followers wait up to
+# SINGLE_FLIGHT_WAIT seconds, polling every SINGLE_FLIGHT_POLL_INTERVAL.
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "1") == "1"
+SINGLE_FLIGHT_CACHE_ALIAS = os.getenv("SINGLE_FLIGHT_CACHE_ALIAS") or None
+SINGLE_FLIGHT_WAIT = float(os.getenv("SINGLE_FLIGHT_WAIT", "330"))
+SINGLE_FLIGHT_POLL_INTERVAL = float(os.getenv("SINGLE_FLIGHT_POLL_INTERVAL", "0.25"))
+SINGLE_FLIGHT_RESULT_TTL = int(os.getenv("SINGLE_FLIGHT_RESULT_TTL", "30"))
+
+# Write-behind QueryHistory persistence: /analyze/ enqueues rows and a
+# background flusher bulk-inserts them every HISTORY_BATCH_SIZE rows or
+# HISTORY_FLUSH_INTERVAL seconds. When the queue is full (after waiting
+# HISTORY_PUT_TIMEOUT seconds) or the database is down, rows go to spill
+# files in HISTORY_SPILL_DIR and are replayed once writes succeed again. A
+# spill file left half-replayed by a crashed process is picked up again once
+# that process is gone or after HISTORY_SPILL_CLAIM_TIMEOUT seconds.
+HISTORY_WRITE_BEHIND = os.getenv("HISTORY_WRITE_BEHIND", "1") == "1"
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", "10000"))
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "200"))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "1.0"))
+HISTORY_PUT_TIMEOUT = float(os.getenv("HISTORY_PUT_TIMEOUT", "0.05"))
+HISTORY_SPILL_DIR = os.getenv("HISTORY_SPILL_DIR", str(BASE_DIR / "history_spill"))
+HISTORY_SPILL_CLAIM_TIMEOUT = float(os.getenv("HISTORY_SPILL_CLAIM_TIMEOUT", "600"))
+
+# Inference backend for the NER, sentiment and sentence-encoder models:
+# "pytorch", or "onnx" (ONNX Runtime; needs optimum[onnxruntime]). ONNX models
+# are exported once, dynamically quantized to int8 for ONNX_QUANTIZATION_TARGET
+# (avx2, avx512, avx512_vnni, arm64) unless ONNX_QUANTIZE=0, and cached on disk.
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "pytorch")
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", str(BASE_DIR / "onnx_models"))
+ONNX_QUANTIZE = os.getenv("ONNX_QUANTIZE", "1") == "1"
+ONNX_QUANTIZATION_TARGET = os.getenv("ONNX_QUANTIZATION_TARGET", "avx2")
+
+# Per-process inference budget (ner_app/resources.py): INFERENCE_NUM_THREADS
+# intra-op threads (0 = cores / INFERENCE_PROCESSES, the number of workers on
+# the node) and INFERENCE_INTEROP_THREADS inter-op threads. PyTorch weights are
+# kept in fp32, converted to bf16, or dynamically quantized to int8 (qint8).
+# A gunicorn worker whose private (non-shared) memory exceeds
+# INFERENCE_MAX_PRIVATE_MB is recycled after its current request (0 = no cap).
+INFERENCE_PROCESSES = int(os.getenv("INFERENCE_PROCESSES", os.getenv("GUNICORN_WORKERS", "1")))
+INFERENCE_NUM_THREADS = int(os.getenv("INFERENCE_NUM_THREADS", "0"))
+INFERENCE_INTEROP_THREADS = int(os.getenv("INFERENCE_INTEROP_THREADS", "1"))
+INFERENCE_PRECISION = os.getenv("INFERENCE_PRECISION", "fp32")
+INFERENCE_MAX_PRIVATE_MB = int(os.getenv("INFERENCE_MAX_PRIVATE_MB", "0"))
+
+# Inference sidecar: when INFERENCE_SERVER_SOCKET is set, web workers send model
+# calls to `manage.py run_inference_server` over this Unix socket instead of
+# loading the models. Batches travel through a per-connection shared-memory
+# arena of INFERENCE_SERVER_ARENA_BYTES (grown on demand).
+INFERENCE_SERVER_SOCKET = os.getenv("INFERENCE_SERVER_SOCKET", "")
+INFERENCE_SERVER_ARENA_BYTES = int(os.getenv("INFERENCE_SERVER_ARENA_BYTES", str(4 * 1024 * 1024)))
+INFERENCE_SERVER_TIMEOUT = float(os.getenv("INFERENCE_SERVER_TIMEOUT", "120"))
+
+# Long-document mode: texts longer than DOCUMENT_WINDOW_TOKENS tokens (as
+# counted by the model's tokenizer) are tokenized once and split into windows
+# of DOCUMENT_WINDOW_TOKENS tokens that overlap by DOCUMENT_WINDOW_STRIDE
+# tokens; windows run as one batch.
+DOCUMENT_WINDOW_TOKENS = int(os.getenv("DOCUMENT_WINDOW_TOKENS", "256"))
+DOCUMENT_WINDOW_STRIDE = int(os.getenv("DOCUMENT_WINDOW_STRIDE", "64"))
+
+# Pre-filter in front of /analyze/: input with fewer than PREFILTER_MIN_LETTERS
+# letters, a letter ratio below PREFILTER_MIN_LETTER_RATIO or heavy repetition
+# is short-circuited with empty results (PREFILTER_ACTION=short_circuit) or
+# rejected with a 422 (PREFILTER_ACTION=reject). Local models are skipped for
+# languages they do not support when detection is at least
+# PREFILTER_MIN_LANGUAGE_CONFIDENCE sure and the text has at least
+# PREFILTER_MIN_ROUTING_LETTERS letters (detection on headline-length text is
+# unreliable).
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "1") == "1"
+PREFILTER_ACTION = os.getenv("PREFILTER_ACTION", "short_circuit")
+PREFILTER_MIN_LETTERS = int(os.getenv("PREFILTER_MIN_LETTERS", "3"))
+PREFILTER_MIN_LETTER_RATIO = float(os.getenv("PREFILTER_MIN_LETTER_RATIO", "0.3"))
+PREFILTER_MIN_LANGUAGE_CONFIDENCE = float(os.getenv("PREFILTER_MIN_LANGUAGE_CONFIDENCE", "0.8"))
+PREFILTER_MIN_ROUTING_LETTERS = int(os.getenv("PREFILTER_MIN_ROUTING_LETTERS", "50"))
+
+# Observability: /metrics/ exposes per-stage and per-request latency histograms.
+# Requests slower than SLOW_REQUEST_MS are counted, and a SLOW_REQUEST_SAMPLE_RATE
+# fraction of them is logged with its stage timings (and, at INFO, the result).
+# Full model response dumps are only logged at DEBUG.
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "5000"))
+SLOW_REQUEST_SAMPLE_RATE = float(os.getenv("SLOW_REQUEST_SAMPLE_RATE", "0.1"))
+# With METRICS_DIR set (gunicorn.conf.py sets it), every worker writes its series
+# there every METRICS_FLUSH_INTERVAL seconds and /metrics/ reports the sum over
+# all workers; without it each worker reports only its own.
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1.0"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "default": {
+            "format": "%(asctime)s %(levelname)s %(process)d %(name)s: %(message)s",
+        },
+    },
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+            "formatter": "default",
+        },
+    },
+    "loggers": {
+        "ner_app": {
+            "handlers": ["console"],
+            "level": LOG_LEVEL,
+            "propagate": False,
+        },
+    },
+}